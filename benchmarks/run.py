@@ -0,0 +1,327 @@
+"""
+Banc d'essai du nœud : minage, validation, soldes, admission des
+transactions, transfert GET_CHAIN entre nœuds P2P et débit de l'API REST.
+
+    python -m benchmarks.run --blocks 50 --txs 20 --output avant.json
+    python -m benchmarks.run --compare avant.json apres.json
+
+Les résultats sont écrits en JSON. Par convention, une métrique suffixée
+`_per_s` est meilleure quand elle augmente, les autres (durées) quand
+elles diminuent : --compare s'en sert pour signaler les régressions.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.synthetic import build_chain, cold_copy, signed_transactions, quiet
+from node.blockchain import Blockchain
+from node.block import Block
+from node.network import P2PNode
+from node.protocol import encode_frame
+from node.transaction import Transaction, NETWORK_SENDER
+from node.api import create_app, serve
+from config import DIFFICULTY, MINING_REWARD, MINING_WORKERS
+
+SUITES = ['mining', 'validation', 'balance', 'admission', 'p2p', 'api']
+
+
+def timed(fn, repeat):
+    """Exécute fn() `repeat` fois : (durées, dernier résultat)."""
+    durations, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+
+def bench_mining(blockchain, wallet, args):
+    """Hashrate de Blockchain.proof_of_work sur des blocs de la taille demandée."""
+    transactions = signed_transactions(wallet, args.txs, seed=args.seed)
+    reward = Transaction(NETWORK_SENDER, wallet.get_address(), MINING_REWARD).to_dict()
+    hashrates, durations = [], []
+    with quiet():
+        for i in range(args.mining_blocks):
+            last = blockchain.last_block
+            block = Block(last.index + 1, last.hash, time.time() + i, transactions + [reward])
+            start = time.perf_counter()
+            blockchain.proof_of_work(block)
+            durations.append(time.perf_counter() - start)
+            hashrates.append(blockchain.miner.last_hashrate)
+    return {
+        'hashrate_per_s': statistics.median(hashrates),
+        'block_median_s': statistics.median(durations),
+        'workers': blockchain.miner.workers,
+    }
+
+
+def bench_validation(blockchain, wallet, args):
+    """is_valid_chain sur des blocs reçus « à froid », puis avec les caches chauds."""
+    cold_times = []
+    for _ in range(args.repeat):
+        node, chain = Blockchain(), cold_copy(blockchain.chain)
+        start = time.perf_counter()
+        valid = node.is_valid_chain(chain)
+        cold_times.append(time.perf_counter() - start)
+        if not valid:
+            raise RuntimeError("La chaîne synthétique n'est pas valide")
+        node.validator.shutdown()
+
+    node = Blockchain()
+    node.is_valid_chain(blockchain.chain)
+    warm_times, _ = timed(lambda: node.is_valid_chain(blockchain.chain), args.repeat)
+    node.validator.shutdown()
+
+    txs = sum(len(block.transactions) for block in blockchain.chain)
+    cold = min(cold_times)
+    return {
+        'cold_chain_s': cold,
+        'cold_blocks_per_s': (len(blockchain.chain) - 1) / cold,
+        'cold_txs_per_s': txs / cold,
+        'warm_chain_s': min(warm_times),
+    }
+
+
+def bench_balance(blockchain, wallet, args):
+    """Latence de get_balance sur des adresses connues et inconnues."""
+    known = [tx['recipient'] for block in blockchain.chain for tx in block.transactions]
+    addresses = (known[:args.lookups // 2] + [f"inconnue-{i}" for i in range(args.lookups // 2)]) or ["x"]
+    durations, _ = timed(lambda: [blockchain.get_balance(a) for a in addresses], args.repeat)
+    return {'get_balance_us': min(durations) / len(addresses) * 1e6}
+
+
+def bench_admission(blockchain, wallet, args):
+    """Admission dans le mempool : add_new_transaction une par une, puis add_transactions par lot."""
+    single, batch = [], []
+    nonce = blockchain.state.get_nonce(wallet.get_address())  # Le mempool est vidé à chaque tour
+    with quiet():
+        for r in range(args.repeat):
+            # Transactions neuves à chaque tour : le cache de signatures ne sert pas
+            transactions = signed_transactions(wallet, args.admissions, seed=args.seed + 2 * r + 1, nonce=nonce)
+            blockchain.mempool.clear()
+            start = time.perf_counter()
+            for tx in transactions:
+                blockchain.add_new_transaction(tx)
+            single.append(time.perf_counter() - start)
+
+            transactions = signed_transactions(wallet, args.admissions, seed=args.seed + 2 * r + 2, nonce=nonce)
+            blockchain.mempool.clear()
+            start = time.perf_counter()
+            blockchain.add_transactions(transactions)
+            batch.append(time.perf_counter() - start)
+    admitted = len(blockchain.mempool)
+    blockchain.mempool.clear()
+    if admitted != args.admissions:
+        raise RuntimeError(f"{admitted}/{args.admissions} transactions admises")
+    return {
+        'single_tx_per_s': args.admissions / min(single),
+        'batch_tx_per_s': args.admissions / min(batch),
+    }
+
+
+def bench_p2p(blockchain, wallet, args):
+    """
+    GET_CHAIN en boucle locale : un nœud sert la chaîne, les autres la
+    téléchargent simultanément. La sérialisation seule est mesurée à part.
+    """
+    server = P2PNode(args.port)
+    server.set_blockchain(blockchain)
+    server.start()
+    clients = [P2PNode(args.port + 1 + i) for i in range(args.nodes - 1)]
+
+    def encode():
+        return sum(len(encode_frame(frame)) for frame in server.stream_chain())
+
+    encode_times, size = timed(encode, args.repeat)
+
+    def fetch_all():
+        with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+            chains = list(executor.map(lambda client: client.request_chain(server.port), clients))
+        if any(chain is None or len(chain) != len(blockchain.chain) for chain in chains):
+            raise RuntimeError("Chaîne incomplète reçue par GET_CHAIN")
+
+    try:
+        with quiet():
+            transfer_times, _ = timed(fetch_all, args.repeat)
+    finally:
+        for node in [server] + clients:
+            node.stop()
+
+    blocks = len(blockchain.chain) * len(clients)
+    transfer = min(transfer_times)
+    return {
+        'serialize_chain_s': min(encode_times),
+        'chain_bytes': size,
+        'transfer_s': transfer,
+        'transfer_blocks_per_s': blocks / transfer,
+        'transfer_mb_per_s': size * len(clients) / transfer / 1e6,
+        'clients': len(clients),
+    }
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"L'API ne répond pas sur le port {port}")
+
+
+def bench_api(blockchain, wallet, args):
+    """Requêtes par seconde sur l'API Flask servie comme en production (serve)."""
+    for logger in ('werkzeug', 'waitress'):
+        logging.getLogger(logger).setLevel(logging.ERROR)
+    port = args.port + 100
+    app = create_app(blockchain, None, wallet)
+    threading.Thread(target=serve, args=(app, port), daemon=True).start()
+    wait_for_port(port)
+
+    height = len(blockchain.chain) - 1
+    paths = [f"/balance/{wallet.get_address()}", f"/block/height/{height}",
+             f"/chain?start={max(height - 9, 0)}&limit=10"]
+    results = {}
+
+    def client(path, deadline):
+        # Une connexion keep-alive par client
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        done = errors = 0
+        while time.perf_counter() < deadline:
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status == 200:
+                    done += 1
+                else:
+                    errors += 1
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        conn.close()
+        return done, errors
+
+    for path in paths:
+        deadline = time.perf_counter() + args.api_duration
+        with ThreadPoolExecutor(max_workers=args.api_clients) as executor:
+            counts = list(executor.map(lambda _: client(path, deadline), range(args.api_clients)))
+        name = path.split('?')[0].strip('/').split('/')[0]
+        results[f'{name}_req_per_s'] = sum(done for done, _ in counts) / args.api_duration
+        results[f'{name}_errors'] = sum(errors for _, errors in counts)
+    return results
+
+
+BENCHMARKS = {
+    'mining': bench_mining,
+    'validation': bench_validation,
+    'balance': bench_balance,
+    'admission': bench_admission,
+    'p2p': bench_p2p,
+    'api': bench_api,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    meta = {
+        'timestamp': time.time(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'difficulty': DIFFICULTY,
+        'mining_workers': MINING_WORKERS,
+        'blocks': args.blocks,
+        'txs_per_block': args.txs,
+        'seed': args.seed,
+    }
+    print(f"Construction de la chaîne synthétique ({args.blocks} blocs x {args.txs} transactions)...",
+          file=sys.stderr)
+    start = time.perf_counter()
+    blockchain, wallet = build_chain(args.blocks, args.txs, args.seed)
+    meta['build_s'] = time.perf_counter() - start
+
+    results = {}
+    for suite in args.suites:
+        print(f"Mesure : {suite}...", file=sys.stderr)
+        results[suite] = BENCHMARKS[suite](blockchain, wallet, args)
+    blockchain.validator.shutdown()
+    return {'meta': meta, 'results': results}
+
+
+def compare(before_path, after_path, tolerance):
+    """Affiche l'évolution de chaque métrique. Retourne le nombre de régressions."""
+    with open(before_path) as f:
+        before = json.load(f)['results']
+    with open(after_path) as f:
+        after = json.load(f)['results']
+
+    regressions = 0
+    for suite in after:
+        for metric, new in after[suite].items():
+            old = before.get(suite, {}).get(metric)
+            if not isinstance(old, (int, float)) or not old or metric.endswith(('_errors', 'workers', 'clients', '_bytes')):
+                continue
+            change = (new - old) / old
+            worse = -change if metric.endswith('_per_s') else change
+            flag = "RÉGRESSION" if worse > tolerance else ""
+            regressions += bool(flag)
+            print(f"{suite + '.' + metric:40} {old:>14.4g} -> {new:<14.4g} {change:+8.1%} {flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai du nœud blockchain")
+    parser.add_argument('--blocks', type=int, default=50, help="Blocs de la chaîne synthétique")
+    parser.add_argument('--txs', type=int, default=20, help="Transactions par bloc")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="Répétitions de chaque mesure (meilleur temps retenu)")
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=SUITES)
+    parser.add_argument('--mining-blocks', type=int, default=5, help="Blocs minés pour mesurer le hashrate")
+    parser.add_argument('--lookups', type=int, default=10000, help="Appels à get_balance par répétition")
+    parser.add_argument('--admissions', type=int, default=300, help="Transactions admises par répétition")
+    parser.add_argument('--nodes', type=int, default=4, help="Nœuds P2P (1 serveur + clients)")
+    parser.add_argument('--port', type=int, default=7100, help="Premier port utilisé (P2P, puis API à +100)")
+    parser.add_argument('--api-clients', type=int, default=8, help="Clients HTTP simultanés")
+    parser.add_argument('--api-duration', type=float, default=3.0, help="Durée de chaque mesure API (secondes)")
+    parser.add_argument('--output', help="Fichier JSON des résultats (sinon sortie standard)")
+    parser.add_argument('--compare', nargs=2, metavar=('AVANT', 'APRES'),
+                        help="Compare deux fichiers de résultats au lieu de mesurer")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="Dégradation relative tolérée avant de signaler une régression")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(*args.compare, args.tolerance) else 0
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
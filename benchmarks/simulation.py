@@ -0,0 +1,433 @@
+"""
+Simulation locale de N nœuds sur 127.0.0.1 : topologie imposée, latence
+et pertes injectées, charge de transactions à débit cible et minage
+concurrent. Mesure la propagation des blocs, le taux de fork et le temps
+de convergence une fois la charge arrêtée.
+
+    python -m benchmarks.simulation --nodes 8 --topology ring --latency 0.02 --loss 0.01
+    python -m benchmarks.simulation --mode subprocess --nodes 5 --topology star --tx-rate 20
+
+En mode "inprocess", les nœuds partagent le processus du pilote (rapide,
+un seul interpréteur) ; en mode "subprocess", chaque nœud est lancé par
+`python -m node.node <port> --headless` et piloté par son API REST.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.run import git_revision, wait_for_port
+from node.miner import Miner
+from node.network import LinkConditions
+from node.node import Node
+from node.transaction import to_units, from_units
+from node.wallet import Wallet
+from config import DIFFICULTY, MINING_REWARD
+
+TOPOLOGIES = ['full', 'ring', 'star', 'random']
+
+
+def build_topology(ports, topology, degree=3, seed=0):
+    """Voisins de chaque port (liens symétriques) : {port: set(ports)}."""
+    links = {port: set() for port in ports}
+
+    def link(a, b):
+        if a != b:
+            links[a].add(b)
+            links[b].add(a)
+
+    if topology == 'full':
+        for a in ports:
+            for b in ports:
+                link(a, b)
+    elif topology == 'ring':
+        for i, port in enumerate(ports):
+            link(port, ports[(i + 1) % len(ports)])
+    elif topology == 'star':
+        for port in ports[1:]:
+            link(ports[0], port)
+    elif topology == 'random':
+        # Anneau pour garantir la connexité, puis liens aléatoires jusqu'au degré visé
+        rng = random.Random(seed)
+        for i, port in enumerate(ports):
+            link(port, ports[(i + 1) % len(ports)])
+        for port in ports:
+            candidates = [p for p in ports if p != port and p not in links[port]]
+            rng.shuffle(candidates)
+            for other in candidates[:max(0, degree - len(links[port]))]:
+                link(port, other)
+    else:
+        raise ValueError(f"Topologie inconnue : {topology}")
+    return links
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summary(values):
+    if not values:
+        return None
+    return {'median': statistics.median(values), 'p90': percentile(values, 0.9), 'max': max(values)}
+
+
+class InProcessNode:
+    """Nœud lancé dans le processus du pilote (classe Node du CLI)."""
+
+    def __init__(self, port, peers, args):
+        self.port = port
+        self.peers = peers
+        self.node = Node(port, args.backend, data_dir='', api_port=None)
+        self.node.blockchain.miner = Miner(args.mining_workers)
+        if args.latency or args.jitter or args.loss:
+            self.node.network.conditions = LinkConditions(args.latency, args.jitter, args.loss, seed=port)
+        self.sync_interval = args.sync_interval
+
+    def start(self):
+        self.node.start(sorted(self.peers), self.sync_interval)
+
+    def submit(self, transactions):
+        blockchain = self.node.blockchain
+        admitted = blockchain.add_transactions(transactions)
+        accepted = [(tx, tx_hash) for tx, (tx_hash, error) in zip(transactions, admitted) if error is None]
+        if accepted:
+            self.node.network.broadcaster.announce_transactions([tx for tx, _ in accepted],
+                                                                [h for _, h in accepted])
+        return len(accepted)
+
+    def mine(self, address, allow_empty=False):
+        block = self.node.blockchain.mine(address, self.node.network, allow_empty)
+        return block.hash if block else None
+
+    def has_block(self, block_hash):
+        blockchain = self.node.blockchain
+        return block_hash in blockchain.heights or blockchain.tree.is_known(block_hash)
+
+    def tip(self):
+        return self.node.blockchain.last_block.hash
+
+    def main_chain(self):
+        return [block.hash for block in self.node.blockchain.chain]
+
+    def stop(self):
+        self.node.stop()
+
+
+class SubprocessNode:
+    """Nœud lancé par `python -m node.node --headless`, piloté par son API REST."""
+
+    def __init__(self, port, peers, args):
+        self.port = port
+        self.api_port = port + 1000
+        self.peers = peers
+        self.data_dir = tempfile.mkdtemp(prefix=f"sim-{port}-")
+        self.command = [sys.executable, '-m', 'node.node', str(port), '--headless',
+                        '--peers', ','.join(map(str, sorted(peers))),
+                        '--sync-interval', str(args.sync_interval), '--data-dir', self.data_dir,
+                        '--latency', str(args.latency), '--jitter', str(args.jitter), '--loss', str(args.loss)]
+        if args.backend == 'asyncio':
+            self.command.append('--asyncio')
+        self.process = None
+        self.log = None
+
+    def start(self):
+        self.log = open(os.path.join(self.data_dir, 'node.log'), 'w')
+        self.process = subprocess.Popen(self.command, stdout=self.log, stderr=subprocess.STDOUT,
+                                        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def wait_ready(self, timeout=30):
+        wait_for_port(self.api_port, timeout)
+
+    def _request(self, method, path, body=None, timeout=60):
+        conn = http.client.HTTPConnection('127.0.0.1', self.api_port, timeout=timeout)
+        try:
+            payload = json.dumps(body) if body is not None else None
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            conn.request(method, path, payload, headers)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read() or b'null')
+        finally:
+            conn.close()
+
+    def submit(self, transactions):
+        status, data = self._request('POST', '/transactions/batch', {'transactions': transactions})
+        return data.get('accepted', 0) if status < 300 and isinstance(data, dict) else 0
+
+    def mine(self, address, allow_empty=False):
+        status, data = self._request('GET', f'/mine?miner_address={address}' + ('&empty=1' if allow_empty else ''))
+        return data['block']['hash'] if status == 200 else None
+
+    def has_block(self, block_hash):
+        # L'API ne connaît que la chaîne principale : un bloc resté sur une
+        # branche secondaire compte comme non reçu
+        return self._request('GET', f'/block/{block_hash}', timeout=5)[0] == 200
+
+    def tip(self):
+        length = self._request('GET', '/chain?limit=0', timeout=5)[1]['length']
+        return self._request('GET', f'/block/height/{length - 1}', timeout=5)[1]['hash']
+
+    def main_chain(self):
+        return [block['hash'] for block in self._request('GET', '/chain')[1]['chain']]
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.log:
+            self.log.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+class Simulation:
+    """
+    Pilote de la simulation : démarre les nœuds, finance un portefeuille de
+    charge par nœud, puis génère transactions et blocs pendant `duration` secondes
+    en suivant l'arrivée de chaque bloc miné sur chacun des nœuds.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        ports = list(range(args.port, args.port + args.nodes))
+        self.links = build_topology(ports, args.topology, args.degree, args.seed)
+        node_class = InProcessNode if args.mode == 'inprocess' else SubprocessNode
+        self.nodes = [node_class(port, self.links[port], args) for port in ports]
+        self.wallet = Wallet()  # Financé par la récompense du premier bloc
+        # Un expéditeur par nœud : ses transactions arrivent dans l'ordre de leurs nonces
+        self.load_wallets = [Wallet() for _ in self.nodes]
+        self.nonces = [0] * len(self.nodes)
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.mined = {}     # hash -> (instant du minage, port du mineur)
+        self.arrivals = {}  # hash -> {port: délai d'arrivée}
+        self.submitted = 0
+        self.accepted = 0
+        self.submit_errors = 0
+
+    def start(self):
+        for node in self.nodes:
+            node.start()
+        if self.args.mode == 'subprocess':
+            for node in self.nodes:
+                node.wait_ready()
+
+    def stop(self):
+        for node in self.nodes:
+            node.stop()
+
+    def fund(self):
+        """
+        Mine un premier bloc, vide, dont la récompense finance le portefeuille
+        d'amorce, puis un second qui la répartit entre les portefeuilles de
+        charge des nœuds.
+        """
+        self.mine_funding([])
+        share = from_units(to_units(MINING_REWARD) // (len(self.load_wallets) + 1))
+        self.mine_funding([self.wallet.create_transaction(wallet.get_address(), share, nonce=i).to_dict()
+                           for i, wallet in enumerate(self.load_wallets)])
+
+    def mine_funding(self, transactions):
+        if transactions:
+            self.nodes[0].submit(transactions)
+        block_hash = self.nodes[0].mine(self.wallet.get_address(), allow_empty=not transactions)
+        if block_hash is None:
+            raise RuntimeError("Impossible de miner le bloc de financement")
+        if self.wait_converged(self.args.convergence_timeout) is None:
+            raise RuntimeError("Le bloc de financement ne s'est pas propagé")
+
+    def generate_load(self):
+        """Transactions signées, par lots tous les dixièmes de seconde, vers un nœud tiré au hasard."""
+        tick = 0.1
+        per_tick = self.args.tx_rate * tick
+        owed = 0.0
+        sequence = 0
+        next_tick = time.perf_counter()
+        while not self.stopped.is_set():
+            owed += per_tick
+            count = int(owed)
+            owed -= count
+            if count:
+                index = self.rng.randrange(len(self.nodes))
+                wallet, nonce = self.load_wallets[index], self.nonces[index]
+                transactions = [wallet.create_transaction(f"sim-{sequence + i}", 0.0001, nonce=nonce + i).to_dict()
+                                for i in range(count)]
+                sequence += count
+                try:
+                    accepted = self.nodes[index].submit(transactions)
+                except Exception:
+                    accepted = 0
+                    self.submit_errors += 1
+                # Les transactions refusées laissent leurs nonces au lot suivant
+                self.nonces[index] += accepted
+                self.submitted += count
+                self.accepted += accepted
+            next_tick += tick
+            self.stopped.wait(max(0.0, next_tick - time.perf_counter()))
+
+    def mine_loop(self, node):
+        """Mineur : un bloc en moyenne toutes les `block_interval` secondes à l'échelle du réseau."""
+        address = f"sim-mineur-{node.port}"
+        rng = random.Random(self.args.seed * 7919 + node.port)
+        mean = self.args.block_interval * self.args.miners
+        while not self.stopped.wait(rng.expovariate(1 / mean)):
+            try:
+                block_hash = node.mine(address)
+            except Exception:
+                continue
+            if block_hash:
+                with self.lock:
+                    self.mined[block_hash] = (time.perf_counter(), node.port)
+                    self.arrivals[block_hash] = {node.port: 0.0}
+
+    def observe(self, until):
+        """Relève l'arrivée des blocs minés sur chaque nœud jusqu'à `until`."""
+        while not until.is_set():
+            with self.lock:
+                pending = [(h, set(self.arrivals[h])) for h in self.mined if len(self.arrivals[h]) < len(self.nodes)]
+            for block_hash, seen in pending:
+                mined_at = self.mined[block_hash][0]
+                for node in self.nodes:
+                    if node.port in seen:
+                        continue
+                    try:
+                        present = node.has_block(block_hash)
+                    except Exception:
+                        present = False
+                    if present:
+                        with self.lock:
+                            self.arrivals[block_hash].setdefault(node.port, time.perf_counter() - mined_at)
+            until.wait(self.args.poll_interval)
+
+    def wait_converged(self, timeout):
+        """Attend que tous les nœuds aient le même sommet : durée d'attente, ou None."""
+        start = time.perf_counter()
+        while time.perf_counter() - start < timeout:
+            try:
+                if len({node.tip() for node in self.nodes}) == 1:
+                    return time.perf_counter() - start
+            except Exception:
+                pass
+            time.sleep(self.args.poll_interval)
+        return None
+
+    def run(self):
+        args = self.args
+        self.fund()
+
+        miners = self.rng.sample(self.nodes, min(args.miners, len(self.nodes)))
+        observer_stopped = threading.Event()
+        threads = [threading.Thread(target=self.generate_load, daemon=True)]
+        threads += [threading.Thread(target=self.mine_loop, args=(node,), daemon=True) for node in miners]
+        observer = threading.Thread(target=self.observe, args=(observer_stopped,), daemon=True)
+        observer.start()
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        self.stopped.wait(args.duration)
+        self.stopped.set()
+        for thread in threads:
+            thread.join()
+        load_duration = time.perf_counter() - start
+
+        convergence = self.wait_converged(args.convergence_timeout)
+        # Laisse l'observateur relever les derniers blocs propagés par la convergence
+        time.sleep(args.poll_interval * 2)
+        observer_stopped.set()
+        observer.join()
+
+        main_chain = set(self.nodes[0].main_chain())
+        with self.lock:
+            mined = dict(self.mined)
+            arrivals = {h: dict(a) for h, a in self.arrivals.items()}
+        stale = [h for h in mined if h not in main_chain]
+        full = [max(a.values()) for a in arrivals.values() if len(a) == len(self.nodes)]
+        per_node = [delay for h, a in arrivals.items() for port, delay in a.items() if port != mined[h][1]]
+
+        return {
+            'load_duration_s': load_duration,
+            'blocks_mined': len(mined),
+            'stale_blocks': len(stale),
+            'fork_rate': len(stale) / len(mined) if mined else 0.0,
+            'blocks_fully_propagated': len(full),
+            'propagation_all_nodes_s': summary(full),
+            'propagation_per_node_s': summary(per_node),
+            'convergence_s': convergence,
+            'converged': convergence is not None,
+            'final_height': len(main_chain) - 1,
+            'tx_submitted': self.submitted,
+            'tx_accepted': self.accepted,
+            'tx_submit_errors': self.submit_errors,
+            'tx_rate_per_s': self.accepted / load_duration if load_duration else 0.0,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulation locale d'un réseau de nœuds blockchain")
+    parser.add_argument('--mode', choices=['inprocess', 'subprocess'], default='inprocess')
+    parser.add_argument('--nodes', type=int, default=5, help="Nombre de nœuds")
+    parser.add_argument('--port', type=int, default=7300, help="Premier port P2P (API à +1000 en mode subprocess)")
+    parser.add_argument('--backend', choices=['threaded', 'asyncio'], default='threaded')
+    parser.add_argument('--topology', choices=TOPOLOGIES, default='full')
+    parser.add_argument('--degree', type=int, default=3, help="Degré visé pour la topologie random")
+    parser.add_argument('--latency', type=float, default=0.0, help="Latence injectée par requête (secondes)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Gigue injectée (secondes)")
+    parser.add_argument('--loss', type=float, default=0.0, help="Probabilité de perte d'une requête")
+    parser.add_argument('--tx-rate', type=float, default=10.0, help="Transactions générées par seconde")
+    parser.add_argument('--miners', type=int, default=2, help="Nœuds qui minent")
+    parser.add_argument('--block-interval', type=float, default=2.0,
+                        help="Intervalle moyen entre deux blocs à l'échelle du réseau (secondes)")
+    parser.add_argument('--mining-workers', type=int, default=1,
+                        help="Processus de minage par nœud (mode inprocess uniquement)")
+    parser.add_argument('--duration', type=float, default=20.0, help="Durée de la charge (secondes)")
+    parser.add_argument('--sync-interval', type=float, default=5.0, help="Synchronisation périodique des nœuds")
+    parser.add_argument('--poll-interval', type=float, default=0.05, help="Période de relevé des arrivées de blocs")
+    parser.add_argument('--convergence-timeout', type=float, default=60.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Fichier JSON des résultats (sinon sortie standard)")
+    args = parser.parse_args(argv)
+
+    if args.mode == 'inprocess':
+        # Les journaux de N nœuds dans une même console seraient illisibles
+        logging.getLogger('node').setLevel(logging.WARNING)
+
+    meta = {
+        'timestamp': time.time(),
+        'revision': git_revision(),
+        'difficulty': DIFFICULTY,
+        **{k: v for k, v in vars(args).items() if k != 'output'},
+    }
+    simulation = Simulation(args)
+    print(f"Démarrage de {args.nodes} nœuds ({args.mode}, topologie {args.topology})...", file=sys.stderr)
+    try:
+        simulation.start()
+        print(f"Charge pendant {args.duration} s...", file=sys.stderr)
+        results = simulation.run()
+    finally:
+        simulation.stop()
+
+    report = json.dumps({'meta': meta, 'topology': {p: sorted(l) for p, l in simulation.links.items()},
+                         'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+    return 0 if results['converged'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import random
+import contextlib
+import io
+from node.blockchain import Blockchain
+from node.block import Block
+from node.wallet import Wallet
+from node.transaction import Transaction, NETWORK_SENDER, to_units, from_units
+from config import MINING_REWARD, TARGET_BLOCK_TIME
+
+
+def quiet():
+    """Coupe les affichages du nœud (minage, ajouts de blocs) pendant une mesure."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def signed_transactions(wallet, count, amount=0.001, fee=0.0, seed=0, nonce=0):
+    """
+    Transactions signées par `wallet` vers des destinataires distincts et
+    reproductibles, de nonces consécutifs à partir de `nonce`.
+    """
+    rng = random.Random(seed)
+    return [
+        wallet.create_transaction(f"bench-{seed}-{i}-{rng.getrandbits(32):08x}", amount, fee, nonce + i).to_dict()
+        for i in range(count)
+    ]
+
+
+def build_chain(blocks, txs_per_block, seed=0):
+    """
+    Construit une chaîne synthétique de `blocks` blocs minés après le genesis,
+    chacun avec `txs_per_block` transactions signées (plus la récompense).
+    Les récompenses financent le portefeuille du mineur, qui émet les
+    transactions des blocs suivants. Retourne (blockchain, portefeuille).
+    """
+    wallet = Wallet()
+    blockchain = Blockchain()
+    fee = 0.0001
+    with quiet():
+        for height in range(1, blocks + 1):
+            # Le premier bloc ne contient que la récompense qui finance le portefeuille
+            count = txs_per_block if height > 1 else 0
+            transactions = signed_transactions(wallet, count, fee=fee, seed=seed * 1000003 + height,
+                                               nonce=blockchain.state.get_nonce(wallet.get_address()))
+            reward = Transaction(NETWORK_SENDER, wallet.get_address(),
+                                 from_units(to_units(MINING_REWARD) + sum(to_units(tx['fee']) for tx in transactions)))
+            last = blockchain.last_block
+            # Blocs espacés de l'intervalle visé : la cible reste celle du genesis
+            block = Block(height, last.hash, last.timestamp + TARGET_BLOCK_TIME, transactions + [reward.to_dict()],
+                          target=blockchain.next_target(), state_root=blockchain.next_state_root())
+            proof = blockchain.proof_of_work(block)
+            if proof is None or not blockchain.add_block(block, proof):
+                raise RuntimeError(f"Échec de la construction du bloc synthétique {height}")
+    return blockchain, wallet
+
+
+def cold_copy(chain):
+    """Copie des blocs sans hash en cache, comme s'ils venaient d'être reçus du réseau."""
+    return [Block.from_dict(block.to_dict()) for block in chain]
@@ -1,4 +1,62 @@
 PORT_BASE = 5000            # Port de base (les nœuds s’écartent de cette base)
-DIFFICULTY = 4              # Nombre de zéros au début du hash (PoW)
+DIFFICULTY = 4              # Difficulté minimale : zéros hexadécimaux en tête du hash (cible du genesis)
 MINING_REWARD = 50          # Récompense minage en UTBM
 PEER_TIMEOUT = 10           # Timeout en secondes pour les peers
+MEMPOOL_MAX_SIZE = 10000    # Nombre max de transactions en attente (les moins rémunératrices sont évincées)
+MIN_TX_VALUE = 0.0001       # Montant + frais minimal d'une transaction admise au mempool (UTBM)
+MINING_WORKERS = 0          # Processus de minage (0 = un par cœur)
+DATA_DIR = "data"           # Répertoire de stockage des blocs (un sous-dossier par nœud)
+WALLET_FILE = "wallet.pem"  # Clé privée du portefeuille, dans le sous-dossier du nœud
+BLOCKSTORE_SEGMENT_SIZE = 16 * 1024 * 1024  # Taille max d'un fichier segment
+BLOCKSTORE_MMAP = True      # Relecture des segments via mmap
+SNAPSHOT_INTERVAL = 100     # Instantané des soldes tous les N blocs
+PEER_IDLE_TIMEOUT = 60      # Fermeture des connexions entrantes inactives (secondes)
+POOL_MAX_CONNECTIONS = 4    # Connexions gardées ouvertes par peer
+MAX_FRAME_SIZE = 64 * 1024 * 1024  # Taille max d'un message réseau
+COMPRESSION_THRESHOLD = 1024  # Compression zlib au-delà de cette taille (octets)
+NETWORK_BACKEND = "threaded"  # "threaded" (un thread par connexion) ou "asyncio"
+MAX_INBOUND_CONNECTIONS = 256  # Connexions entrantes traitées simultanément (asyncio)
+MAX_OUTBOUND_REQUESTS = 64  # Requêtes sortantes simultanées (asyncio)
+MESSAGE_HANDLER_WORKERS = 8  # Threads exécutant les callbacks des messages (asyncio)
+BROADCAST_WORKERS = 16      # Envois simultanés lors d'une diffusion
+BROADCAST_DEADLINE = 3      # Délai max (secondes) accordé à chaque peer par diffusion
+BROADCAST_RETRIES = 2       # Nouvelles tentatives par peer en cas d'échec
+BROADCAST_BACKOFF = 0.2     # Attente initiale entre tentatives (doublée à chaque fois)
+PEER_MAX_FAILURES = 5       # Échecs consécutifs avant d'oublier un peer
+SYNC_BATCH_SIZE = 500       # Blocs (ou en-têtes) demandés par message lors d'une synchronisation
+IBD_CHUNK_SIZE = 200        # Blocs par plage lors du téléchargement initial
+IBD_CHUNK_TIMEOUT = 15      # Au-delà (secondes), une plage est réattribuée à un autre peer
+IBD_VALIDATION_WORKERS = 0  # Processus de vérification de la preuve de travail (0 = un par cœur)
+CHAIN_STREAM_BATCH = 100    # Blocs par trame / par morceau lors de l'envoi de la chaîne
+VALIDATION_WORKERS = 0      # Processus de vérification des blocs (0 = un par cœur)
+VALIDATION_PARALLEL_THRESHOLD = 64  # En dessous, les preuves de travail sont vérifiées sans pool
+VALIDATION_CACHE_SIZE = 100000  # Résultats de validation de blocs gardés en cache
+ORPHAN_POOL_SIZE = 100      # Blocs reçus avant leur parent gardés en attente
+SIDE_BRANCH_DEPTH = 100     # Profondeur au-delà de laquelle les branches secondaires sont oubliées
+SIDE_POOL_SIZE = 500        # Blocs de branches secondaires gardés au plus (les plus anciens sont oubliés)
+SIGNATURE_WORKERS = 0       # Processus de vérification des signatures (0 = un par cœur)
+SIGNATURE_PARALLEL_THRESHOLD = 256  # En dessous, les signatures sont vérifiées sans pool
+SIGNATURE_CACHE_SIZE = 200000  # Hashes de transactions dont la signature a été vérifiée
+MAX_BLOCK_TXS = 2000        # Transactions max par bloc (hors récompense de minage)
+MAX_BLOCK_SIZE = 1024 * 1024  # Taille max des transactions d'un bloc (octets encodés)
+INV_BATCH_SIZE = 5000       # Hashes de transactions annoncés par message INV
+INV_MAX_SIZE = 50000        # Hashes (ou transactions) traités au plus par message INV / TXS reçu
+MAX_BATCH_TRANSACTIONS = 10000  # Transactions acceptées par requête /transactions/batch
+API_HOST = "127.0.0.1"      # Adresse d'écoute de l'API REST
+API_THREADS = 8             # Threads du serveur WSGI (waitress)
+API_MAX_CONCURRENT_REQUESTS = 64  # Au-delà, l'API répond 503 immédiatement
+API_CONNECTION_LIMIT = 256  # Connexions HTTP ouvertes simultanément (waitress)
+API_KEEPALIVE_TIMEOUT = 30  # Fermeture des connexions keep-alive inactives (secondes)
+HISTORY_PAGE_SIZE = 50      # Transactions par page de /address/<adresse>/history (défaut)
+HISTORY_MAX_PAGE_SIZE = 1000  # Taille de page maximale acceptée
+LOG_LEVEL = "INFO"          # Niveau des journaux du nœud (DEBUG, INFO, WARNING, ERROR)
+LOG_RATE_LIMIT = 20         # Messages identiques affichés au plus par intervalle...
+LOG_RATE_INTERVAL = 10      # ... de cette durée (secondes), les suivants sont comptés puis résumés
+BOOTSTRAP_PEERS = [5001, 5002, 5003]  # Peers contactés au démarrage (hors liste fixe --peers)
+SYNC_INTERVAL = 30          # Intervalle de la synchronisation périodique (secondes)
+TARGET_BLOCK_TIME = 10      # Intervalle visé entre deux blocs (secondes)
+RETARGET_WINDOW = 20        # Blocs récents utilisés pour réajuster la cible
+RETARGET_MAX_ADJUST = 4     # Facteur maximal de variation de la cible à chaque bloc
+MEDIAN_TIME_SPAN = 11       # Le timestamp d'un bloc dépasse la médiane de ceux des N blocs précédents
+MAX_FUTURE_BLOCK_TIME = 120  # Avance maximale (secondes) d'un timestamp de bloc sur l'horloge locale
+PRUNE_DEPTH = 0             # Mode élagué : blocs récents gardés complets, > SNAPSHOT_INTERVAL (0 = nœud complet)
@@ -1,97 +1,435 @@
+import json
+import time
+import struct
 import threading
-from flask import Flask, jsonify, request
+from flask import Flask, Blueprint, Response, current_app, g, jsonify, request
 from node.blockchain import Blockchain
-from node.transaction import Transaction
+from node.transaction import Transaction, valid_amount, valid_nonce
+from node import metrics
+from node.logger import get_logger
+from config import (CHAIN_STREAM_BATCH, MAX_BATCH_TRANSACTIONS, API_HOST, API_THREADS,
+                    API_MAX_CONCURRENT_REQUESTS, API_CONNECTION_LIMIT, API_KEEPALIVE_TIMEOUT,
+                    HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
 
-app = Flask(__name__)
+try:
+    import waitress  # Serveur WSGI de production (dépendance optionnelle)
+except ImportError:
+    waitress = None
 
-blockchain = None
-network = None
-wallet = None
+log = get_logger(__name__)
+
+api = Blueprint('node_api', __name__)
+
+API_REQUEST_SECONDS = metrics.histogram('node_api_request_seconds',
+                                        "Latence des requêtes de l'API REST, par route, méthode et statut",
+                                        ['route', 'method', 'status'])
+API_REJECTED = metrics.counter('node_api_rejected_total', "Requêtes refusées (503) par la limite de concurrence")
+
+
+class NodeContext:
+    """État du nœud injecté dans l'application Flask (voir create_app)."""
+
+    def __init__(self, blockchain, network, wallet):
+        self.blockchain = blockchain
+        self.network = network
+        self.wallet = wallet
+        # Un seul minage à la fois : les autres requêtes ne restent pas bloquées derrière
+        self.mining_lock = threading.Lock()
+
+
+def node_context():
+    return current_app.extensions['node']
+
+
+def create_app(blockchain, network=None, wallet=None):
+    """Application Flask de l'API, liée à l'état du nœud passé en paramètre."""
+    app = Flask(__name__)
+    app.extensions['node'] = NodeContext(blockchain, network, wallet)
+    app.register_blueprint(api)
+    return app
+
+
+class ConcurrencyLimiter:
+    """
+    Middleware WSGI : au-delà de max_requests requêtes en cours, les
+    suivantes reçoivent immédiatement une réponse 503 au lieu de s'accumuler.
+    """
+
+    def __init__(self, app, max_requests=API_MAX_CONCURRENT_REQUESTS):
+        self.app = app
+        self.slots = threading.BoundedSemaphore(max_requests)
+
+    def __call__(self, environ, start_response):
+        if not self.slots.acquire(blocking=False):
+            API_REJECTED.inc()
+            body = json.dumps({"error": "Serveur surchargé, réessayez plus tard"}).encode()
+            start_response('503 Service Unavailable', [('Content-Type', 'application/json'),
+                                                       ('Content-Length', str(len(body))),
+                                                       ('Retry-After', '1')])
+            return [body]
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            self.slots.release()
+            raise
+        # Le corps des réponses en streaming est produit après le retour de
+        # l'appel : la place n'est rendue qu'à la fermeture de la réponse
+        return ClosingResponse(response, self.slots.release)
+
+
+class ClosingResponse:
+    """
+    Corps de réponse WSGI qui appelle `on_close` lorsque le serveur le ferme
+    (PEP 3333 : close() est appelé même si le client se déconnecte ou si le
+    corps n'est pas lu jusqu'au bout), après avoir fermé le corps d'origine.
+    """
+
+    def __init__(self, response, on_close):
+        self.response = response
+        self.on_close = on_close
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.response)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            close = getattr(self.response, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self.on_close()
+
+
+def serve(app, port, host=API_HOST, threads=API_THREADS):
+    """
+    Sert l'API en mode production : waitress si installé (pool de threads,
+    connexions keep-alive, nombre de connexions borné), sinon le serveur
+    multi-thread de werkzeug en HTTP/1.1 (keep-alive). Dans les deux cas le
+    nombre de requêtes simultanées est limité par ConcurrencyLimiter.
+    """
+    wsgi_app = ConcurrencyLimiter(app)
+    if waitress is not None:
+        waitress.serve(wsgi_app, host=host, port=port, threads=threads,
+                       connection_limit=API_CONNECTION_LIMIT, channel_timeout=API_KEEPALIVE_TIMEOUT,
+                       ident='utbm-node')
+        return
+
+    log.warning("waitress absent (voir requirements.txt) : API servie par le serveur de développement werkzeug")
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+    make_server(host, port, wsgi_app, threaded=True, request_handler=KeepAliveHandler).serve_forever()
 
-def setup_api(bc, net, wal):
-    global blockchain, network, wallet
-    blockchain = bc
-    network = net
-    wallet = wal
 
 class NodeAPI:
     def __init__(self, blockchain, network, wallet):
         self.blockchain = blockchain
         self.network = network
         self.wallet = wallet
+        self.app = create_app(blockchain, network, wallet)
 
     def run(self, port):
         
         self.port = port
-        self.app_thread = threading.Thread(
-            target=lambda: app.run(port=port, debug=False, use_reloader=False)
-        )
+        self.app_thread = threading.Thread(target=serve, args=(self.app, port))
         self.app_thread.daemon = True
         self.app_thread.start()
 
-@app.route('/chain', methods=['GET'])
+def page_args(default_limit=None):
+    """Paramètres de pagination ?start=&limit= : (start, limit, erreur)."""
+    try:
+        start = int(request.args.get('start', 0))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit is not None else default_limit
+    except ValueError:
+        return None, None, "Paramètres 'start' et 'limit' entiers attendus"
+    if start < 0 or (limit is not None and limit < 0):
+        return None, None, "Paramètres 'start' et 'limit' positifs attendus"
+    return start, limit, None
+
+@api.before_app_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@api.after_app_request
+def record_latency(response):
+    # Route générique (ex : /balance/<string:address>) : une série par route, pas par adresse
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'inconnue'
+        API_REQUEST_SECONDS.observe(time.perf_counter() - start, route=route, method=request.method,
+                                    status=response.status_code)
+    return response
+
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Métriques du nœud au format texte Prometheus."""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@api.route('/chain', methods=['GET'])
 def get_chain():
-    if blockchain is None:
+    node = node_context()
+    if node.blockchain is None:
         return jsonify({"error": "Blockchain non initialisée"}), 500
 
-    chain_data = [block.to_dict() for block in blockchain.chain]
-    return jsonify({"length": len(chain_data), "chain": chain_data})
+    # Pagination optionnelle : /chain?start=<index>&limit=<nombre>
+    start, limit, error = page_args()
+    if error:
+        return jsonify({"error": error}), 400
 
-@app.route('/mine', methods=['GET'])
+    chain = node.blockchain.chain
+    length = len(chain)
+    end = length if limit is None else min(start + limit, length)
+
+    def generate():
+        # Réponse envoyée par morceaux (chunked) : seul un lot de blocs est
+        # sérialisé en mémoire à la fois, quelle que soit la taille de la chaîne
+        yield f'{{"length": {length}, "start": {start}, "chain": ['
+        for batch_start in range(start, end, CHAIN_STREAM_BATCH):
+            batch = chain[batch_start:min(batch_start + CHAIN_STREAM_BATCH, end)]
+            encoded = ", ".join(json.dumps(block.to_dict()) for block in batch)
+            yield (", " if batch_start > start else "") + encoded
+        yield ']}'
+
+    return Response(generate(), mimetype='application/json')
+
+@api.route('/mine', methods=['GET'])
 def mine():
-    if blockchain is None:
+    node = node_context()
+    if node.blockchain is None:
         return jsonify({"error": "Blockchain non initialisée"}), 500
 
     miner_address = request.args.get('miner_address')
     if not miner_address:
         return jsonify({"error": "Paramètre 'miner_address' manquant"}), 400
 
-    block = blockchain.mine(miner_address)
+    # La preuve de travail occupe un thread : un seul minage à la fois, les
+    # routes de lecture gardent les autres threads du serveur
+    if not node.mining_lock.acquire(blocking=False):
+        return jsonify({"error": "Minage déjà en cours"}), 409
+    try:
+        # Le bloc miné est diffusé aux peers comme depuis le CLI
+        block = node.blockchain.mine(miner_address, node.network, allow_empty=request.args.get('empty') == '1')
+    finally:
+        node.mining_lock.release()
     if not block:
         return jsonify({"message": "Pas de transactions à miner"}), 400
     return jsonify({"message": "Bloc miné", "block": block.to_dict()})
 
-@app.route('/new_transaction', methods=['POST'])
+def build_transaction(tx_data, wallet, nonce=0):
+    """
+    Construit une Transaction à partir des données reçues. Retourne
+    (transaction, None) ou (None, message d'erreur). `nonce` sert aux
+    transactions signées par le portefeuille du nœud ; une transaction
+    déjà signée apporte le sien.
+    """
+    if not isinstance(tx_data, dict):
+        return None, "Données transaction manquantes"
+    for field in ["recipient", "amount"]:
+        if field not in tx_data:
+            return None, f"Champ manquant : {field}"
+
+    try:
+        amount = float(tx_data['amount'])
+        fee = float(tx_data.get('fee', 0))
+    except (ValueError, TypeError, OverflowError):  # OverflowError : entier JSON hors des doubles
+        return None, "Montant ou frais invalides"
+    if not (valid_amount(amount) and valid_amount(fee)):
+        return None, "Montant ou frais invalides (nombres finis et positifs, 8 décimales au plus)"
+
+    if tx_data.get('signature'):
+        # Transaction déjà signée par le client
+        if not tx_data.get('sender') or not tx_data.get('public_key'):
+            return None, "Champs 'sender' et 'public_key' requis avec une signature"
+        if not valid_nonce(tx_data.get('nonce', 0)):
+            return None, "Nonce invalide (entier positif attendu)"
+        transaction = Transaction(tx_data['sender'], tx_data['recipient'], amount, fee,
+                                  tx_data['public_key'], tx_data['signature'], tx_data.get('nonce', 0))
+    else:
+        # Sinon la transaction est émise et signée par le portefeuille du nœud
+        if wallet is None:
+            return None, "Wallet non initialisé"
+        if tx_data.get('sender', wallet.get_address()) != wallet.get_address():
+            return None, "Signature manquante pour un expéditeur externe"
+        transaction = Transaction(wallet.get_address(), tx_data['recipient'], amount, fee, nonce=nonce)
+
+    # Champs non encodables (chaîne trop longue, surrogate isolé, type inattendu)
+    try:
+        transaction.encode()
+    except (UnicodeError, AttributeError, TypeError, struct.error):
+        return None, "Transaction mal formée (champs texte invalides)"
+    if not tx_data.get('signature'):
+        wallet.sign_transaction(transaction)
+    return transaction, None
+
+@api.route('/new_transaction', methods=['POST'])
 def new_transaction():
-    if blockchain is None:
+    node = node_context()
+    if node.blockchain is None:
         return jsonify({"error": "Blockchain non initialisée"}), 500
 
     tx_data = request.get_json()
-    required_fields = ["sender", "recipient", "amount"]
     if not tx_data:
         return jsonify({"error": "Données transaction manquantes"}), 400
 
-    for field in required_fields:
-        if field not in tx_data:
-            return jsonify({"error": f"Champ manquant : {field}"}), 400
+    nonce = node.blockchain.next_nonce(node.wallet.get_address()) if node.wallet else 0
+    transaction, error = build_transaction(tx_data, node.wallet, nonce)
+    if error:
+        return jsonify({"error": error}), 400
 
-    try:
-        amount = float(tx_data['amount'])
-    except (ValueError, TypeError):
-        return jsonify({"error": "Montant invalide"}), 400
+    if not node.blockchain.add_new_transaction(transaction.to_dict()):
+        return jsonify({"error": "Transaction refusée (signature ou solde invalide)"}), 400
+    return jsonify({"message": "Transaction ajoutée", "tx_hash": transaction.compute_hash()}), 201
+
+@api.route('/transactions/batch', methods=['POST'])
+def new_transactions_batch():
+    """
+    Admission d'un lot de transactions : {"transactions": [...]} ou une liste.
+    Le lot est validé en une passe puis relayé aux peers par annonces groupées.
+    """
+    node = node_context()
+    if node.blockchain is None:
+        return jsonify({"error": "Blockchain non initialisée"}), 500
+
+    data = request.get_json()
+    tx_list = data.get('transactions') if isinstance(data, dict) else data
+    if not isinstance(tx_list, list) or not tx_list:
+        return jsonify({"error": "Liste de transactions manquante"}), 400
+    if len(tx_list) > MAX_BATCH_TRANSACTIONS:
+        return jsonify({"error": f"Au plus {MAX_BATCH_TRANSACTIONS} transactions par lot"}), 413
+
+    results = [None] * len(tx_list)
+    built = []  # (position dans le lot, transaction)
+    # Les transactions signées par le portefeuille du nœud prennent des nonces consécutifs
+    nonce = node.blockchain.next_nonce(node.wallet.get_address()) if node.wallet else 0
+    for i, tx_data in enumerate(tx_list):
+        transaction, error = build_transaction(tx_data, node.wallet, nonce)
+        if error:
+            results[i] = {"tx_hash": None, "error": error}
+        else:
+            built.append((i, transaction.to_dict()))
+            if not tx_data.get('signature'):
+                nonce += 1
+
+    admitted = node.blockchain.add_transactions([tx for _, tx in built])
+    accepted, accepted_hashes = [], []
+    for (i, tx), (tx_hash, error) in zip(built, admitted):
+        results[i] = {"tx_hash": tx_hash, "error": error}
+        if error is None:
+            accepted.append(tx)
+            accepted_hashes.append(tx_hash)
+
+    if node.network is not None and accepted:
+        node.network.broadcaster.announce_transactions(accepted, accepted_hashes)
+
+    return jsonify({
+        "accepted": len(accepted),
+        "rejected": len(tx_list) - len(accepted),
+        "results": results
+    })
+
+@api.route('/proof/<string:tx_hash>', methods=['GET'])
+def proof(tx_hash):
+    node = node_context()
+    if node.blockchain is None:
+        return jsonify({"error": "Blockchain non initialisée"}), 500
+
+    tx_proof = node.blockchain.get_proof(tx_hash)
+    if tx_proof is None:
+        return jsonify({"error": "Transaction introuvable"}), 404
+    return jsonify(tx_proof)
+
+def confirmed_entry(blockchain, block, position, transaction):
+    return {
+        "tx_hash": block.tx_hashes()[position],
+        "transaction": transaction,
+        "block_index": block.index,
+        "block_hash": block.hash,
+        "position": position,
+        "confirmations": len(blockchain.chain) - block.index
+    }
+
+@api.route('/block/<string:block_hash>', methods=['GET'])
+def block_by_hash(block_hash):
+    node = node_context()
+    if node.blockchain is None:
+        return jsonify({"error": "Blockchain non initialisée"}), 500
+
+    block = node.blockchain.get_block(block_hash)
+    if block is None:
+        return jsonify({"error": "Bloc introuvable"}), 404
+    return jsonify(block.to_dict())
+
+@api.route('/block/height/<int:height>', methods=['GET'])
+def block_by_height(height):
+    node = node_context()
+    if node.blockchain is None:
+        return jsonify({"error": "Blockchain non initialisée"}), 500
+
+    block = node.blockchain.get_block_at(height)
+    if block is None:
+        return jsonify({"error": "Bloc introuvable"}), 404
+    return jsonify(block.to_dict())
+
+@api.route('/tx/<string:tx_hash>', methods=['GET'])
+def transaction_by_hash(tx_hash):
+    node = node_context()
+    if node.blockchain is None:
+        return jsonify({"error": "Blockchain non initialisée"}), 500
+
+    found = node.blockchain.get_transaction(tx_hash)
+    if found is not None:
+        return jsonify(confirmed_entry(node.blockchain, *found))
+
+    # Pas encore minée : encore en attente dans le mempool ?
+    pending = node.blockchain.mempool.get(tx_hash)
+    if pending is None:
+        return jsonify({"error": "Transaction introuvable"}), 404
+    return jsonify({"tx_hash": tx_hash, "transaction": pending, "confirmations": 0})
+
+@api.route('/address/<string:address>/history', methods=['GET'])
+def address_history(address):
+    """
+    Transactions confirmées d'une adresse, des plus récentes aux plus
+    anciennes : /address/<adresse>/history?start=<décalage>&limit=<nombre>
+    """
+    node = node_context()
+    if node.blockchain is None:
+        return jsonify({"error": "Blockchain non initialisée"}), 500
+
+    start, limit, error = page_args(HISTORY_PAGE_SIZE)
+    if error:
+        return jsonify({"error": error}), 400
+    limit = min(limit, HISTORY_MAX_PAGE_SIZE)
 
-    transaction = Transaction(tx_data['sender'], tx_data['recipient'], amount)
-    blockchain.add_new_transaction(transaction.to_dict())
-    return jsonify({"message": "Transaction ajoutée"}), 201
+    total, history = node.blockchain.get_address_history(address, start, limit)
+    return jsonify({
+        "address": address,
+        "total": total,
+        "start": start,
+        "limit": limit,
+        "transactions": [confirmed_entry(node.blockchain, *entry) for entry in history]
+    })
 
-@app.route('/peers', methods=['GET'])
+@api.route('/peers', methods=['GET'])
 def peers():
-    if network is None:
+    node = node_context()
+    if node.network is None:
         return jsonify({"error": "Network non initialisé"}), 500
-    peers = network.get_peers()
+    peers = node.network.get_peers()
     return jsonify({"peers": peers})
 
-@app.route('/balance/<string:address>', methods=['GET'])
+@api.route('/balance/<string:address>', methods=['GET'])
 def balance(address):
-    if blockchain is None:
+    node = node_context()
+    if node.blockchain is None:
         return jsonify({"error": "Blockchain non initialisée"}), 500
 
-    bal = 0
-    for block in blockchain.chain:
-        for tx in block.transactions:
-            if tx['recipient'] == address:
-                bal += tx['amount']
-            if tx['sender'] == address:
-                bal -= tx['amount']
+    bal = node.blockchain.get_balance(address)
     return jsonify({"address": address, "balance": bal})
@@ -0,0 +1,214 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import (PEER_TIMEOUT, PEER_IDLE_TIMEOUT, POOL_MAX_CONNECTIONS, MAX_INBOUND_CONNECTIONS,
+                    MAX_OUTBOUND_REQUESTS, MESSAGE_HANDLER_WORKERS)
+from node.network import P2PNode, INBOUND, PEER_BYTES_SENT, PEER_BYTES_RECEIVED
+from node.protocol import read_frame, write_message
+from node.logger import get_logger
+
+log = get_logger(__name__)
+
+
+class AsyncConnectionPool:
+    """Équivalent asyncio de ConnectionPool : (reader, writer) persistants par peer."""
+
+    def __init__(self, max_per_peer=POOL_MAX_CONNECTIONS, idle_timeout=PEER_IDLE_TIMEOUT):
+        self.max_per_peer = max_per_peer
+        self.idle_timeout = idle_timeout / 2
+        self.idle = {}  # peer -> [(reader, writer, dernière utilisation)]
+
+    async def acquire(self, peer_port):
+        now = time.time()
+        connections = self.idle.get(peer_port, [])
+        while connections:
+            reader, writer, last_used = connections.pop()
+            if now - last_used < self.idle_timeout and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection('127.0.0.1', peer_port), PEER_TIMEOUT
+        )
+        return reader, writer, False
+
+    def release(self, peer_port, reader, writer):
+        connections = self.idle.setdefault(peer_port, [])
+        if len(connections) < self.max_per_peer:
+            connections.append((reader, writer, time.time()))
+        else:
+            writer.close()
+
+    def close(self):
+        for connections in self.idle.values():
+            for _, writer, _ in connections:
+                writer.close()
+        self.idle.clear()
+
+
+class AsyncP2PNode(P2PNode):
+    """
+    Nœud P2P basé sur une boucle asyncio unique au lieu d'un thread par
+    connexion. Il expose la même interface que P2PNode (mêmes callbacks,
+    mêmes méthodes synchrones) : la boucle tourne dans un thread dédié et
+    les appels synchrones y sont délégués.
+
+    Les callbacks (ajout de bloc, de transaction...) restent bloquants et
+    sont exécutés dans un pool de threads borné pour ne pas geler la boucle.
+    """
+
+    def __init__(self, port):
+        super().__init__(port)
+        self.server.listen(MAX_INBOUND_CONNECTIONS)
+        self.server.setblocking(False)
+        self.pool = AsyncConnectionPool()
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=MESSAGE_HANDLER_WORKERS)
+        self._loop_thread = None
+        self._inbound_slots = None
+        self._outbound_slots = None
+        self._server = None
+        self._connections = set()  # Tâches des connexions entrantes en cours
+
+    def start(self):
+        ready = threading.Event()
+        self._loop_thread = threading.Thread(target=self._run_loop, args=(ready,), daemon=True)
+        self._loop_thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._start_server())
+        ready.set()
+        self.loop.run_forever()
+
+    async def _start_server(self):
+        # Les sémaphores doivent être créés dans la boucle qui les utilise
+        self._inbound_slots = asyncio.Semaphore(MAX_INBOUND_CONNECTIONS)
+        self._outbound_slots = asyncio.Semaphore(MAX_OUTBOUND_REQUESTS)
+        self._server = await asyncio.start_server(self._handle_connection, sock=self.server)
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            await self._serve_connection(reader, writer)
+        except asyncio.CancelledError:
+            pass  # Arrêt du nœud (stop) : la tâche se termine normalement
+        finally:
+            self._connections.discard(task)
+
+    async def _serve_connection(self, reader, writer):
+        # Au-delà de MAX_INBOUND_CONNECTIONS, la connexion attend sans être
+        # lue : le peer est ralenti par TCP plutôt que d'accumuler des messages
+        async with self._inbound_slots:
+            try:
+                while self.running:
+                    try:
+                        message, size = await asyncio.wait_for(read_frame(reader), PEER_IDLE_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        break
+                    if message is None:
+                        break
+                    PEER_BYTES_RECEIVED.inc(size, peer=INBOUND)
+                    response = await self.loop.run_in_executor(self.executor, self.handle_message, message)
+                    if isinstance(response, dict):
+                        PEER_BYTES_SENT.inc(await write_message(writer, response), peer=INBOUND)
+                    else:
+                        # Réponse en plusieurs trames : drain() entre chaque
+                        # trame borne la mémoire utilisée par un peer lent
+                        for part in response:
+                            PEER_BYTES_SENT.inc(await write_message(writer, part), peer=INBOUND)
+            except Exception as e:
+                log.error("Erreur dans handle_peer: %s", e)
+            finally:
+                writer.close()
+
+    async def async_request(self, peer_port, message):
+        """Envoie un message et attend la réponse, en réutilisant les connexions du pool."""
+        async with self._outbound_slots:
+            for attempt in range(2):
+                reader, writer, reused = await self.pool.acquire(peer_port)
+                try:
+                    sent = await asyncio.wait_for(write_message(writer, message), PEER_TIMEOUT)
+                    response, received = await asyncio.wait_for(read_frame(reader), PEER_TIMEOUT)
+                    if response is None:
+                        raise ConnectionError("Connexion fermée par le peer")
+                    PEER_BYTES_SENT.inc(sent, peer=peer_port)
+                    PEER_BYTES_RECEIVED.inc(received, peer=peer_port)
+                except (OSError, ConnectionError):
+                    writer.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except BaseException:
+                    # Y compris l'annulation (délai de l'appelant) : réponse jamais lue
+                    writer.close()
+                    raise
+                self.pool.release(peer_port, reader, writer)
+                return response
+
+    def _run(self, coroutine):
+        """Exécute une coroutine dans la boucle du nœud depuis un autre thread."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def _exchange(self, peer_port, message, timeout):
+        return self._run(asyncio.wait_for(self.async_request(peer_port, message), timeout))
+
+    def request_stream(self, peer_port, message, end_type):
+        reader, writer, _ = self._run(self.pool.acquire(peer_port))
+        try:
+            PEER_BYTES_SENT.inc(self._run(asyncio.wait_for(write_message(writer, message), PEER_TIMEOUT)),
+                                peer=peer_port)
+            while True:
+                response, size = self._run(asyncio.wait_for(read_frame(reader), PEER_TIMEOUT))
+                if response is None:
+                    raise ConnectionError("Connexion fermée par le peer")
+                PEER_BYTES_RECEIVED.inc(size, peer=peer_port)
+                yield response
+                if response.get('type') in (end_type, 'ERROR'):
+                    break
+        except BaseException:
+            self.loop.call_soon_threadsafe(writer.close)
+            raise
+        self.loop.call_soon_threadsafe(self.pool.release, peer_port, reader, writer)
+
+    async def async_broadcast(self, message, peers=None):
+        """
+        Envoie le même message à tous les peers en parallèle.
+        Retourne {peer: réponse ou exception}.
+        """
+        if peers is None:
+            peers = self.get_peers()
+        results = await asyncio.gather(
+            *(self.async_request(peer, message) for peer in peers),
+            return_exceptions=True
+        )
+        return dict(zip(peers, results))
+
+    def broadcast(self, message, peers=None):
+        return self._run(self.async_broadcast(message, peers))
+
+    def stop(self):
+        self.running = False
+
+        async def shutdown():
+            if self._server is not None:
+                self._server.close()
+            # Connexions en cours annulées et attendues : aucune tâche ne reste
+            # en suspens dans la boucle arrêtée
+            connections = list(self._connections)
+            for task in connections:
+                task.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+            if self._server is not None:
+                await self._server.wait_closed()
+            self.pool.close()
+
+        if self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        else:
+            self.server.close()
+        self.executor.shutdown(wait=False)
+        self.broadcaster.shutdown()
@@ -1,25 +1,197 @@
-import json
+import struct
 import hashlib
+from node.transaction import Transaction
+from node.merkle import merkle_root, merkle_proof, verify_merkle_proof
+from node.difficulty import MAX_TARGET, meets_target, target_to_hex, target_from_hex
+
+# En-tête binaire de taille fixe : index, hash précédent, timestamp, racine de
+# Merkle des transactions, racine d'état (soldes du point de contrôle parent,
+# zéros sinon), cible de difficulté (entier de 256 bits), nonce (en dernier
+# pour la preuve de travail)
+HEADER = struct.Struct('!Q32sd32s32s32sQ')
+NONCE = struct.Struct('!Q')
+TX_COUNT = struct.Struct('!I')
+EMPTY_HASH = b'\x00' * 32
+PRUNED = 0xFFFFFFFF  # Nombre de transactions d'un bloc élagué (en-tête seul)
+
+# Champs couverts par le hash : les modifier invalide le hash en cache
+HASHED_FIELDS = frozenset(('index', 'previous_hash', 'timestamp', 'transactions', 'state_root', 'target', 'nonce'))
+
 
 class Block:
-    def __init__(self, index, previous_hash, timestamp, transactions, nonce=0):
+    __slots__ = ('index', 'previous_hash', 'timestamp', 'transactions', 'state_root', 'target', 'nonce', 'hash',
+                 '_tx_hashes', '_merkle_root', '_cached_hash')
+
+    def __init__(self, index, previous_hash, timestamp, transactions, nonce=0, target=MAX_TARGET, state_root=None):
         self.index = index
         self.previous_hash = previous_hash
         self.timestamp = timestamp
-        self.transactions = transactions  # liste de dicts
+        self.transactions = transactions  # liste de dicts (None si le bloc est élagué)
+        self.state_root = state_root  # Condensé des soldes du parent s'il est un point de contrôle
+        self.target = target  # Le hash du bloc ne doit pas dépasser cette valeur
         self.nonce = nonce
         self.hash = None
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in HASHED_FIELDS:
+            object.__setattr__(self, '_cached_hash', None)
+            if name == 'transactions':
+                object.__setattr__(self, '_tx_hashes', None)
+                object.__setattr__(self, '_merkle_root', None)
+
+    @property
+    def pruned(self):
+        return self.transactions is None
+
+    def prune(self):
+        """
+        Oublie les transactions (mode élagué) : l'en-tête, dont la racine de
+        Merkle, et le hash restent disponibles.
+        """
+        root = self.merkle_root()
+        block_hash = self.compute_hash()
+        object.__setattr__(self, 'transactions', None)
+        object.__setattr__(self, '_tx_hashes', None)
+        object.__setattr__(self, '_merkle_root', root)
+        object.__setattr__(self, '_cached_hash', block_hash)
+
+    def invalidate(self):
+        """À appeler après une modification en place de la liste des transactions."""
+        self.transactions = self.transactions
+
+    def tx_hashes(self):
+        if self._tx_hashes is None:
+            object.__setattr__(self, '_tx_hashes', [
+                Transaction.from_dict(tx).compute_hash() for tx in self.transactions or []
+            ])
+        return self._tx_hashes
+
+    def set_tx_hashes(self, hashes):
+        """Reprend des hashes de transactions déjà calculés (pool de validation)."""
+        object.__setattr__(self, '_tx_hashes', list(hashes))
+        object.__setattr__(self, '_merkle_root', None)
+        object.__setattr__(self, '_cached_hash', None)
+
+    def has_cached_hash(self):
+        return self._cached_hash is not None or self._tx_hashes is not None
+
+    def merkle_root(self):
+        """Racine de Merkle des transactions, incluse dans l'en-tête."""
+        if self._merkle_root is None:
+            root = merkle_root([bytes.fromhex(h) for h in self.tx_hashes()])
+            object.__setattr__(self, '_merkle_root', root)
+        return self._merkle_root
+
+    def merkle_proof(self, tx_hash):
+        """Preuve d'inclusion d'une transaction du bloc, ou None si elle n'y est pas."""
+        hashes = self.tx_hashes()
+        if tx_hash not in hashes:
+            return None
+        return merkle_proof([bytes.fromhex(h) for h in hashes], hashes.index(tx_hash))
+
+    @staticmethod
+    def verify_inclusion(tx_hash, proof, header):
+        """
+        Vérification côté client léger : l'en-tête est cohérent avec son hash,
+        respecte la preuve de travail (cible de l'en-tête, au plus MAX_TARGET),
+        et la transaction est dans l'arbre.
+        """
+        try:
+            block = Block.from_header(header)
+            block_hash = block.compute_hash()
+        except (KeyError, ValueError, TypeError, struct.error):
+            return False
+        return (block_hash == header['hash'] and
+                block.target <= MAX_TARGET and meets_target(block_hash, block.target) and
+                verify_merkle_proof(tx_hash, proof, header['merkle_root']))
+
+    def pow_template(self):
+        """
+        En-tête sans le nonce : la preuve de travail hache ce préfixe constant
+        suivi du nonce encodé sur 8 octets (NONCE).
+        """
+        return self.header_bytes()[:-NONCE.size]
+
+    def header_bytes(self):
+        return HEADER.pack(
+            self.index,
+            bytes.fromhex(self.previous_hash),
+            self.timestamp,
+            self.merkle_root(),
+            bytes.fromhex(self.state_root) if self.state_root else EMPTY_HASH,
+            self.target.to_bytes(32, 'big'),
+            self.nonce
+        )
+
     def compute_hash(self):
-        block_string = json.dumps({
-            "index": self.index,
-            "previous_hash": self.previous_hash,
-            "timestamp": self.timestamp,
-            "transactions": self.transactions,
-            "nonce": self.nonce
-        }, sort_keys=True).encode()
+        # Calculé une seule fois, tant que les champs du bloc ne changent pas
+        if self._cached_hash is None:
+            object.__setattr__(self, '_cached_hash', hashlib.sha256(self.header_bytes()).hexdigest())
+        return self._cached_hash
 
-        return hashlib.sha256(block_string).hexdigest()
+    def encode(self):
+        """
+        Encodage binaire compact : en-tête, hash, puis les transactions (ou
+        le marqueur PRUNED pour un bloc élagué).
+        """
+        parts = [
+            self.header_bytes(),
+            bytes.fromhex(self.hash) if self.hash else EMPTY_HASH,
+            TX_COUNT.pack(PRUNED if self.pruned else len(self.transactions))
+        ]
+        parts.extend(Transaction.from_dict(tx).encode() for tx in self.transactions or [])
+        return b''.join(parts)
+
+    @classmethod
+    def decode(cls, data):
+        index, previous_hash, timestamp, root, state_root, target, nonce = HEADER.unpack_from(data)
+        offset = HEADER.size
+        block_hash = data[offset:offset + 32]
+        offset += 32
+        (count,) = TX_COUNT.unpack_from(data, offset)
+        offset += TX_COUNT.size
+        state_root = state_root.hex() if state_root != EMPTY_HASH else None
+
+        if count == PRUNED:
+            block = cls(index, previous_hash.hex(), timestamp, None, nonce, int.from_bytes(target, 'big'), state_root)
+            object.__setattr__(block, '_merkle_root', root)
+            block.hash = block_hash.hex()
+            return block
+
+        transactions = []
+        for _ in range(count):
+            tx, offset = Transaction.decode(data, offset)
+            transactions.append(tx.to_dict())
+
+        block = cls(index, previous_hash.hex(), timestamp, transactions, nonce, int.from_bytes(target, 'big'),
+                    state_root)
+        block.hash = block_hash.hex() if block_hash != EMPTY_HASH else None
+        if block.merkle_root() != root:
+            raise ValueError(f"Racine de Merkle incohérente pour le bloc {index}")
+        return block
+
+    def header(self):
+        """Résumé du bloc sans les transactions."""
+        return {
+            'index': self.index,
+            'previous_hash': self.previous_hash,
+            'timestamp': self.timestamp,
+            'merkle_root': self.merkle_root().hex(),
+            'state_root': self.state_root,
+            'target': target_to_hex(self.target),
+            'nonce': self.nonce,
+            'hash': self.hash
+        }
+
+    @classmethod
+    def from_header(cls, header):
+        """Bloc réduit à son en-tête : le hash reste calculable sans les transactions."""
+        block = cls(header['index'], header['previous_hash'], header['timestamp'], None, header['nonce'],
+                    target_from_hex(header['target']), header.get('state_root'))
+        object.__setattr__(block, '_merkle_root', bytes.fromhex(header['merkle_root']))
+        block.hash = header.get('hash')
+        return block
 
     def to_dict(self):
         return {
@@ -27,6 +199,9 @@ class Block:
             'previous_hash': self.previous_hash,
             'timestamp': self.timestamp,
             'transactions': self.transactions,
+            'merkle_root': self.merkle_root().hex(),
+            'state_root': self.state_root,
+            'target': target_to_hex(self.target),
             'nonce': self.nonce,
             'hash': self.hash
         }
@@ -38,7 +213,9 @@ class Block:
             block_data['previous_hash'],
             block_data['timestamp'],
             block_data['transactions'],
-            block_data['nonce']
+            block_data['nonce'],
+            target_from_hex(block_data['target']),
+            block_data.get('state_root')
         )
         block.hash = block_data.get('hash')
         return block
@@ -1,212 +1,831 @@
 import time
+import struct
+import threading
 from node.block import Block
-from node.transaction import Transaction
-from config import DIFFICULTY, MINING_REWARD
+from node.transaction import Transaction, NETWORK_SENDER, valid_amount, valid_nonce, to_units, from_units
+from node.mempool import Mempool
+from node.state import AccountState, commits_state, is_checkpoint
+from node.storage import StoreCorruptedError
+from node.miner import Miner
+from node.sync import ChainSynchronizer
+from node.validation import ChainValidator
+from node.blocktree import BlockTree, block_work
+from node.template import BlockTemplate
+from node.index import ChainIndex
+from node.difficulty import WINDOW_SIZE, next_target, median_time_past, follows_median
+from node.logger import get_logger
+from node import metrics
+from config import MINING_REWARD, SNAPSHOT_INTERVAL, PRUNE_DEPTH, MIN_TX_VALUE
 from colorama import Fore, Style 
 
-class Blockchain:
+ALREADY_PENDING = "transaction déjà en attente"
+ALREADY_CONFIRMED = "transaction déjà confirmée"
+
+log = get_logger(__name__)
 
-    def __init__(self):
+CHAIN_HEIGHT = metrics.gauge('node_chain_height', "Index du dernier bloc de la chaîne active")
+MEMPOOL_SIZE = metrics.gauge('node_mempool_transactions', "Transactions en attente dans le mempool")
+BLOCKS_MINED = metrics.counter('node_blocks_mined_total', "Blocs minés localement")
+BLOCKS_RECEIVED = metrics.counter('node_blocks_received_total', "Blocs reçus du réseau, par issue",
+                                  ['result'])
+REORGS = metrics.counter('node_reorgs_total', "Réorganisations de la chaîne active")
+TRANSACTIONS_ADMITTED = metrics.counter('node_transactions_admitted_total', "Transactions admises dans le mempool")
+TRANSACTIONS_REJECTED = metrics.counter('node_transactions_rejected_total', "Transactions refusées")
+
+class Blockchain:
+    """
+    Modèle de concurrence : toutes les modifications (blocs, réorganisations,
+    mempool) sont sérialisées par `lock`. Les lecteurs (API, GET_CHAIN,
+    soldes) ne prennent aucun verrou : la liste `chain` et l'index `heights`
+    ne font que grandir ou sont remplacés par une copie lors d'une
+    réorganisation, et les soldes d'un bloc sont publiés d'un coup
+    (AccountState.commit). La preuve de travail et la vérification des
+    signatures se font hors du verrou.
+
+    Mode élagué (prune_depth > 0) : seuls les `prune_depth` derniers blocs
+    gardent leurs transactions, les plus anciens sont réduits à leur
+    en-tête (Block.prune) et sortent de l'index. Les soldes n'en ont pas
+    besoin ; une réorganisation sous cet horizon est refusée.
+    """
+
+    def __init__(self, store=None, prune_depth=PRUNE_DEPTH):
+        if prune_depth and prune_depth <= SNAPSHOT_INTERVAL:
+            # Un nœud élagué doit pouvoir fournir l'instantané du dernier point de contrôle
+            raise ValueError(f"Le mode élagué doit garder plus de {SNAPSHOT_INTERVAL} blocs complets")
+        self.prune_depth = prune_depth  # Blocs récents gardés complets (0 : nœud complet)
+        self.pruned_height = 0          # Les blocs d'index <= pruned_height n'ont plus que leur en-tête
+        self.lock = threading.RLock()
         self.chain = []
-        self.unconfirmed_transactions = []
-        self.create_genesis_block()
+        self.heights = {}  # hash -> index du bloc dans la chaîne
+        self.mempool = Mempool()
+        self.template = BlockTemplate(self.mempool)
+        self.state = AccountState()
+        self.miner = Miner()
+        self.validator = ChainValidator()
+        self.tree = BlockTree()
+        self.index = ChainIndex()  # Recherche des transactions par hash et par adresse
+        self.store = store
+        CHAIN_HEIGHT.set_function(lambda: len(self.chain) - 1)
+        MEMPOOL_SIZE.set_function(lambda: len(self.mempool))
+        if store is not None and len(store):
+            self.load_from_store()
+        else:
+            self.create_genesis_block()
+
+    def load_from_store(self):
+        """
+        Recharge la chaîne depuis le stockage disque. Si l'instantané des
+        soldes correspond à un bloc de la chaîne, seuls les blocs suivants
+        sont rejoués. En mode élagué, les blocs qui n'ont pas à être rejoués
+        et sortent des `prune_depth` derniers sont réduits à leur en-tête
+        dès leur lecture.
+        """
+        snapshot = self.store.load_snapshot()
+        full_from = 0
+        if self.prune_depth:
+            full_from = len(self.store) - self.prune_depth
+            if snapshot and 0 <= snapshot['height'] < len(self.store):
+                full_from = min(full_from, snapshot['height'] + 1)
+        self.chain = self.store.load_blocks(full_from)
+        if not self.chain:
+            self.create_genesis_block()
+            return
+        self.heights = {block.hash: block.index for block in self.chain}
+        for block in self.chain:
+            self.tree.connect(block)
+            if block.pruned:
+                self.pruned_height = block.index
+            else:
+                self.index.connect(block)
+
+        start = 0
+        if snapshot:
+            height = snapshot['height']
+            if 0 <= height < len(self.chain) and self.chain[height].hash == snapshot['hash']:
+                try:
+                    self.state = AccountState.from_snapshot(snapshot, height)
+                    start = height + 1
+                except ValueError:
+                    # Ancien format (soldes flottants) : la chaîne est rejouée
+                    log.warning("Instantané des soldes illisible : ignoré")
+        if self.pruned_height and start <= self.pruned_height:
+            raise StoreCorruptedError("Instantané des soldes absent ou périmé pour une chaîne élaguée")
+        for block in self.chain[start:]:
+            self.state.apply_block(block)
+        self._prune()
+        log.info("Chaîne rechargée depuis le disque : hauteur %d (%d bloc(s) rejoué(s))",
+                 len(self.chain), len(self.chain) - start)
+
+    def save_snapshot(self, height=None):
+        """Écrit l'instantané de l'état au bloc `height` de la chaîne active (par défaut le sommet)."""
+        if self.store is not None:
+            with self.lock:
+                if height is None:
+                    self.store.save_snapshot(self.state, self.last_block.hash)
+                else:
+                    self.store.save_snapshot(self.state_at(height), self.chain[height].hash)
+
+    def _persist_block(self, block):
+        if self.store is None:
+            return
+        self.store.append(block)
+        # Instantané périodique du point de contrôle enfoui de prune_depth blocs :
+        # une réorganisation ne peut plus l'atteindre (elle s'arrête à l'horizon
+        # d'élagage) et il reste valide au redémarrage d'un nœud élagué
+        height = block.index - self.prune_depth
+        if height >= self.pruned_height and height % SNAPSHOT_INTERVAL == 0:
+            self.save_snapshot(height)
 
     def create_genesis_block(self):
         genesis_block = Block(
             index=0,
             transactions=[],
             timestamp=0,
-            previous_hash='0'
+            previous_hash='0' * 64
         )
         genesis_block.nonce = 0
         genesis_block.hash = genesis_block.compute_hash()
         self.chain.append(genesis_block)
+        self.heights[genesis_block.hash] = genesis_block.index
+        self.tree.connect(genesis_block)
+        self.index.connect(genesis_block)
+        self.state.apply_block(genesis_block)
+        self._persist_block(genesis_block)
 
     @property
     def last_block(self):
         return self.chain[-1]
 
-    def proof_of_work(self, block):
-        block.nonce = 0
-        computed_hash = block.compute_hash()
-        while not computed_hash.startswith('0' * DIFFICULTY):
-            if block.nonce % 1000 == 0:  # Affiche une ligne toutes les 1000 tentatives
-                print(Fore.CYAN + f"⛏️ Tentative nonce={block.nonce} => hash={computed_hash}" + Style.RESET_ALL)
-            block.nonce += 1
-            computed_hash = block.compute_hash()
-        print(Fore.GREEN + f"\n✅ Bloc validé avec nonce={block.nonce} => hash={computed_hash}\n" + Style.RESET_ALL)
-        return computed_hash
+    @property
+    def chain_work(self):
+        """Travail cumulé de la chaîne active."""
+        return self.tree.work[self.last_block.hash]
 
-    def add_block(self, block, proof):
-        previous_hash = self.last_block.hash
+    def window(self, height):
+        """Derniers blocs jusqu'à `height` inclus, utilisés pour le réajustement de la cible."""
+        return self.chain[max(0, height + 1 - WINDOW_SIZE):height + 1]
 
-        # Vérifie que le précédent hash correspond
-        if previous_hash != block.previous_hash:
-            print("Erreur : previous_hash ne correspond pas")
-            return False
+    def next_target(self):
+        """Cible de difficulté du prochain bloc de la chaîne active."""
+        return next_target(self.window(len(self.chain) - 1))
 
-        # Vérifie la validité du proof-of-work
+    def next_state_root(self):
+        """Racine d'état du prochain bloc : condensé des soldes si le sommet est un point de contrôle."""
+        return self.state.digest() if commits_state(len(self.chain)) else None
+
+    @property
+    def unconfirmed_transactions(self):
+        return self.mempool.to_list()
+
+    def proof_of_work(self, block):
+        """Retourne le hash valide trouvé, ou None si le minage a été annulé."""
+        return self.miner.mine(block)
+
+    def add_block(self, block, proof):
+        # Vérifie la validité du proof-of-work (hors verrou, résultat en cache)
         if not self.is_valid_proof(block, proof):
-            print("Erreur : preuve de travail invalide")
+            log.warning("Preuve de travail invalide")
             return False
 
-        block.hash = proof
-        self.chain.append(block)
-        return True
+        with self.lock:
+            previous_hash = self.last_block.hash
+
+            # Vérifie que le précédent hash (et l'index) correspondent
+            if previous_hash != block.previous_hash or block.index != self.last_block.index + 1:
+                log.warning("previous_hash ne correspond pas")
+                return False
+            if not follows_median(block, self.window(len(self.chain) - 1)):
+                log.warning("Timestamp du bloc %d antérieur à la médiane des blocs précédents", block.index)
+                return False
+            if block.target != self.next_target():
+                log.warning("Cible de difficulté incorrecte pour le bloc %d", block.index)
+                return False
+            if block.state_root != self.validator.expected_state_root(block, self.state):
+                log.warning("Racine d'état incorrecte pour le bloc %d", block.index)
+                return False
+
+            # Vérifie les soldes sur une vue jetable de l'état courant
+            if not self.validator.validate_transactions(block, self.state.overlay()):
+                log.warning("Transactions du bloc invalides (solde insuffisant ou nonce incorrect)")
+                return False
+
+            # Le bloc n'est visible dans la chaîne qu'une fois les soldes à jour
+            self.state.apply_block(block)
+            self.heights[block.hash] = block.index
+            self.tree.connect(block)
+            self.index.connect(block)
+            self.chain.append(block)
+            self._persist_block(block)
+            self._prune()
+            return True
+
+    def _prune(self):
+        """Mode élagué : réduit à leur en-tête les blocs sortis des `prune_depth` derniers."""
+        if not self.prune_depth:
+            return
+        horizon = len(self.chain) - 1 - self.prune_depth
+        if horizon <= self.pruned_height:
+            return  # Chaîne encore plus courte que prune_depth (ou déjà élaguée)
+        for block in self.chain[self.pruned_height + 1:horizon + 1]:
+            self.index.prune(block)
+            block.prune()
+        self.pruned_height = horizon
+
+    def _below_horizon(self, fork_height):
+        """Les blocs à annuler après fork_height ont-ils été élagués ?"""
+        if fork_height < self.pruned_height:
+            log.warning("Divergence à l'index %d sous l'horizon d'élagage (%d) : remplacement refusé",
+                        fork_height, self.pruned_height)
+            return True
+        return False
 
     def is_valid_proof(self, block, block_hash):
-        return (block_hash.startswith('0' * DIFFICULTY) and
-                block_hash == block.compute_hash())
+        if block.hash != block_hash:
+            block.hash = block_hash
+        return self.validator.check_block(block)
 
     def get_balance(self, address):
-        balance = 0
-        for block in self.chain:
-            for tx in block.transactions:
-                if tx['recipient'] == address:
-                    balance += tx['amount']
-                if tx['sender'] == address:
-                    balance -= tx['amount']
-        return balance
+        return self.state.get_balance(address)
 
-    def add_new_transaction(self, transaction):
-        sender = transaction['sender']
-        amount = transaction['amount']
-
-        if sender != "Network":  # Les transactions réseau (récompenses) sont toujours valides
-            sender_balance = self.get_balance(sender)
-            # Montant des transactions en attente envoyées par le sender
-            pending_amount = sum(
-                tx['amount'] for tx in self.unconfirmed_transactions if tx['sender'] == sender
-            )
-            available_balance = sender_balance - pending_amount
+    def knows_transaction(self, tx_hash):
+        """Transaction en attente ou confirmée dans la chaîne active (inutile de la redemander)."""
+        return tx_hash in self.mempool or self.index.locate(tx_hash) is not None
 
-            if available_balance < amount:
-                print(f"Erreur : Solde insuffisant pour la transaction de {amount} UTBM envoyée par {sender}")
-                return False
+    def next_nonce(self, address):
+        """Nonce de la prochaine transaction de `address` : confirmées plus en attente."""
+        with self.lock:
+            return self.state.get_nonce(address) + self.mempool.pending_count(address)
 
-        self.unconfirmed_transactions.append(transaction)
-        return True
-
-    def mine(self, miner_address, network=None):
-        if not self.unconfirmed_transactions:
-            print("Aucune transaction à miner")
-            return None
+    def add_new_transaction(self, transaction):
+        (_, error), = self.add_transactions([transaction])
+        if error is not None and error not in (ALREADY_PENDING, ALREADY_CONFIRMED):
+            log.warning("Transaction refusée : %s", error)
+        return error is None
 
-        reward_tx = Transaction("Network", miner_address, MINING_REWARD)
+    def add_transactions(self, transactions):
+        """
+        Admet un lot de transactions (dicts) dans le mempool en une passe :
+        signatures vérifiées ensemble (en parallèle pour les grands lots),
+        puis soldes contrôlés dans l'ordre du lot. Retourne pour chacune
+        (hash, None) si elle est admise, sinon (hash ou None, raison du refus).
+        """
+        results = [None] * len(transactions)
+        candidates = []  # (position dans le lot, transaction normalisée, hash)
+        for i, transaction in enumerate(transactions):
+            # Normalisation : seuls les champs couverts par l'encodage canonique sont conservés
+            try:
+                tx = Transaction.from_dict(transaction)
+                tx_hash = tx.compute_hash()
+            # ValueError couvre UnicodeError (surrogate isolé dans une adresse)
+            except (KeyError, TypeError, ValueError, AttributeError, struct.error):
+                results[i] = (None, "transaction mal formée")
+                continue
+            if tx_hash in self.mempool:
+                results[i] = (tx_hash, ALREADY_PENDING)
+            # Les récompenses ne sont créées que par le mineur, dans son bloc
+            elif tx.sender == NETWORK_SENDER or not (valid_amount(tx.amount) and valid_amount(tx.fee) and
+                                                     valid_nonce(tx.nonce)):
+                results[i] = (tx_hash, "transaction refusée (expéditeur réservé, montant, frais ou nonce invalides)")
+            elif self.index.locate(tx_hash) is not None:
+                results[i] = (tx_hash, ALREADY_CONFIRMED)
+            else:
+                candidates.append((i, tx.to_dict(), tx_hash))
+
+        # Signatures vérifiées hors du verrou : seuls les soldes en ont besoin
+        signed = self.validator.signatures.verify_batch([tx for _, tx, _ in candidates],
+                                                        [tx_hash for _, _, tx_hash in candidates])
+        with self.lock:
+            self._admit(candidates, signed, results)
+        admitted = sum(1 for _, error in results if error is None)
+        TRANSACTIONS_ADMITTED.inc(admitted)
+        TRANSACTIONS_REJECTED.inc(sum(1 for _, error in results
+                                      if error not in (None, ALREADY_PENDING, ALREADY_CONFIRMED)))
+        return results
+
+    def _admit(self, candidates, signed, results):
+        """Contrôle des soldes et entrée dans le mempool (appelé sous le verrou)."""
+        for (i, transaction, tx_hash), valid in zip(candidates, signed):
+            sender = transaction['sender']
+            amount = to_units(transaction['amount']) + to_units(transaction['fee'])
+            if not valid:
+                results[i] = (tx_hash, f"signature invalide pour la transaction envoyée par {sender}")
+                continue
+            if tx_hash in self.mempool:
+                results[i] = (tx_hash, ALREADY_PENDING)  # Doublon au sein du lot
+                continue
+            # Sans valeur ni frais, une transaction ne coûte rien à son expéditeur
+            if amount < to_units(MIN_TX_VALUE):
+                results[i] = (tx_hash, f"Montant et frais trop faibles (minimum {MIN_TX_VALUE} UTBM)")
+                continue
+
+            # Les transactions d'un expéditeur entrent dans l'ordre de leurs nonces
+            expected_nonce = self.state.get_nonce(sender) + self.mempool.pending_count(sender)
+            if transaction['nonce'] != expected_nonce:
+                results[i] = (tx_hash, f"Nonce {transaction['nonce']} invalide pour {sender} (attendu : {expected_nonce})")
+                continue
+
+            # Solde disponible : solde confirmé moins les transactions en attente du sender
+            available_balance = self.state.get_units(sender) - self.mempool.pending_amount(sender)
+            if available_balance < amount:
+                results[i] = (tx_hash, f"Solde insuffisant pour la transaction de {from_units(amount)} UTBM "
+                                       f"envoyée par {sender}")
+                continue
 
-        transactions = list(self.unconfirmed_transactions) + [reward_tx.to_dict()]
+            if not self.mempool.add(transaction, tx_hash):
+                results[i] = (tx_hash, "Mempool plein : frais insuffisants")
+                continue
+            self.template.add(transaction, tx_hash)
+            results[i] = (tx_hash, None)
 
+    def _revalidate_mempool(self, returning=()):
+        """
+        Après un changement de sommet : réadmet les transactions en attente
+        sur l'état courant, dans l'ordre d'arrivée, précédées de `returning`
+        ((hash, transaction) de blocs abandonnés). Celles qui ne sont plus
+        finançables ou dont le nonce a été consommé sont retirées ; les
+        signatures, déjà vérifiées, ne sont pas revérifiées.
+        """
+        pending = list(returning) + self.mempool.items()
+        self.mempool.clear()
+        candidates = [(i, transaction, tx_hash) for i, (tx_hash, transaction) in enumerate(pending)]
+        results = [None] * len(candidates)
+        self._admit(candidates, [True] * len(candidates), results)
+        evicted = sum(1 for _, error in results if error not in (None, ALREADY_PENDING))
+        if evicted:
+            log.info("%d transaction(s) devenue(s) invalide(s) retirée(s) du mempool", evicted)
+
+    def _build_block(self, miner_address):
+        """Prochain bloc à miner (appelé sous le verrou) : (bloc, transactions retenues, leurs hashes)."""
+        # Transactions les plus rémunératrices dans la limite de taille du bloc
+        pending, pending_hashes, fees = self.template.transactions()
+        reward_tx = Transaction(NETWORK_SENDER, miner_address, from_units(to_units(MINING_REWARD) + fees))
+        last_block = self.last_block
+        # Horloge locale en retard sur la médiane : le bloc doit rester valide
+        timestamp = max(time.time(), median_time_past(self.window(len(self.chain) - 1)) + 0.001)
         new_block = Block(
-            index=self.last_block.index + 1,
-            previous_hash=self.last_block.hash,
-            timestamp=time.time(),
-            transactions=transactions
+            index=last_block.index + 1,
+            previous_hash=last_block.hash,
+            timestamp=timestamp,
+            transactions=pending + [reward_tx.to_dict()],
+            target=self.next_target(),
+            state_root=self.next_state_root()
         )
+        return new_block, pending, pending_hashes
 
-        proof = self.proof_of_work(new_block)
+    def mine(self, miner_address, network=None, allow_empty=False):
+        """
+        Mine le prochain bloc sur les transactions en attente. `allow_empty`
+        autorise un bloc ne contenant que la récompense (amorçage d'un réseau).
+        """
+        if not self.mempool and not allow_empty:
+            log.info("Aucune transaction à miner")
+            return None
 
-        if self.add_block(new_block, proof):
-            self.unconfirmed_transactions = []
+        with self.lock:
+            new_block, pending, pending_hashes = self._build_block(miner_address)
+            # Modèle vérifié avant la preuve de travail : une transaction devenue
+            # infinançable ferait rejeter le bloc une fois miné
+            if not self.validator.validate_transactions(new_block, self.state.overlay()):
+                log.warning("Modèle de bloc invalide : transactions en attente revalidées")
+                self._revalidate_mempool()
+                if not self.mempool and not allow_empty:
+                    log.info("Aucune transaction à miner")
+                    return None
+                new_block, pending, pending_hashes = self._build_block(miner_address)
+
+        # La preuve de travail se fait sans le verrou : transactions, lectures
+        # et blocs du réseau continuent d'être traités pendant le minage
+        proof = self.proof_of_work(new_block)
+        if proof is None:
+            log.info("Minage annulé : un bloc concurrent a été reçu")
+            return None
 
-            # Propager le bloc miné aux peers si un réseau est fourni
-            if network:
-                for peer in network.get_peers():
-                    try:
-                        network.send_block(peer, new_block)
-                    except Exception as e:
-                        print(f"Erreur propagation bloc vers peer {peer}: {e}")
+        with self.lock:
+            added = self.add_block(new_block, proof)
+            if added:
+                # Seules les transactions incluses sont retirées : celles arrivées
+                # pendant le minage ou laissées de côté restent en attente
+                self.mempool.remove_confirmed(pending, pending_hashes)
 
-            return new_block
-        else:
-            print("Erreur lors de l'ajout du bloc miné à la chaîne")
+        if not added:
+            log.error("Erreur lors de l'ajout du bloc miné à la chaîne")
             return None
 
+        BLOCKS_MINED.inc()
+        # Propager le bloc miné aux peers si un réseau est fourni
+        if network:
+            network.broadcaster.broadcast_block(new_block)
+        return new_block
+
     def add_block_from_network(self, block_data, network=None):
         """
-        Ajoute un bloc reçu du réseau après validation.
-        Si rejeté à cause du previous_hash, tente une synchronisation.
+        Ajoute un bloc reçu du réseau. Un bloc qui ne prolonge pas le sommet
+        est gardé dans une branche secondaire (réorganisation si elle devient
+        la plus travaillée) ou, si son parent est inconnu, dans le pool
+        d'orphelins en attendant que la synchronisation apporte le parent.
         """
-        block = Block.from_dict(block_data)
-        proof = block.hash
-
-        if block.previous_hash != self.last_block.hash:
-            print(f"Erreur : previous_hash ne correspond pas")
-            print(f"Reçu :     {block.previous_hash}")
-            print(f"Attendu :  {self.last_block.hash}")
+        try:
+            block = Block.from_dict(block_data)
+        except (KeyError, TypeError, ValueError):
+            log.warning("Bloc mal formé reçu du réseau")
+            BLOCKS_RECEIVED.inc(result='rejected')
+            return False
+        if block.hash in self.heights or self.tree.is_known(block.hash):
+            BLOCKS_RECEIVED.inc(result='known')
+            return False  # Déjà connu : rien à faire, pas de resynchronisation
+
+        # Preuve de travail et signatures vérifiées hors du verrou
+        if not self.validator.check_block(block):
+            log.warning("Bloc rejeté depuis le réseau : index %d", block.index)
+            BLOCKS_RECEIVED.inc(result='rejected')
             return False
 
-        if self.add_block(block, proof):
-            # Nettoyer les transactions confirmées
-            tx_hashes = set(
-                Transaction(tx['sender'], tx['recipient'], tx['amount']).compute_hash()
-                for tx in block.transactions
-            )
-            self.unconfirmed_transactions = [
-                tx for tx in self.unconfirmed_transactions
-                if Transaction(tx['sender'], tx['recipient'], tx['amount']).compute_hash() not in tx_hashes
-            ]
-            print(f"Bloc ajouté depuis le réseau : index {block.index}")
+        with self.lock:
+            if block.hash in self.heights or self.tree.is_known(block.hash):
+                BLOCKS_RECEIVED.inc(result='known')
+                return False
+            orphan = block.previous_hash not in self.heights and block.previous_hash not in self.tree.side
+            if orphan:
+                self.tree.add_orphan(block)
+                log.info("Bloc orphelin gardé en attente : index %d", block.index)
+                BLOCKS_RECEIVED.inc(result='orphan')
+            elif not self._accept_block(block):
+                log.warning("Bloc rejeté depuis le réseau : index %d", block.index)
+                BLOCKS_RECEIVED.inc(result='rejected')
+                return False
+            else:
+                self._connect_orphans(block.hash)
+                BLOCKS_RECEIVED.inc(result='accepted')
+                return True
+
+        if network:
+            # Échanges réseau sans le verrou : chaque remplacement le reprend
+            for peer in network.get_peers():
+                if self.sync_chain_from_peer(peer, network):
+                    log.info("Chaîne synchronisée après réception d'un bloc orphelin")
+                    break
+            with self.lock:
+                for parent_hash in [h for h in self.tree.orphans_by_parent
+                                    if h in self.heights or h in self.tree.side]:
+                    self._connect_orphans(parent_hash)
+        return False
+
+    def _accept_block(self, block):
+        """Raccorde un bloc dont le parent est connu (sommet ou branche secondaire)."""
+        if block.hash in self.heights:
+            return False  # Déjà reçu entre-temps (synchronisation)
+        if block.previous_hash == self.last_block.hash:
+            if not self.add_block(block, block.hash):
+                return False
+            # Le bloc en cours de minage ne peut plus être chaîné
+            self.miner.cancel()
+            # Nettoyer les transactions confirmées et celles que le bloc a rendues invalides
+            self.mempool.remove_confirmed(block.transactions, block.tx_hashes())
+            self._revalidate_mempool()
+            self.tree.prune(block.index)
+            log.info("Bloc ajouté depuis le réseau : index %d", block.index)
             return True
-        else:
-            print(f"Bloc rejeté depuis le réseau : index {block.index}")
-            # Si réseau disponible, tenter de synchroniser la chaîne complète
-            if network:
-                for peer in network.get_peers():
-                    if self.sync_chain_from_peer(peer):
-                        print("Chaîne synchronisée après rejet de bloc")
-                        return True
+
+        parent = self.heights.get(block.previous_hash)
+        parent_index = parent if parent is not None else self.tree.side[block.previous_hash].index
+        if block.index != parent_index + 1:
+            return False
+        # Cible et timestamp vérifiés avant de garder le bloc : sans cela, une
+        # preuve de travail facile suffirait à remplir les branches secondaires
+        window = self._window_before(block)
+        if window is None or not follows_median(block, window) or block.target != next_target(window):
+            log.warning("Branche secondaire : timestamp ou cible de difficulté incorrects pour le bloc %d",
+                        block.index)
             return False
+        work = self.tree.add_side(block)
+        if work <= self.chain_work:
+            log.info("Bloc gardé sur une branche secondaire : index %d", block.index)
+            return True
+
+        branch = self.tree.branch(block.hash, self.heights)
+        if branch is None:
+            # Début de la branche oublié (BlockTree.prune) : la synchronisation
+            # avec le peer qui la porte la récupérera depuis le point de divergence
+            log.warning("Branche secondaire incomplète pour le bloc %d : bloc ignoré", block.index)
+            self.tree.remove_side(block.hash)
+            return False
+        fork_height, blocks = branch
+        if self.replace_suffix(fork_height, blocks):
+            log.warning("Réorganisation : %d bloc(s) à partir de l'index %d",
+                        len(self.chain) - 1 - fork_height, fork_height + 1)
+            return True
+        # Branche invalide (soldes) : le bloc est oublié
+        self.tree.remove_side(block.hash)
+        return False
+
+    def _window_before(self, block):
+        """
+        Fenêtre de réajustement qui précède `block`, dont le parent est sur la
+        chaîne active ou sur une branche secondaire. None si un ancêtre de la
+        branche a été oublié.
+        """
+        branch = []
+        block_hash = block.previous_hash
+        while block_hash not in self.heights and len(branch) < WINDOW_SIZE:
+            parent = self.tree.side.get(block_hash)
+            if parent is None:
+                return None
+            branch.append(parent)
+            block_hash = parent.previous_hash
+        branch.reverse()
+        if block_hash not in self.heights:
+            return branch
+        return (self.window(self.heights[block_hash]) + branch)[-WINDOW_SIZE:]
+
+    def _connect_orphans(self, parent_hash):
+        """Raccorde les orphelins qui attendaient `parent_hash`, puis leurs descendants."""
+        waiting = [parent_hash]
+        while waiting:
+            for child in self.tree.pop_orphans(waiting.pop()):
+                if self._accept_block(child):
+                    waiting.append(child.hash)
+
+    def state_at(self, height):
+        """Vue des soldes au bloc `height` de la chaîne locale (sans la modifier)."""
+        state = self.state.overlay()
+        for block in reversed(self.chain[height + 1:]):
+            state.revert_block(block)
+        return state
 
     def is_valid_chain(self, chain):
         """
-        Vérifie que la chaîne est valide
+        Vérifie que la chaîne est valide. Le préfixe commun avec la chaîne
+        locale, déjà validé, n'est pas revérifié.
         """
         if not chain:
             return False
 
-        # Vérifie le bloc genesis
-        genesis = chain[0]
-        if genesis.hash != genesis.compute_hash():
-            return False
+        fork_index = 0
+        common = min(len(self.chain), len(chain))
+        while fork_index < common and self.chain[fork_index].hash == chain[fork_index].hash:
+            fork_index += 1
 
-        for i in range(1, len(chain)):
-            current = chain[i]
-            previous = chain[i - 1]
-            if current.previous_hash != previous.hash:
-                return False
-            if not self.is_valid_proof(current, current.hash):
-                return False
-        return True
+        if fork_index == 0:
+            return self.validator.validate_chain(chain)
+        return self.validator.validate_blocks(chain[fork_index - 1], chain[fork_index:],
+                                              self.state_at(fork_index - 1), self.window(fork_index - 1))
 
     def replace_chain(self, new_chain):
         """
         Remplace la chaîne locale par une nouvelle si elle est plus longue et valide
         """
-        if len(new_chain) <= len(self.chain):
-            print("La chaîne distante est plus courte ou égale, remplacement ignoré.")
+        with self.lock:
+            return self._replace_chain(new_chain)
+
+    def _replace_chain(self, new_chain):
+        # Point de divergence : premier index où les deux chaînes diffèrent
+        fork_index = 0
+        common = min(len(self.chain), len(new_chain))
+        while fork_index < common and self.chain[fork_index].hash == new_chain[fork_index].hash:
+            fork_index += 1
+
+        if fork_index == 0 or not self._has_more_work(fork_index - 1, new_chain[fork_index:]):
+            log.info("La chaîne distante n'a pas plus de travail, remplacement ignoré")
+            return False
+        if self._below_horizon(fork_index - 1):
             return False
 
         if not self.is_valid_chain(new_chain):
-            print("La chaîne distante n'est pas valide.")
+            log.warning("La chaîne distante n'est pas valide")
             return False
 
-        self.chain = new_chain
-        print("Chaîne locale remplacée par la chaîne distante.")
+        self._switch_chain(fork_index, new_chain[fork_index:])
+        log.info("Chaîne locale remplacée par la chaîne distante")
         return True
 
-    def sync_chain_from_peer(self, peer):
+    def replace_suffix(self, fork_height, blocks):
         """
-        Tente de synchroniser la chaîne avec un peer.
-        network doit fournir une méthode pour récupérer la chaîne complète.
+        Remplace les blocs situés après fork_height par `blocks`. Les preuves
+        de travail déjà vérifiées par l'appelant sont en cache dans le
+        validateur : seuls le raccord et les soldes sont réellement recalculés.
         """
-        try:
-            chain_data = peer.request_chain()  
-            new_chain = [Block.from_dict(b) for b in chain_data]
-            if self.replace_chain(new_chain):
-                return True
-        except Exception as e:
-            print(f"Erreur synchronisation chaîne avec peer {peer}: {e}")
-        return False
+        with self.lock:
+            return self._replace_suffix(fork_height, blocks)
+
+    def _replace_suffix(self, fork_height, blocks):
+        if not blocks or fork_height >= len(self.chain):
+            return False
+        if not self._has_more_work(fork_height, blocks):
+            log.info("La chaîne distante n'a pas plus de travail, remplacement ignoré")
+            return False
+        if self._below_horizon(fork_height):
+            return False
+        if blocks[0].previous_hash != self.chain[fork_height].hash:
+            log.warning("Le suffixe reçu ne se raccorde pas à la chaîne locale")
+            return False
+        if not self.validator.validate_blocks(self.chain[fork_height], blocks, self.state_at(fork_height),
+                                              self.window(fork_height)):
+            log.warning("Le suffixe reçu n'est pas valide")
+            return False
+
+        self._switch_chain(fork_height + 1, blocks)
+        return True
+
+    def _has_more_work(self, fork_height, blocks):
+        """Le suffixe `blocks` greffé après fork_height bat-il la chaîne active ?"""
+        work = self.tree.work[self.chain[fork_height].hash] + sum(block_work(block) for block in blocks)
+        return work > self.chain_work
+
+    def _switch_chain(self, fork_index, new_blocks):
+        # Mise à jour incrémentale des soldes : on annule les blocs abandonnés
+        # puis on applique uniquement le suffixe de la nouvelle chaîne, sur
+        # une vue publiée d'un coup une fois complète
+        disconnected = self.chain[fork_index:]
+        if disconnected:
+            REORGS.inc()
+        state = self.state.overlay()
+        # Copie sur écriture si des blocs sont retirés : les lecteurs sans
+        # verrou ne voient jamais un index à moitié réorganisé
+        heights = dict(self.heights) if disconnected else self.heights
+        for block in reversed(disconnected):
+            state.revert_block(block)
+            heights.pop(block.hash, None)
+            self.index.disconnect(block)
+            # Gardé sur une branche secondaire : la chaîne peut encore revenir dessus
+            self.tree.add_side(block)
+        for block in new_blocks:
+            state.apply_block(block)
+            heights[block.hash] = block.index
+            self.tree.side.pop(block.hash, None)
+            self.tree.connect(block)
+            self.index.connect(block)
+
+        if self.store is not None:
+            self.store.truncate(fork_index)
+        self.state.commit(state)
+        self.heights = heights
+        self.chain = self.chain[:fork_index] + list(new_blocks)
+        for block in new_blocks:
+            self._persist_block(block)
+            self.mempool.remove_confirmed(block.transactions, block.tx_hashes())
+
+        # Les transactions des blocs abandonnés absentes de la nouvelle chaîne
+        # retournent dans le mempool avant celles qui y attendaient (ordre des
+        # nonces) ; celles qui ne sont plus finançables sont écartées
+        confirmed = {tx_hash for block in new_blocks for tx_hash in block.tx_hashes()}
+        self._revalidate_mempool([(tx_hash, tx) for block in disconnected
+                                  for tx, tx_hash in zip(block.transactions, block.tx_hashes())
+                                  if tx['sender'] != NETWORK_SENDER and tx_hash not in confirmed])
+        self.tree.prune(self.last_block.index)
+        self._prune()
+        self.miner.cancel()
+
+    def block_locator(self):
+        """
+        Hashes de la chaîne locale, du sommet vers le genesis, de plus en plus
+        espacés : permet à un peer de trouver le point de divergence en un message.
+        """
+        locator = []
+        index, step = len(self.chain) - 1, 1
+        while index > 0:
+            locator.append(self.chain[index].hash)
+            if len(locator) >= 10:
+                step *= 2
+            index -= step
+        locator.append(self.chain[0].hash)
+        return locator
+
+    def find_fork_point(self, locator):
+        """Index du premier hash du locator présent dans la chaîne locale."""
+        for block_hash in locator:
+            height = self.heights.get(block_hash)
+            if height is not None:
+                return height
+        return None
+
+    def get_headers(self, locator, limit):
+        fork_height = self.find_fork_point(locator)
+        if fork_height is None:
+            return []
+        return [block.header() for block in self.chain[fork_height + 1:fork_height + 1 + limit]]
+
+    def get_blocks(self, start, end):
+        """Blocs d'index start à end inclus (aucun si la plage touche des blocs élagués)."""
+        if self.pruned_height and start <= self.pruned_height:
+            return []
+        return self.chain[max(start, 0):end + 1]
+
+    def snapshot(self, height):
+        """
+        État au point de contrôle `height` : {'height', 'hash', 'balances', 'nonces'},
+        ou None si ce n'est pas un point de contrôle de la chaîne active ou
+        s'il est sous l'horizon d'élagage.
+        """
+        if not is_checkpoint(height):
+            return None
+        with self.lock:
+            if height >= len(self.chain) or height < self.pruned_height:
+                return None
+            return dict(self.state_at(height).snapshot(), height=height, hash=self.chain[height].hash)
+
+    def bootstrap(self, headers, state, blocks):
+        """
+        Initialise une chaîne encore réduite au genesis depuis un instantané
+        vérifié (voir node/snapshot.py) : `headers` sont les blocs réduits à
+        leur en-tête jusqu'au point de contrôle, `blocks` les blocs complets
+        qui le suivent et `state` les soldes au dernier d'entre eux.
+        """
+        with self.lock:
+            if len(self.chain) != 1:
+                return False
+            chain = self.chain + list(headers) + list(blocks)
+            for block in chain[1:]:
+                self.tree.connect(block)
+            for block in blocks:
+                self.index.connect(block)
+            self.state = state
+            self.heights = {block.hash: block.index for block in chain}
+            self.pruned_height = headers[-1].index if headers else 0
+            self.chain = chain
+            for block in chain[1:]:
+                self._persist_block(block)
+            # Les en-têtes ne suffisent pas à rejouer l'état : l'instantané reçu est conservé
+            self.save_snapshot(self.pruned_height)
+            for block in blocks:
+                self.mempool.remove_confirmed(block.transactions, block.tx_hashes())
+            self._revalidate_mempool()
+            self._prune()
+            return True
+
+    def get_block(self, block_hash):
+        """Bloc de la chaîne active portant ce hash (None s'il n'y est pas)."""
+        chain = self.chain
+        height = self.heights.get(block_hash)
+        if height is None or height >= len(chain) or chain[height].hash != block_hash:
+            return None
+        return chain[height]
+
+    def get_block_at(self, height):
+        chain = self.chain
+        return chain[height] if 0 <= height < len(chain) else None
+
+    def _resolve(self, chain, location, tx_hash=None):
+        """Bloc et transaction à une position de l'index, revérifiés contre `chain`."""
+        height, position = location
+        if height >= len(chain):
+            return None
+        block = chain[height]
+        transactions = block.transactions
+        if transactions is None or position >= len(transactions):
+            return None  # Bloc élagué entre-temps
+        if tx_hash is not None:
+            hashes = block.tx_hashes()
+            if position >= len(hashes) or hashes[position] != tx_hash:
+                return None  # Réorganisation ou élagage en cours : l'index ne correspond plus
+        return block, transactions[position]
+
+    def get_transaction(self, tx_hash):
+        """
+        Transaction confirmée : (bloc, position, transaction), ou None si
+        elle n'est pas dans la chaîne active.
+        """
+        location = self.index.locate(tx_hash)
+        if location is None:
+            return None
+        found = self._resolve(self.chain, location, tx_hash)
+        if found is None:
+            return None
+        block, transaction = found
+        return block, location[1], transaction
+
+    def get_address_history(self, address, start=0, limit=None):
+        """
+        Transactions confirmées d'une adresse, des plus récentes aux plus
+        anciennes. Retourne (nombre total, [(bloc, position, transaction), ...]).
+        """
+        chain = self.chain
+        total, locations = self.index.address_history(address, start, limit)
+        history = []
+        for location in locations:
+            found = self._resolve(chain, location)
+            if found is not None:
+                history.append((found[0], location[1], found[1]))
+        return total, history
+
+    def get_proof(self, tx_hash):
+        """
+        Preuve d'inclusion d'une transaction confirmée : en-tête du bloc et
+        chemin de Merkle, vérifiables avec Block.verify_inclusion.
+        """
+        found = self.get_transaction(tx_hash)
+        if found is None:
+            return None
+        block = found[0]
+        return {
+            'tx_hash': tx_hash,
+            'block_index': block.index,
+            'header': block.header(),
+            'proof': block.merkle_proof(tx_hash)
+        }
+
+    def sync_chain_from_peer(self, peer, network):
+        """Tente de synchroniser la chaîne avec un peer (suffixe manquant uniquement)."""
+        return ChainSynchronizer(self, network).sync_with_peer(peer)
 
     def print_chain(self):
         print(Fore.MAGENTA + f"\n=== Chaîne de blocs (hauteur {len(self.chain)}) ===\n" + Style.RESET_ALL)
@@ -214,12 +833,14 @@ class Blockchain:
             print(
                 Fore.YELLOW + f"[Bloc {block.index}] " + Style.RESET_ALL +
                 f"Nonce: {block.nonce} | " +
-                Fore.CYAN + f"Txs: {len(block.transactions)}" + Style.RESET_ALL
+                Fore.CYAN + f"Txs: {'-' if block.pruned else len(block.transactions)}" + Style.RESET_ALL
             )
             print(f"  {Fore.BLUE}Hash:         {Style.RESET_ALL}{block.hash}")
             print(f"  {Fore.BLUE}Hash précédent:{Style.RESET_ALL} {block.previous_hash}")
 
-            if not block.transactions:
+            if block.pruned:
+                print(Fore.RED + "  Bloc élagué : transactions non conservées." + Style.RESET_ALL)
+            elif not block.transactions:
                 print(Fore.RED + "  Aucune transaction dans ce bloc." + Style.RESET_ALL)
             else:
                 print(Fore.GREEN + "  Transactions :" + Style.RESET_ALL)
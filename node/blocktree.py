@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from node.difficulty import work
+from config import ORPHAN_POOL_SIZE, SIDE_BRANCH_DEPTH, SIDE_POOL_SIZE
+
+
+def block_work(block):
+    """Nombre moyen de hashes nécessaires pour trouver le bloc, d'après sa cible."""
+    return work(block.target)
+
+
+class BlockTree:
+    """
+    Arbre des blocs connus, indexé par hash :
+    - travail cumulé de chaque bloc (chaîne active et branches secondaires),
+      qui permet de choisir le sommet de la chaîne la plus travaillée ;
+    - blocs des branches secondaires, gardés pour une éventuelle réorganisation
+      (au plus side_limit, les plus anciens reçus sont oubliés) ;
+    - pool d'orphelins : blocs reçus avant leur parent.
+    """
+
+    def __init__(self, orphan_limit=ORPHAN_POOL_SIZE, side_depth=SIDE_BRANCH_DEPTH, side_limit=SIDE_POOL_SIZE):
+        self.orphan_limit = orphan_limit
+        self.side_depth = side_depth
+        self.side_limit = side_limit
+        self.work = {}                  # hash -> travail cumulé depuis le genesis
+        self.side = OrderedDict()       # hash -> bloc hors de la chaîne active (ordre d'arrivée)
+        self.orphans = OrderedDict()    # hash -> bloc dont le parent est inconnu
+        self.orphans_by_parent = {}     # hash du parent -> hashes des orphelins
+
+    def connect(self, block):
+        """Enregistre le travail cumulé d'un bloc dont le parent est connu."""
+        if block.hash not in self.work:
+            self.work[block.hash] = self.work.get(block.previous_hash, 0) + block_work(block)
+        return self.work[block.hash]
+
+    def is_known(self, block_hash):
+        return block_hash in self.side or block_hash in self.orphans
+
+    def add_side(self, block):
+        self.side[block.hash] = block
+        work = self.connect(block)
+        while len(self.side) > self.side_limit:
+            self.remove_side(next(iter(self.side)))
+        return work
+
+    def remove_side(self, block_hash):
+        block = self.side.pop(block_hash, None)
+        if block is not None:
+            self.work.pop(block_hash, None)
+        return block
+
+    def branch(self, block_hash, heights):
+        """
+        Blocs d'une branche secondaire, du point de divergence avec la chaîne
+        active (dont `heights` indexe les hashes) jusqu'à `block_hash`.
+        Retourne (hauteur du point de divergence, blocs) ou None.
+        """
+        blocks = []
+        while block_hash not in heights:
+            block = self.side.get(block_hash)
+            if block is None:
+                return None
+            blocks.append(block)
+            block_hash = block.previous_hash
+        blocks.reverse()
+        return heights[block_hash], blocks
+
+    def add_orphan(self, block):
+        if block.hash in self.orphans:
+            return
+        self.orphans[block.hash] = block
+        self.orphans_by_parent.setdefault(block.previous_hash, set()).add(block.hash)
+        while len(self.orphans) > self.orphan_limit:
+            _, oldest = self.orphans.popitem(last=False)
+            self._unlink_orphan(oldest)
+
+    def _unlink_orphan(self, block):
+        children = self.orphans_by_parent.get(block.previous_hash)
+        if children is not None:
+            children.discard(block.hash)
+            if not children:
+                del self.orphans_by_parent[block.previous_hash]
+
+    def pop_orphans(self, parent_hash):
+        """Retire et retourne les orphelins qui attendaient le bloc `parent_hash`."""
+        children = []
+        for block_hash in self.orphans_by_parent.pop(parent_hash, ()):
+            block = self.orphans.pop(block_hash, None)
+            if block is not None:
+                children.append(block)
+        return children
+
+    def prune(self, tip_height):
+        """Oublie les branches secondaires trop anciennes pour provoquer une réorganisation."""
+        for block_hash in [h for h, b in self.side.items() if b.index < tip_height - self.side_depth]:
+            self.remove_side(block_hash)
@@ -0,0 +1,159 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import (BROADCAST_WORKERS, BROADCAST_DEADLINE, BROADCAST_RETRIES, BROADCAST_BACKOFF,
+                    PEER_MAX_FAILURES, INV_BATCH_SIZE)
+from node.logger import get_logger
+
+HEALTH_DECAY = 0.7          # Poids de l'historique dans le score de santé
+UNHEALTHY_SCORE = 0.3       # En dessous, le peer n'a plus droit aux nouvelles tentatives
+
+log = get_logger(__name__)
+
+
+def _remaining(give_up_at):
+    """Temps restant avant l'échéance ; TimeoutError si elle est passée."""
+    remaining = give_up_at - time.time()
+    if remaining <= 0:
+        raise TimeoutError("Délai de diffusion dépassé")
+    return remaining
+
+
+class PeerHealth:
+    """Score de santé d'un peer (moyenne mobile des succès, entre 0 et 1)."""
+
+    def __init__(self):
+        self.score = 1.0
+        self.consecutive_failures = 0
+        self.last_latency = None
+
+    def record_success(self, latency):
+        self.score = self.score * HEALTH_DECAY + (1 - HEALTH_DECAY)
+        self.consecutive_failures = 0
+        self.last_latency = latency
+
+    def record_failure(self):
+        self.score = self.score * HEALTH_DECAY
+        self.consecutive_failures += 1
+
+    @property
+    def healthy(self):
+        return self.score >= UNHEALTHY_SCORE
+
+
+class Broadcaster:
+    """
+    Diffusion parallèle d'un message à tous les peers.
+    Chaque peer dispose d'un délai maximal : un peer lent ou injoignable ne
+    retarde plus les autres. Les échecs sont retentés avec un délai croissant,
+    les peers en mauvaise santé passent en dernier et ceux qui échouent
+    trop souvent sont retirés de la liste des peers.
+    Le délai borne aussi chaque envoi (timeout des sockets) et les nouvelles
+    tentatives ; un peer dont l'envoi n'a pas commencé avant l'échéance
+    n'est pas compté en échec.
+    """
+
+    def __init__(self, network, max_workers=BROADCAST_WORKERS, deadline=BROADCAST_DEADLINE,
+                 retries=BROADCAST_RETRIES, backoff=BROADCAST_BACKOFF, max_failures=PEER_MAX_FAILURES):
+        self.network = network
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_failures = max_failures
+        self.health = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="broadcast")
+
+    def get_health(self, peer):
+        with self.lock:
+            if peer not in self.health:
+                self.health[peer] = PeerHealth()
+            return self.health[peer]
+
+    def _send(self, peer, exchange, give_up_at):
+        """Succès de l'envoi, ou None si l'échéance est passée avant la première tentative."""
+        if time.time() >= give_up_at:
+            return None
+        health = self.get_health(peer)
+        retries = self.retries if health.healthy else 0
+        delay = self.backoff
+        for attempt in range(retries + 1):
+            start = time.time()
+            if start >= give_up_at:
+                break
+            try:
+                exchange(peer, give_up_at - start)
+                with self.lock:
+                    health.record_success(time.time() - start)
+                return True
+            except Exception:
+                if attempt == retries or time.time() + delay >= give_up_at:
+                    break
+                time.sleep(delay)
+                delay *= 2
+        return False
+
+    def _record_failure(self, peer):
+        health = self.get_health(peer)
+        with self.lock:
+            health.record_failure()
+            dead = health.consecutive_failures >= self.max_failures
+            if dead:
+                del self.health[peer]
+        if dead:
+            self.network.remove_peer(peer)
+            log.warning("Peer %s retiré après %d échecs consécutifs", peer, self.max_failures)
+
+    def broadcast(self, message, peers=None):
+        """Envoie le message à tous les peers et retourne {peer: succès}."""
+        return self._broadcast(lambda peer, timeout: self.network.request(peer, message, timeout), peers)
+
+    def _broadcast(self, exchange, peers=None):
+        """Exécute exchange(peer, timeout) pour chaque peer, en parallèle et dans le délai imparti."""
+        if peers is None:
+            peers = self.network.get_peers()
+        # Les peers en bonne santé sont servis en premier
+        peers = sorted(peers, key=lambda p: self.get_health(p).score, reverse=True)
+
+        give_up_at = time.time() + self.deadline
+        futures = {self.executor.submit(self._send, peer, exchange, give_up_at): peer for peer in peers}
+        done, _ = wait(futures, timeout=self.deadline)
+
+        results = {}
+        for future, peer in futures.items():
+            # Jamais commencé (pool saturé jusqu'à l'échéance) : le peer n'y est pour rien
+            if future.cancel() or (future in done and not future.exception() and future.result() is None):
+                results[peer] = False
+                continue
+            results[peer] = future in done and not future.exception() and future.result()
+            if not results[peer]:
+                self._record_failure(peer)
+        return results
+
+    def broadcast_block(self, block):
+        return self.broadcast({'type': 'NEW_BLOCK', 'block': block.to_dict()})
+
+    def broadcast_transaction(self, transaction):
+        return self.broadcast({'type': 'NEW_TRANSACTION', 'transaction': transaction})
+
+    def announce_transactions(self, transactions, tx_hashes, peers=None):
+        """
+        Relais groupé : les hashes sont annoncés par lots (INV), chaque peer
+        répond avec ceux qui lui manquent (GET_DATA) et seules ces
+        transactions lui sont envoyées (TXS).
+        """
+        by_hash = dict(zip(tx_hashes, transactions))
+
+        def exchange(peer, timeout):
+            give_up_at = time.time() + timeout
+            for start in range(0, len(tx_hashes), INV_BATCH_SIZE):
+                inv = {'type': 'INV', 'tx_hashes': tx_hashes[start:start + INV_BATCH_SIZE]}
+                missing = self.network.request(peer, inv, _remaining(give_up_at)).get('tx_hashes', [])
+                wanted = [by_hash[h] for h in missing if h in by_hash]
+                if wanted:
+                    self.network.request(peer, {'type': 'TXS', 'transactions': wanted}, _remaining(give_up_at))
+
+        return self._broadcast(exchange, peers)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,77 @@
+import math
+import time
+from config import (DIFFICULTY, TARGET_BLOCK_TIME, RETARGET_WINDOW, RETARGET_MAX_ADJUST,
+                    MEDIAN_TIME_SPAN, MAX_FUTURE_BLOCK_TIME)
+
+# Cible la plus facile acceptée : un hash valide commence par DIFFICULTY
+# zéros hexadécimaux, comme avant le réajustement. C'est la cible du genesis.
+MAX_TARGET = (1 << (256 - 4 * DIFFICULTY)) - 1
+WINDOW_SIZE = RETARGET_WINDOW + 1  # Blocs à fournir à next_target (parent compris)
+
+
+def meets_target(block_hash, target):
+    """Comparaison numérique : le hash (hexadécimal) ne dépasse pas la cible."""
+    return int(block_hash, 16) <= target
+
+
+def target_to_hex(target):
+    return f'{target:064x}'
+
+
+def target_from_hex(value):
+    target = int(value, 16)
+    if not 0 < target < 1 << 256:
+        raise ValueError(f"Cible hors limites : {value}")
+    return target
+
+
+def work(target):
+    """Nombre moyen de hashes nécessaires pour atteindre la cible."""
+    return (1 << 256) // (target + 1)
+
+
+def valid_timestamp(timestamp, now=None):
+    """Timestamp de bloc acceptable seul : nombre fini, au plus MAX_FUTURE_BLOCK_TIME dans le futur."""
+    if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)) or not math.isfinite(timestamp):
+        return False
+    return timestamp <= (time.time() if now is None else now) + MAX_FUTURE_BLOCK_TIME
+
+
+def median_time_past(window):
+    """Médiane des timestamps des MEDIAN_TIME_SPAN derniers blocs de `window`."""
+    timestamps = sorted(block.timestamp for block in window[-MEDIAN_TIME_SPAN:])
+    return timestamps[len(timestamps) // 2]
+
+
+def follows_median(block, window):
+    """Le bloc qui suit `window` est-il postérieur à la médiane des derniers blocs ?"""
+    return block.timestamp > median_time_past(window)
+
+
+def timestamp_ms(timestamp):
+    return int(round(timestamp * 1000))
+
+
+def next_target(window):
+    """
+    Cible du bloc qui suit `window` (derniers blocs de la chaîne, le parent
+    en dernier). La cible moyenne de la fenêtre est corrigée par le rapport
+    entre le temps réellement écoulé et TARGET_BLOCK_TIME par bloc, ce
+    rapport étant borné par RETARGET_MAX_ADJUST. Le genesis (timestamp 0)
+    n'entre pas dans le calcul. Les timestamps, déjà validés (valid_timestamp,
+    follows_median), sont convertis en millisecondes entières.
+    """
+    parent = window[-1]
+    blocks = [block for block in window if block.index > 0][-WINDOW_SIZE:]
+    if len(blocks) < 2:
+        return parent.target
+
+    # Calcul entier (millisecondes) : tous les nœuds obtiennent la même cible
+    intervals = len(blocks) - 1
+    expected = intervals * timestamp_ms(TARGET_BLOCK_TIME)
+    elapsed = timestamp_ms(blocks[-1].timestamp) - timestamp_ms(blocks[0].timestamp)
+    elapsed = min(max(elapsed, expected // RETARGET_MAX_ADJUST), expected * RETARGET_MAX_ADJUST)
+
+    average = sum(block.target for block in blocks[1:]) // intervals
+    target = average * elapsed // expected
+    return max(1, min(target, MAX_TARGET))
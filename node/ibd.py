@@ -0,0 +1,274 @@
+import os
+import struct
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from node.block import Block
+from node.difficulty import WINDOW_SIZE, meets_target, next_target, valid_timestamp, follows_median
+from node.validation import check_block_dicts
+from node.sync import SYNC_DURATION, SYNC_BLOCKS
+from node.logger import get_logger
+from config import (SYNC_BATCH_SIZE, IBD_CHUNK_SIZE, IBD_CHUNK_TIMEOUT,
+                    IBD_VALIDATION_WORKERS)
+
+MAX_PEER_FAILURES = 3  # Échecs avant d'écarter un peer pour le reste du téléchargement
+
+log = get_logger(__name__)
+
+
+def verify_chunk(block_dicts, expected):
+    """
+    Exécutée dans un processus de validation. Vérifie qu'une plage de blocs
+    correspond aux en-têtes attendus [(hash, previous_hash)] et respecte les
+    règles indépendantes de l'état (voir check_block_dicts). Retourne
+    (index du premier bloc invalide ou None, hashes des transactions par bloc).
+    """
+    if len(block_dicts) != len(expected):
+        return 0, None
+    for i, (block_data, (block_hash, previous_hash)) in enumerate(zip(block_dicts, expected)):
+        if block_data.get('hash') != block_hash or block_data.get('previous_hash') != previous_hash:
+            return i, None
+    results = check_block_dicts(block_dicts)
+    for i, (valid, _) in enumerate(results):
+        if not valid:
+            return i, None
+    return None, [tx_hashes for _, tx_hashes in results]
+
+
+class InitialBlockDownload:
+    """
+    Téléchargement initial de la chaîne depuis tous les peers à la fois.
+    Les en-têtes sont d'abord récupérés auprès du peer le plus haut ; la plage
+    de blocs manquants est ensuite découpée et répartie entre les peers, les
+    blocs reçus sont vérifiés par un pool de processus au fil de l'eau et les
+    plages en retard ou en échec sont réattribuées à d'autres peers.
+    """
+
+    def __init__(self, blockchain, network, chunk_size=IBD_CHUNK_SIZE, chunk_timeout=IBD_CHUNK_TIMEOUT,
+                 validation_workers=IBD_VALIDATION_WORKERS):
+        self.blockchain = blockchain
+        self.network = network
+        self.chunk_size = min(chunk_size, SYNC_BATCH_SIZE)
+        self.chunk_timeout = chunk_timeout
+        self.validation_workers = validation_workers or os.cpu_count() or 1
+
+    def collect_tips(self, peers):
+        with ThreadPoolExecutor(max_workers=max(len(peers), 1)) as executor:
+            tips = dict(zip(peers, executor.map(self.network.get_tip, peers)))
+        return {peer: tip for peer, tip in tips.items() if tip}
+
+    def download_headers(self, peer, tip_height):
+        """
+        En-têtes du point de divergence jusqu'au sommet du peer. Le chaînage,
+        la cible de chaque en-tête (recalculée d'après les précédents) et sa
+        preuve de travail sont vérifiés avant de télécharger le moindre bloc.
+        Chaque lot doit prolonger le précédent : un peer qui n'avance pas
+        (lot vide, répété ou décousu) ou dont les en-têtes sont invalides est
+        retiré des peers ; une erreur réseau interrompt simplement le
+        téléchargement.
+        """
+        try:
+            headers = self.network.get_headers(peer, self.blockchain.block_locator(), limit=SYNC_BATCH_SIZE)
+            if headers is None:
+                return None  # Erreur réseau, déjà journalisée
+            if not headers:
+                return self._drop(peer, "aucun en-tête malgré un sommet plus haut")
+            fork_height = headers[0]['index'] - 1
+            if not (0 <= fork_height < len(self.blockchain.chain) and
+                    headers[0]['previous_hash'] == self.blockchain.chain[fork_height].hash):
+                return self._drop(peer, "en-têtes sans ancêtre commun")
+            if not self._chained(headers[0], headers[1:]):
+                return self._drop(peer, "en-têtes non chaînés")
+
+            while headers[-1]['index'] < tip_height:
+                more = self.network.get_headers(peer, [headers[-1]['hash']], limit=SYNC_BATCH_SIZE)
+                if more is None:
+                    return None
+                if not more or not self._chained(headers[-1], more):
+                    return self._drop(peer, f"lot d'en-têtes vide ou décousu après l'index {headers[-1]['index']}")
+                headers.extend(more)
+        except (KeyError, TypeError, IndexError):
+            return self._drop(peer, "en-têtes mal formés")
+
+        if not self.check_targets(fork_height, headers):
+            return self._drop(peer, "cibles ou preuves de travail invalides")
+        return headers
+
+    @staticmethod
+    def _chained(previous, headers):
+        """`headers` prolonge-t-il `previous` index par index ?"""
+        for header in headers:
+            if header['index'] != previous['index'] + 1 or header['previous_hash'] != previous['hash']:
+                return False
+            previous = header
+        return True
+
+    def _drop(self, peer, reason):
+        log.warning("Peer %s retiré pendant le téléchargement des en-têtes : %s", peer, reason)
+        self.network.remove_peer(peer)
+        return None
+
+    def check_targets(self, fork_height, headers):
+        window = self.blockchain.window(fork_height)
+        for header in headers:
+            try:
+                block = Block.from_header(header)
+                block_hash = block.compute_hash()
+            except (KeyError, ValueError, TypeError, struct.error):
+                return False
+            # La cible attendue ne dépasse jamais MAX_TARGET (voir next_target)
+            if not (valid_timestamp(block.timestamp) and follows_median(block, window)):
+                log.error("En-tête %s : timestamp invalide", header.get('index'))
+                return False
+            if (block_hash != header['hash'] or block.target != next_target(window) or
+                    not meets_target(block_hash, block.target)):
+                log.error("En-tête %s : cible de difficulté ou preuve de travail invalide", header.get('index'))
+                return False
+            window = window[1 - WINDOW_SIZE:] + [block]
+        return True
+
+    def run(self):
+        peers = self.network.get_peers()
+        tips = self.collect_tips(peers)
+        if not tips:
+            return False
+
+        best_peer = max(tips, key=lambda p: tips[p]['height'])
+        tip_height = tips[best_peer]['height']
+        if tip_height <= self.blockchain.last_block.index:
+            return False
+
+        headers = self.download_headers(best_peer, tip_height)
+        if headers is None:
+            log.error("En-têtes invalides ou indisponibles chez le peer %s", best_peer)
+            return False
+        fork_height = headers[0]['index'] - 1
+
+        start_time = time.time()
+        blocks = self.download_blocks(tips, headers)
+        if blocks is None:
+            return False
+
+        # Les blocs ont pu être raccordés au fil de l'eau (extension simple de la chaîne)
+        if blocks and not self.blockchain.replace_suffix(fork_height, blocks):
+            return False
+        if self.blockchain.last_block.hash != headers[-1]['hash']:
+            return False
+
+        elapsed = time.time() - start_time
+        SYNC_DURATION.observe(elapsed, mode='ibd')
+        SYNC_BLOCKS.inc(len(headers), mode='ibd')
+        log.info("Téléchargement initial terminé : %d bloc(s) depuis %d peer(s) en %.1fs",
+                 len(headers), len(tips), elapsed)
+        return True
+
+    def download_blocks(self, tips, headers):
+        """
+        Répartit les plages de blocs entre les peers. Si la chaîne locale est
+        simplement prolongée, chaque plage est raccordée dès que toutes les
+        précédentes sont validées et la liste retournée est vide ; sinon
+        (réorganisation) tous les blocs sont retournés pour être appliqués
+        d'un coup. Retourne None en cas d'échec.
+        """
+        first = headers[0]['index']
+        fork_height = first - 1
+        extend_in_place = fork_height == self.blockchain.last_block.index
+        expected = {h['index']: (h['hash'], h['previous_hash']) for h in headers}
+
+        pending = deque(
+            (start, min(start + self.chunk_size - 1, headers[-1]['index']))
+            for start in range(first, headers[-1]['index'] + 1, self.chunk_size)
+        )
+        in_flight = {}      # future de téléchargement -> (peer, plage, début)
+        validating = {}     # future de validation -> (peer, plage, blocs)
+        busy = set()
+        reassigned = set()  # téléchargements lents dont la plage a été redistribuée
+        failures = {peer: 0 for peer in tips}
+        ready = {}          # début de plage -> blocs validés
+        outstanding = {chunk[0] for chunk in pending}
+        next_start = first
+        collected = []
+
+        fetchers = ThreadPoolExecutor(max_workers=len(tips))
+        validators = ProcessPoolExecutor(max_workers=self.validation_workers)
+        try:
+            while outstanding:
+                # Attribution des plages en attente aux peers libres
+                for peer in sorted(tips, key=lambda p: failures[p]):
+                    if not pending:
+                        break
+                    if peer in busy or failures[peer] >= MAX_PEER_FAILURES:
+                        continue
+                    # Un peer élagué ne fournit pas les blocs sous son horizon
+                    chunk = next((c for c in pending if tips[peer]['height'] >= c[1] and
+                                  tips[peer].get('pruned_height', 0) < c[0]), None)
+                    if chunk is None:
+                        continue
+                    pending.remove(chunk)
+                    busy.add(peer)
+                    future = fetchers.submit(self.network.get_blocks, peer, chunk[0], chunk[1])
+                    in_flight[future] = (peer, chunk, time.time())
+
+                if not in_flight and not validating:
+                    log.error("Plus aucun peer disponible pour le téléchargement")
+                    return None
+
+                done, _ = wait(list(in_flight) + list(validating), timeout=1, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future in in_flight:
+                        peer, chunk, _ = in_flight.pop(future)
+                        busy.discard(peer)
+                        reassigned.discard(future)
+                        block_dicts = None if future.exception() else future.result()
+                        if chunk[0] not in outstanding:
+                            continue  # Plage déjà obtenue auprès d'un autre peer
+                        if not block_dicts:
+                            failures[peer] += 1
+                            if chunk not in pending:
+                                pending.append(chunk)
+                            continue
+                        checks = [expected[i] for i in range(chunk[0], chunk[1] + 1)]
+                        job = validators.submit(verify_chunk, block_dicts, checks)
+                        validating[job] = (peer, chunk, block_dicts)
+                    else:
+                        peer, chunk, block_dicts = validating.pop(future)
+                        if chunk[0] not in outstanding:
+                            continue
+                        if future.exception() or future.result()[0] is not None:
+                            log.error("Blocs %d-%d invalides reçus du peer %s", chunk[0], chunk[1], peer)
+                            failures[peer] = MAX_PEER_FAILURES
+                            if chunk not in pending:
+                                pending.append(chunk)
+                            continue
+                        outstanding.discard(chunk[0])
+                        chunk_blocks = [Block.from_dict(b) for b in block_dicts]
+                        # Les hashes calculés par le pool évitent de les recalculer au raccordement
+                        for block, tx_hashes in zip(chunk_blocks, future.result()[1]):
+                            block.set_tx_hashes(tx_hashes)
+                            self.blockchain.validator.signatures.mark_verified(tx_hashes)
+                        ready[chunk[0]] = chunk_blocks
+
+                # Les plages trop lentes sont proposées à un autre peer
+                now = time.time()
+                for future, (peer, chunk, started) in list(in_flight.items()):
+                    if now - started > self.chunk_timeout and future not in reassigned and chunk[0] in outstanding:
+                        reassigned.add(future)
+                        log.warning("Plage %d-%d lente chez le peer %s, réattribution", chunk[0], chunk[1], peer)
+                        failures[peer] += 1
+                        pending.append(chunk)
+
+                # Raccordement des plages contiguës validées
+                while next_start in ready:
+                    chunk_blocks = ready.pop(next_start)
+                    if extend_in_place:
+                        if not self.blockchain.replace_suffix(next_start - 1, chunk_blocks):
+                            return None
+                    else:
+                        collected.extend(chunk_blocks)
+                    next_start = chunk_blocks[-1].index + 1
+        finally:
+            fetchers.shutdown(wait=False, cancel_futures=True)
+            validators.shutdown(wait=False, cancel_futures=True)
+
+        return collected
@@ -0,0 +1,72 @@
+from node.transaction import NETWORK_SENDER
+
+
+class ChainIndex:
+    """
+    Index de recherche sur la chaîne active (explorateur, preuves d'inclusion) :
+    - hash de transaction -> (index du bloc, position dans le bloc) ;
+    - adresse -> positions des transactions qui la concernent, par hauteur croissante.
+    Hash -> bloc et hauteur -> bloc sont déjà couverts par Blockchain.heights
+    et la liste chain. L'index suit chaque bloc ajouté ou retiré (réorganisation) ;
+    les lecteurs sans verrou revérifient une position trouvée contre la chaîne.
+    """
+
+    def __init__(self):
+        self.transactions = {}  # hash de transaction -> (index du bloc, position)
+        self.history = {}       # adresse -> [(index du bloc, position), ...]
+
+    @staticmethod
+    def _addresses(tx):
+        # Les récompenses n'ont pas d'expéditeur réel : "Network" n'a pas d'historique
+        addresses = {tx['sender'], tx['recipient']}
+        addresses.discard(NETWORK_SENDER)
+        return addresses
+
+    def connect(self, block):
+        for position, (tx, tx_hash) in enumerate(zip(block.transactions, block.tx_hashes())):
+            location = (block.index, position)
+            self.transactions.setdefault(tx_hash, location)
+            for address in self._addresses(tx):
+                self.history.setdefault(address, []).append(location)
+
+    def disconnect(self, block):
+        """Retire un bloc du sommet de la chaîne (dans l'ordre inverse des ajouts)."""
+        entries = list(enumerate(zip(block.transactions, block.tx_hashes())))
+        for position, (tx, tx_hash) in reversed(entries):
+            location = (block.index, position)
+            # Une transaction rejouée dans un autre bloc garde sa première position
+            if self.transactions.get(tx_hash) == location:
+                del self.transactions[tx_hash]
+            for address in self._addresses(tx):
+                history = self.history.get(address)
+                if history and history[-1] == location:
+                    history.pop()
+                    if not history:
+                        del self.history[address]
+
+    def prune(self, block):
+        """Oublie le plus ancien bloc indexé (mode élagué : ses transactions ne sont plus gardées)."""
+        for position, (tx, tx_hash) in enumerate(zip(block.transactions, block.tx_hashes())):
+            location = (block.index, position)
+            if self.transactions.get(tx_hash) == location:
+                del self.transactions[tx_hash]
+            for address in self._addresses(tx):
+                history = self.history.get(address)
+                if history and history[0] == location:
+                    history.pop(0)
+                    if not history:
+                        del self.history[address]
+
+    def locate(self, tx_hash):
+        return self.transactions.get(tx_hash)
+
+    def address_history(self, address, start=0, limit=None):
+        """
+        Positions des transactions d'une adresse, des plus récentes aux plus
+        anciennes, à partir de `start`. Retourne (nombre total, positions).
+        """
+        history = self.history.get(address, [])
+        total = len(history)
+        end = total - start
+        begin = 0 if limit is None else max(end - limit, 0)
+        return total, history[begin:max(end, 0)][::-1]
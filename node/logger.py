@@ -0,0 +1,86 @@
+import sys
+import time
+import logging
+import threading
+from colorama import Fore, Style
+from config import LOG_LEVEL, LOG_RATE_LIMIT, LOG_RATE_INTERVAL
+
+COLORS = {
+    logging.DEBUG: Fore.CYAN,
+    logging.INFO: Fore.GREEN,
+    logging.WARNING: Fore.YELLOW,
+    logging.ERROR: Fore.RED,
+    logging.CRITICAL: Fore.RED,
+}
+
+
+class ColorFormatter(logging.Formatter):
+    """Même rendu que les anciens print colorés : une couleur par niveau."""
+
+    def format(self, record):
+        return COLORS.get(record.levelno, '') + super().format(record) + Style.RESET_ALL
+
+
+class ConsoleHandler(logging.StreamHandler):
+    """Écrit sur le sys.stdout du moment, comme print (les redirections sont suivies)."""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limite les messages de même modèle (ex : "Erreur dans handle_peer: %s")
+    à `limit` par intervalle : un peer défaillant ne noie plus la console.
+    Le nombre de messages supprimés est ajouté au premier message affiché
+    de l'intervalle suivant.
+    """
+
+    def __init__(self, limit=LOG_RATE_LIMIT, interval=LOG_RATE_INTERVAL):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.windows = {}  # (logger, modèle) -> [début de l'intervalle, affichés, supprimés]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self.windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} ({suppressed} message(s) similaire(s) supprimé(s))"
+                return True
+            if window[1] < self.limit:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+def setup_logging(level=LOG_LEVEL):
+    """Configure le journal du nœud (logger "node") : couleurs, niveau et limitation de débit."""
+    logger = logging.getLogger('node')
+    if not logger.handlers:
+        handler = ConsoleHandler()
+        handler.setFormatter(ColorFormatter('%(message)s'))
+        handler.addFilter(RateLimitFilter())
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+    return logger
+
+
+def get_logger(name):
+    """Logger d'un module du nœud (ex : get_logger(__name__) dans node/network.py)."""
+    if not logging.getLogger('node').handlers:
+        setup_logging()
+    return logging.getLogger(name)
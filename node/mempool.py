@@ -0,0 +1,158 @@
+import heapq
+import itertools
+import threading
+from collections import OrderedDict
+from node.transaction import Transaction, compute_tx_hash, to_units
+from config import MEMPOOL_MAX_SIZE
+
+
+def _spent(transaction):
+    return to_units(transaction['amount']) + to_units(transaction.get('fee', 0))
+
+
+def fee_rate(transaction):
+    """Frais par octet de l'encodage canonique (critère de sélection et d'éviction)."""
+    return transaction.get('fee', 0) / len(Transaction.from_dict(transaction).encode())
+
+
+class Mempool:
+    """
+    Transactions en attente indexées par hash.
+    Insertion, suppression et test d'appartenance en O(1), avec le total
+    en attente de chaque expéditeur maintenu à jour. Un verrou protège les
+    modifications et les copies (threads P2P, API, CLI).
+
+    Une fois plein, le mempool évince la transaction au plus faible taux de
+    frais avec les transactions suivantes de son expéditeur (qui dépendent
+    de son nonce), et refuse une transaction qui ne paie pas mieux qu'elle.
+    """
+
+    def __init__(self, max_size=MEMPOOL_MAX_SIZE):
+        self.max_size = max_size
+        self.transactions = OrderedDict()  # hash -> transaction (ordre d'arrivée)
+        self.pending_by_sender = {}  # montants + frais en attente par expéditeur (unités de base)
+        self.by_sender = {}  # expéditeur -> hashes en attente, par nonce croissant
+        self.rates = {}      # hash -> taux de frais
+        self._by_rate = []   # tas (taux, séquence, hash), entrées périmées ignorées
+        self._sequence = itertools.count()
+        self.removals = 0  # Incrémenté à chaque retrait (permet de détecter un modèle de bloc périmé)
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.transactions)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __contains__(self, tx_hash):
+        return tx_hash in self.transactions
+
+    def get(self, tx_hash):
+        return self.transactions.get(tx_hash)
+
+    def pending_amount(self, sender):
+        return self.pending_by_sender.get(sender, 0)
+
+    def pending_count(self, sender):
+        return len(self.by_sender.get(sender, ()))
+
+    def _lowest(self):
+        """Hash de la transaction en attente au plus faible taux de frais."""
+        while self._by_rate and self._by_rate[0][2] not in self.transactions:
+            heapq.heappop(self._by_rate)
+        return self._by_rate[0][2] if self._by_rate else None
+
+    def _evict(self, tx_hash):
+        """Retire une transaction et celles de son expéditeur aux nonces suivants."""
+        transaction = self.transactions[tx_hash]
+        later = [h for h in self.by_sender[transaction['sender']]
+                 if self.transactions[h]['nonce'] >= transaction['nonce']]
+        for h in later:
+            self.remove(h)
+
+    def _make_room(self, transaction, rate):
+        while len(self.transactions) >= self.max_size:
+            lowest = self._lowest()
+            # Une transaction qui dépend de la moins rémunératrice serait orpheline
+            if rate <= self.rates[lowest] or self.transactions[lowest]['sender'] == transaction['sender']:
+                return False
+            self._evict(lowest)
+        return True
+
+    def add(self, transaction, tx_hash=None):
+        """
+        Ajoute une transaction. Retourne False si elle est déjà présente ou
+        si le mempool est plein et qu'elle ne paie pas mieux que la moins
+        rémunératrice.
+        """
+        if tx_hash is None:
+            tx_hash = compute_tx_hash(transaction)
+        rate = fee_rate(transaction)
+        with self.lock:
+            if tx_hash in self.transactions:
+                return False
+            if self.max_size and len(self.transactions) >= self.max_size and not self._make_room(transaction, rate):
+                return False
+
+            self.transactions[tx_hash] = transaction
+            sender = transaction['sender']
+            self.pending_by_sender[sender] = self.pending_by_sender.get(sender, 0) + _spent(transaction)
+            self.by_sender.setdefault(sender, {})[tx_hash] = None
+            self.rates[tx_hash] = rate
+            # Les entrées des transactions retirées ne sont purgées qu'en bloc
+            if len(self._by_rate) > 2 * len(self.transactions) + 64:
+                self._by_rate = [(r, next(self._sequence), h) for h, r in self.rates.items()]
+                heapq.heapify(self._by_rate)
+            else:
+                heapq.heappush(self._by_rate, (rate, next(self._sequence), tx_hash))
+            return True
+
+    def remove(self, tx_hash):
+        with self.lock:
+            transaction = self.transactions.pop(tx_hash, None)
+            if transaction is None:
+                return None
+            self.removals += 1
+
+            del self.rates[tx_hash]
+            sender = transaction['sender']
+            pending = self.by_sender[sender]
+            del pending[tx_hash]
+            if not pending:
+                del self.by_sender[sender]
+                del self.pending_by_sender[sender]
+            else:
+                self.pending_by_sender[sender] -= _spent(transaction)
+            return transaction
+
+    def remove_confirmed(self, transactions, tx_hashes=None):
+        """
+        Retire en bloc les transactions confirmées. Retourne le nombre retiré.
+        tx_hashes évite de recalculer les hashes (ex : Block.tx_hashes()).
+        """
+        if tx_hashes is None:
+            tx_hashes = [compute_tx_hash(tx) for tx in transactions]
+        removed = 0
+        with self.lock:
+            for tx_hash in tx_hashes:
+                if self.remove(tx_hash) is not None:
+                    removed += 1
+        return removed
+
+    def clear(self):
+        with self.lock:
+            self.removals += 1
+            self.transactions.clear()
+            self.pending_by_sender.clear()
+            self.by_sender.clear()
+            self.rates.clear()
+            self._by_rate = []
+
+    def to_list(self):
+        with self.lock:
+            return list(self.transactions.values())
+
+    def items(self):
+        """Copie des (hash, transaction), dans l'ordre d'arrivée."""
+        with self.lock:
+            return list(self.transactions.items())
@@ -0,0 +1,61 @@
+import hashlib
+
+# Préfixe des nœuds internes : un nœud ne peut pas être confondu avec une feuille
+NODE_PREFIX = b'\x01'
+EMPTY_ROOT = hashlib.sha256(b'').digest()
+
+
+def _parent(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def merkle_root(leaves):
+    """
+    Racine de Merkle d'une liste de hashes (bytes). Un nœud sans voisin
+    est remonté tel quel au niveau supérieur (pas de duplication).
+    """
+    if not leaves:
+        return EMPTY_ROOT
+    level = list(leaves)
+    while len(level) > 1:
+        next_level = [_parent(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            next_level.append(level[-1])
+        level = next_level
+    return level[0]
+
+
+def merkle_proof(leaves, index):
+    """
+    Preuve d'inclusion de la feuille `index` : liste de (hash voisin en hex,
+    'left' ou 'right' selon la position du voisin), de la feuille vers la racine.
+    """
+    proof = []
+    level = list(leaves)
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append((level[sibling].hex(), 'left' if sibling < index else 'right'))
+        next_level = [_parent(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            next_level.append(level[-1])
+        level = next_level
+        index //= 2
+    return proof
+
+
+def verify_merkle_proof(leaf_hex, proof, root_hex):
+    """Vérifie qu'une feuille appartient à l'arbre de racine root_hex."""
+    try:
+        current = bytes.fromhex(leaf_hex)
+        for sibling_hex, position in proof:
+            sibling = bytes.fromhex(sibling_hex)
+            if position == 'left':
+                current = _parent(sibling, current)
+            elif position == 'right':
+                current = _parent(current, sibling)
+            else:
+                return False
+        return current.hex() == root_hex
+    except (ValueError, TypeError):
+        return False
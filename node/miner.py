@@ -0,0 +1,127 @@
+import os
+import time
+import queue
+import hashlib
+import threading
+import multiprocessing
+from node.block import NONCE
+from node.logger import get_logger
+from node import metrics
+from config import MINING_WORKERS
+
+CHECK_INTERVAL = 2000  # Tentatives entre deux vérifications d'annulation
+
+log = get_logger(__name__)
+
+HASHRATE = metrics.gauge('node_mining_hashrate', "Hashrate du dernier minage (hashes par seconde)")
+MINING_ATTEMPTS = metrics.counter('node_mining_hashes_total', "Hashes calculés par la preuve de travail")
+MINING_DURATION = metrics.histogram('node_mining_duration_seconds', "Durée d'une preuve de travail, par issue",
+                                    ['result'], buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+
+
+def search_nonce(prefix, target, start, step, stop_event, results):
+    """
+    Parcourt les nonces start, start + step, start + 2*step, ...
+    L'en-tête sans nonce est haché une seule fois puis copié à chaque tentative.
+    `target` est la cible sur 32 octets big-endian : comparer les condensés
+    octet par octet revient à comparer les entiers.
+    """
+    base = hashlib.sha256(prefix)
+    nonce = start
+    attempts = 0
+    while not stop_event.is_set():
+        for i in range(CHECK_INTERVAL):
+            h = base.copy()
+            h.update(NONCE.pack(nonce))
+            digest = h.digest()
+            if digest <= target:
+                stop_event.set()
+                results.put(('found', nonce, digest.hex(), attempts + i + 1))
+                return
+            nonce += step
+        attempts += CHECK_INTERVAL
+    results.put(('stopped', None, None, attempts))
+
+
+class Miner:
+    """
+    Moteur de preuve de travail réparti sur plusieurs processus.
+    Chaque worker explore une partie entrelacée de l'espace des nonces.
+    """
+
+    def __init__(self, workers=MINING_WORKERS):
+        self.workers = workers or os.cpu_count() or 1
+        self.last_hashrate = 0.0
+        self._lock = threading.Lock()
+        self._stop_event = None
+        self._cancelled = False
+
+    def cancel(self):
+        """Interrompt le minage en cours (ex : un bloc concurrent vient d'arriver)."""
+        with self._lock:
+            if self._stop_event is not None:
+                self._cancelled = True
+                self._stop_event.set()
+
+    def mine(self, block):
+        """
+        Cherche un nonce dont le hash ne dépasse pas la cible du bloc.
+        Retourne le hash trouvé, ou None si le minage a été annulé.
+        """
+        prefix = block.pow_template()
+        target = block.target.to_bytes(32, 'big')
+
+        if self.workers == 1:
+            stop_event, results = threading.Event(), queue.Queue()
+        else:
+            stop_event, results = multiprocessing.Event(), multiprocessing.Queue()
+
+        with self._lock:
+            self._stop_event = stop_event
+            self._cancelled = False
+
+        start_time = time.time()
+        processes = []
+        if self.workers == 1:
+            search_nonce(prefix, target, 0, 1, stop_event, results)
+        else:
+            for i in range(self.workers):
+                p = multiprocessing.Process(
+                    target=search_nonce,
+                    args=(prefix, target, i, self.workers, stop_event, results),
+                    daemon=True
+                )
+                p.start()
+                processes.append(p)
+
+        # Chaque worker dépose exactement un résultat (trouvé ou arrêté)
+        found = None
+        attempts = 0
+        for _ in range(self.workers):
+            status, nonce, digest, count = results.get()
+            attempts += count
+            if status == 'found' and found is None:
+                found = (nonce, digest)
+        for p in processes:
+            p.join()
+
+        elapsed = max(time.time() - start_time, 1e-9)
+        self.last_hashrate = attempts / elapsed
+        HASHRATE.set(self.last_hashrate)
+        MINING_ATTEMPTS.inc(attempts)
+
+        with self._lock:
+            cancelled = self._cancelled
+            self._stop_event = None
+
+        if cancelled or found is None:
+            MINING_DURATION.observe(elapsed, result='cancelled')
+            log.warning("Minage interrompu après %d tentatives", attempts)
+            return None
+
+        block.nonce = found[0]
+        MINING_DURATION.observe(elapsed, result='found')
+        log.info("✅ Bloc validé avec nonce=%d => hash=%s", block.nonce, found[1])
+        log.info("⛏️ %d tentatives en %.2fs (%.0f H/s sur %d worker(s))",
+                 attempts, elapsed, self.last_hashrate, self.workers)
+        return found[1]
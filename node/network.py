@@ -1,8 +1,104 @@
 import socket
+import random
 import threading
-import json
-from config import PEER_TIMEOUT
-from colorama import Fore, Style
+import time
+from config import (PEER_TIMEOUT, PEER_IDLE_TIMEOUT, POOL_MAX_CONNECTIONS, SYNC_BATCH_SIZE, CHAIN_STREAM_BATCH,
+                    INV_MAX_SIZE)
+from node.protocol import send_message, recv_frame
+from node.broadcast import Broadcaster
+from node.logger import get_logger
+from node import metrics
+
+log = get_logger(__name__)
+
+INBOUND = 'inbound'  # Label des connexions entrantes (le port d'écoute du peer n'est pas connu)
+
+PEER_REQUEST_SECONDS = metrics.histogram('node_peer_request_seconds',
+                                         "Latence des requêtes envoyées aux peers, par peer et type de message",
+                                         ['peer', 'type'])
+PEER_REQUEST_FAILURES = metrics.counter('node_peer_request_failures_total', "Requêtes aux peers en échec",
+                                        ['peer'])
+PEER_BYTES_SENT = metrics.counter('node_peer_bytes_sent_total', "Octets envoyés, par peer", ['peer'])
+PEER_BYTES_RECEIVED = metrics.counter('node_peer_bytes_received_total', "Octets reçus, par peer", ['peer'])
+MESSAGE_HANDLING = metrics.histogram('node_message_handling_seconds', "Traitement des messages reçus, par type",
+                                     ['type'])
+
+
+class LinkConditions:
+    """
+    Conditions réseau simulées sur les requêtes sortantes (simulation et
+    tests) : latence fixe, gigue aléatoire et probabilité de perte.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.random = random.Random(seed)
+
+    def apply(self):
+        if self.loss and self.random.random() < self.loss:
+            raise ConnectionError("Requête perdue (perte simulée)")
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ConnectionPool:
+    """
+    Connexions TCP persistantes vers chaque peer, réutilisées d'un message
+    à l'autre. Une connexion n'est utilisée que par un seul échange à la fois.
+    """
+
+    def __init__(self, max_per_peer=POOL_MAX_CONNECTIONS, idle_timeout=PEER_IDLE_TIMEOUT):
+        self.max_per_peer = max_per_peer
+        # Marge pour ne pas réutiliser une connexion que le serveur va fermer
+        self.idle_timeout = idle_timeout / 2
+        self.idle = {}  # peer -> [(socket, dernière utilisation)]
+        self.lock = threading.Lock()
+
+    def _open(self, peer_port, timeout):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.settimeout(timeout)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        s.connect(('127.0.0.1', peer_port))
+        return s
+
+    def acquire(self, peer_port, timeout=PEER_TIMEOUT):
+        """Retourne (socket, réutilisée), avec `timeout` pour ses opérations."""
+        now = time.time()
+        with self.lock:
+            connections = self.idle.get(peer_port, [])
+            while connections:
+                s, last_used = connections.pop()
+                if now - last_used < self.idle_timeout:
+                    s.settimeout(timeout)
+                    return s, True
+                s.close()
+        return self._open(peer_port, timeout), False
+
+    def release(self, peer_port, s):
+        with self.lock:
+            connections = self.idle.setdefault(peer_port, [])
+            if len(connections) < self.max_per_peer:
+                connections.append((s, time.time()))
+                return
+        s.close()
+
+    def discard(self, s):
+        try:
+            s.close()
+        except OSError:
+            pass
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for s, _ in connections:
+                    s.close()
+            self.idle.clear()
+
 
 class P2PNode:
     def __init__(self, port):
@@ -14,11 +110,15 @@ class P2PNode:
         self.server.listen(5)
         self.running = True
         self.lock = threading.Lock()
+        self.pool = ConnectionPool()
+        self.broadcaster = Broadcaster(self)
         self.transaction_callback = None
+        self.transactions_callback = None
         self.block_callback = None
-        self.blockchain = None  
+        self.blockchain = None
+        self.conditions = None  # LinkConditions simulées (aucune par défaut)
 
-    def set_blockchain(self, blockchain):  
+    def set_blockchain(self, blockchain):
         self.blockchain = blockchain
 
     def start(self):
@@ -31,133 +131,324 @@ class P2PNode:
                 threading.Thread(target=self.handle_peer, args=(conn,), daemon=True).start()
             except Exception as e:
                 if self.running:
-                    print(Fore.RED + f"Erreur lors de l'acceptation d'une connexion : {e}" + Style.RESET_ALL)
+                    log.error("Erreur lors de l'acceptation d'une connexion : %s", e)
 
     def handle_peer(self, conn):
+        """Traite les messages d'une connexion jusqu'à sa fermeture ou son inactivité."""
+        conn.settimeout(PEER_IDLE_TIMEOUT)
         try:
-            data = conn.recv(65536)
-            if not data:
-                return
-            message = json.loads(data.decode())
-            msg_type = message.get('type')
-
-            if msg_type == 'NEW_PEER':
-                peer_port = message.get('port')
-                if peer_port and peer_port != self.port:
-                    with self.lock:
-                        self.peers.add(peer_port)
-                    with self.lock:
-                        peers_list = list(self.peers)
-                    conn.send(json.dumps({'type': 'PEERS', 'peers': peers_list}).encode())
-                    for p in peers_list:
-                        if p != self.port and p != peer_port:
-                            self.connect_to_peer(p)
-
-            elif msg_type == 'GET_PEERS':
-                with self.lock:
-                    peers_list = list(self.peers)
-                conn.send(json.dumps({'type': 'PEERS', 'peers': peers_list}).encode())
-
-            elif msg_type == 'NEW_TRANSACTION':
-                tx = message.get('transaction')
-                if tx and self.transaction_callback:
-                    self.transaction_callback(tx)
-                conn.send(json.dumps({'type': 'ACK', 'message': 'Transaction reçue'}).encode())
-
-            elif msg_type == 'NEW_BLOCK':
-                block_data = message.get('block')
-                if block_data and self.block_callback:
-                    self.block_callback(block_data)
-                conn.send(json.dumps({'type': 'ACK', 'message': 'Bloc reçu'}).encode())
-
-            elif msg_type == 'GET_CHAIN':
-                if self.blockchain:
-                    chain_data = [block.to_dict() for block in self.blockchain.chain]
-                    conn.send(json.dumps(chain_data).encode())
+            while self.running:
+                try:
+                    message, size = recv_frame(conn)
+                except socket.timeout:
+                    break
+                if message is None:
+                    break
+                PEER_BYTES_RECEIVED.inc(size, peer=INBOUND)
+                response = self.handle_message(message)
+                if isinstance(response, dict):
+                    PEER_BYTES_SENT.inc(send_message(conn, response), peer=INBOUND)
                 else:
-                    conn.send(json.dumps([]).encode())
-
-            else:
-                conn.send(json.dumps({'type': 'ERROR', 'message': 'Type de message inconnu'}).encode())
-
+                    # Réponse en plusieurs trames (ex : GET_CHAIN)
+                    for part in response:
+                        PEER_BYTES_SENT.inc(send_message(conn, part), peer=INBOUND)
         except Exception as e:
-            print(Fore.RED + f"Erreur dans handle_peer: {e}" + Style.RESET_ALL)
+            log.error("Erreur dans handle_peer: %s", e)
         finally:
             conn.close()
 
+    def handle_message(self, message):
+        """
+        Traite un message reçu et retourne la réponse à renvoyer : un message,
+        ou un itérateur de messages pour les réponses envoyées en plusieurs trames.
+        """
+        with MESSAGE_HANDLING.time(type=message.get('type') or 'unknown'):
+            return self._handle_message(message)
+
+    def _handle_message(self, message):
+        msg_type = message.get('type')
+
+        if msg_type == 'NEW_PEER':
+            peer_port = message.get('port')
+            if peer_port and peer_port != self.port:
+                with self.lock:
+                    known = peer_port in self.peers
+                    self.peers.add(peer_port)
+                    peers_list = list(self.peers)
+                if not known:
+                    # Découverte en arrière-plan, après la réponse : le nouveau peer
+                    # n'attend pas les échanges avec nos peers, et un peer déjà connu
+                    # ne relance pas de découverte (pas d'avalanche de NEW_PEER)
+                    others = [p for p in peers_list if p != self.port and p != peer_port]
+                    threading.Thread(target=self._discover, args=(others,), daemon=True).start()
+                return {'type': 'PEERS', 'peers': peers_list}
+            return {'type': 'ERROR', 'message': 'Port invalide'}
+
+        elif msg_type == 'GET_PEERS':
+            with self.lock:
+                peers_list = list(self.peers)
+            return {'type': 'PEERS', 'peers': peers_list}
+
+        elif msg_type == 'NEW_TRANSACTION':
+            tx = message.get('transaction')
+            if tx and self.transaction_callback:
+                self.transaction_callback(tx)
+            return {'type': 'ACK', 'message': 'Transaction reçue'}
+
+        elif msg_type == 'INV':
+            # Annonce de transactions : on ne demande que celles qui nous manquent
+            # (ni en attente, ni déjà confirmées : un peer en retard en annonce encore)
+            tx_hashes = message.get('tx_hashes', [])[:INV_MAX_SIZE]
+            if self.blockchain:
+                tx_hashes = [h for h in tx_hashes if not self.blockchain.knows_transaction(h)]
+            return {'type': 'GET_DATA', 'tx_hashes': tx_hashes}
+
+        elif msg_type == 'TXS':
+            transactions = message.get('transactions', [])[:INV_MAX_SIZE]
+            if transactions and self.transactions_callback:
+                self.transactions_callback(transactions)
+            return {'type': 'ACK', 'message': f'{len(transactions)} transaction(s) reçue(s)'}
+
+        elif msg_type == 'NEW_BLOCK':
+            block_data = message.get('block')
+            if block_data and self.block_callback:
+                self.block_callback(block_data)
+            return {'type': 'ACK', 'message': 'Bloc reçu'}
+
+        elif msg_type == 'GET_CHAIN':
+            return self.stream_chain()
+
+        elif msg_type == 'GET_TIP':
+            if not self.blockchain:
+                return {'type': 'ERROR', 'message': 'Blockchain non initialisée'}
+            tip = self.blockchain.last_block
+            # pruned_height : les blocs jusqu'à cet index ne peuvent pas être demandés à ce nœud
+            return {'type': 'TIP', 'height': tip.index, 'hash': tip.hash,
+                    'pruned_height': self.blockchain.pruned_height}
+
+        elif msg_type == 'GET_HEADERS':
+            headers = []
+            if self.blockchain:
+                limit = min(int(message.get('limit', SYNC_BATCH_SIZE)), SYNC_BATCH_SIZE)
+                headers = self.blockchain.get_headers(message.get('locator', []), limit)
+            return {'type': 'HEADERS', 'headers': headers}
+
+        elif msg_type == 'GET_PROOF':
+            proof = self.blockchain.get_proof(message.get('tx_hash')) if self.blockchain else None
+            if proof is None:
+                return {'type': 'ERROR', 'message': 'Transaction introuvable'}
+            return dict(proof, type='PROOF')
+
+        elif msg_type == 'GET_SNAPSHOT':
+            snapshot = self.blockchain.snapshot(int(message.get('height', -1))) if self.blockchain else None
+            if snapshot is None:
+                return {'type': 'ERROR', 'message': 'Instantané indisponible'}
+            return dict(snapshot, type='SNAPSHOT')
+
+        elif msg_type == 'GET_BLOCKS':
+            blocks = []
+            if self.blockchain:
+                start = int(message.get('start', 0))
+                end = min(int(message.get('end', start)), start + SYNC_BATCH_SIZE - 1)
+                blocks = [block.to_dict() for block in self.blockchain.get_blocks(start, end)]
+            return {'type': 'BLOCKS', 'blocks': blocks}
+
+        return {'type': 'ERROR', 'message': 'Type de message inconnu'}
+
+    def stream_chain(self):
+        """
+        Envoie la chaîne par trames CHAIN de CHAIN_STREAM_BATCH blocs suivies
+        d'une trame CHAIN_END : seul un lot est sérialisé en mémoire à la fois.
+        """
+        if self.blockchain and self.blockchain.pruned_height:
+            yield {'type': 'ERROR', 'message': 'Nœud élagué : chaîne complète indisponible'}
+            return
+        chain = self.blockchain.chain if self.blockchain else []
+        length = len(chain)
+        for start in range(0, length, CHAIN_STREAM_BATCH):
+            blocks = chain[start:min(start + CHAIN_STREAM_BATCH, length)]
+            yield {'type': 'CHAIN', 'blocks': [block.to_dict() for block in blocks]}
+        yield {'type': 'CHAIN_END', 'length': length}
+
+    def request_stream(self, peer_port, message, end_type):
+        """
+        Envoie un message et itère sur les trames de réponse jusqu'à celle
+        de type end_type (incluse).
+        """
+        s, _ = self.pool.acquire(peer_port)
+        try:
+            PEER_BYTES_SENT.inc(send_message(s, message), peer=peer_port)
+            while True:
+                response, size = recv_frame(s)
+                if response is None:
+                    raise ConnectionError("Connexion fermée par le peer")
+                PEER_BYTES_RECEIVED.inc(size, peer=peer_port)
+                yield response
+                if response.get('type') in (end_type, 'ERROR'):
+                    break
+        except BaseException:
+            # Réponse incomplète : la connexion ne peut pas être réutilisée
+            self.pool.discard(s)
+            raise
+        self.pool.release(peer_port, s)
+
+    def request(self, peer_port, message, timeout=PEER_TIMEOUT):
+        """
+        Envoie un message à un peer et attend la réponse (latence et échecs
+        mesurés). `timeout` borne la durée de l'échange.
+        """
+        start = time.perf_counter()
+        try:
+            if self.conditions is not None:
+                self.conditions.apply()
+            response = self._exchange(peer_port, message, timeout)
+        except Exception:
+            PEER_REQUEST_FAILURES.inc(peer=peer_port)
+            raise
+        PEER_REQUEST_SECONDS.observe(time.perf_counter() - start, peer=peer_port, type=message.get('type'))
+        return response
+
+    def _exchange(self, peer_port, message, timeout):
+        """
+        Envoie un message sur une connexion du pool et attend la réponse.
+        Une connexion réutilisée a pu être fermée par le peer entre-temps :
+        dans ce cas l'échange est retenté une fois sur une connexion neuve,
+        dans le temps restant.
+        """
+        give_up_at = time.monotonic() + timeout
+        for attempt in range(2):
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("Délai de l'échange dépassé")
+            s, reused = self.pool.acquire(peer_port, remaining)
+            try:
+                sent = send_message(s, message)
+                response, received = recv_frame(s)
+                if response is None:
+                    raise ConnectionError("Connexion fermée par le peer")
+                PEER_BYTES_SENT.inc(sent, peer=peer_port)
+                PEER_BYTES_RECEIVED.inc(received, peer=peer_port)
+            except (OSError, ConnectionError):
+                self.pool.discard(s)
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                self.pool.discard(s)
+                raise
+            self.pool.release(peer_port, s)
+            return response
+
     def connect_to_peer(self, peer_port):
         if peer_port == self.port:
             return
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(PEER_TIMEOUT)
-            s.connect(('127.0.0.1', peer_port))
-            message = json.dumps({'type': 'NEW_PEER', 'port': self.port})
-            s.send(message.encode())
-            data = s.recv(4096)
-            response = json.loads(data.decode())
+            response = self.request(peer_port, {'type': 'NEW_PEER', 'port': self.port})
             if response.get('type') == 'PEERS':
                 with self.lock:
                     filtered_peers = [p for p in response['peers'] if p != self.port]
                     self.peers.update(filtered_peers)
-            s.close()
+                    self.peers.add(peer_port)
         except Exception as e:
-            print(Fore.RED + f"Erreur connexion peer {peer_port}: {e}" + Style.RESET_ALL)
+            log.error("Erreur connexion peer %s: %s", peer_port, e)
+
+    def _discover(self, peers):
+        for peer_port in peers:
+            self.connect_to_peer(peer_port)
 
     def get_peers(self):
         with self.lock:
             return list(self.peers)
 
+    def remove_peer(self, peer_port):
+        with self.lock:
+            self.peers.discard(peer_port)
+
     def send_transaction(self, peer_port, transaction):
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(PEER_TIMEOUT)
-            s.connect(('127.0.0.1', peer_port))
-            message = json.dumps({'type': 'NEW_TRANSACTION', 'transaction': transaction})
-            s.send(message.encode())
-            s.recv(1024)
-            s.close()
+            self.request(peer_port, {'type': 'NEW_TRANSACTION', 'transaction': transaction})
         except Exception as e:
-            print(Fore.RED + f"Erreur en envoyant la transaction au peer {peer_port}: {e}" + Style.RESET_ALL)
+            log.error("Erreur en envoyant la transaction au peer %s: %s", peer_port, e)
 
     def send_block(self, peer_port, block):
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(PEER_TIMEOUT)
-            s.connect(('127.0.0.1', peer_port))
-            message = json.dumps({'type': 'NEW_BLOCK', 'block': block.to_dict()})
-            s.send(message.encode())
-            s.recv(1024)
-            s.close()
+            self.request(peer_port, {'type': 'NEW_BLOCK', 'block': block.to_dict()})
         except Exception as e:
-            print(Fore.RED + f"Erreur en envoyant le bloc au peer {peer_port}: {e}" + Style.RESET_ALL)
+            log.error("Erreur en envoyant le bloc au peer %s: %s", peer_port, e)
+
+    def iter_chain(self, peer_port):
+        """Itère sur les blocs (dicts) de la chaîne d'un peer au fur et à mesure de leur réception."""
+        for response in self.request_stream(peer_port, {'type': 'GET_CHAIN'}, 'CHAIN_END'):
+            if response.get('type') == 'ERROR':
+                raise ConnectionError(response.get('message'))
+            yield from response.get('blocks', [])
 
     def request_chain(self, peer_port):
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(PEER_TIMEOUT)
-            s.connect(('127.0.0.1', peer_port))
-            message = json.dumps({'type': 'GET_CHAIN'})
-            s.send(message.encode())
-            data = b''
-            while True:
-                part = s.recv(4096)
-                if not part:
-                    break
-                data += part
-            s.close()
-            chain_data = json.loads(data.decode())
-            return chain_data
+            return list(self.iter_chain(peer_port))
         except Exception as e:
-            print(Fore.RED + f"Erreur en récupérant la chaîne du peer {peer_port}: {e}" + Style.RESET_ALL)
+            log.error("Erreur en récupérant la chaîne du peer %s: %s", peer_port, e)
             return None
 
+    def get_tip(self, peer_port):
+        """Hauteur et hash du dernier bloc d'un peer : {'height', 'hash'}."""
+        try:
+            response = self.request(peer_port, {'type': 'GET_TIP'})
+            if response.get('type') == 'TIP':
+                return response
+        except Exception as e:
+            log.error("Erreur en récupérant le sommet du peer %s: %s", peer_port, e)
+        return None
+
+    def get_headers(self, peer_port, locator, limit=SYNC_BATCH_SIZE):
+        try:
+            response = self.request(peer_port, {'type': 'GET_HEADERS', 'locator': locator, 'limit': limit})
+            return response.get('headers')
+        except Exception as e:
+            log.error("Erreur en récupérant les en-têtes du peer %s: %s", peer_port, e)
+            return None
+
+    def get_blocks(self, peer_port, start, end):
+        """Blocs d'index start à end inclus (au plus SYNC_BATCH_SIZE)."""
+        try:
+            response = self.request(peer_port, {'type': 'GET_BLOCKS', 'start': start, 'end': end})
+            return response.get('blocks')
+        except Exception as e:
+            log.error("Erreur en récupérant les blocs du peer %s: %s", peer_port, e)
+            return None
+
+    def get_snapshot(self, peer_port, height):
+        """État d'un peer au point de contrôle `height` : {'height', 'hash', 'balances', 'nonces'}."""
+        try:
+            response = self.request(peer_port, {'type': 'GET_SNAPSHOT', 'height': height})
+            if response.get('type') == 'SNAPSHOT':
+                return response
+        except Exception as e:
+            log.error("Erreur en récupérant l'instantané du peer %s: %s", peer_port, e)
+        return None
+
+    def get_proof(self, peer_port, tx_hash):
+        """Preuve d'inclusion d'une transaction auprès d'un peer (à vérifier avec Block.verify_inclusion)."""
+        try:
+            response = self.request(peer_port, {'type': 'GET_PROOF', 'tx_hash': tx_hash})
+            if response.get('type') == 'PROOF':
+                return response
+        except Exception as e:
+            log.error("Erreur en récupérant la preuve du peer %s: %s", peer_port, e)
+        return None
+
     def stop(self):
         self.running = False
         self.server.close()
+        self.pool.close()
+        self.broadcaster.shutdown()
 
     def set_transaction_callback(self, callback):
         self.transaction_callback = callback
 
+    def set_transactions_callback(self, callback):
+        """Callback appelé avec la liste des transactions d'un message TXS."""
+        self.transactions_callback = callback
+
     def set_block_callback(self, callback):
         self.block_callback = callback
@@ -1,17 +1,34 @@
+import os
 import threading
+import signal
 import sys
 import time
+import argparse
 from colorama import init, Fore, Style
 
 from node.blockchain import Blockchain
-from node.network import P2PNode
+from node.network import P2PNode, LinkConditions
+from node.async_network import AsyncP2PNode
 from node.wallet import Wallet
-from node.api import app, setup_api
+from node.storage import BlockStore
+from node.sync import ChainSynchronizer
+from node.ibd import InitialBlockDownload
+from node.snapshot import SnapshotBootstrap
+from config import DATA_DIR, WALLET_FILE, NETWORK_BACKEND, BOOTSTRAP_PEERS, SYNC_INTERVAL, PRUNE_DEPTH, SNAPSHOT_INTERVAL
+from node.api import NodeAPI
+from node.logger import get_logger
 
 init(autoreset=True)
 
-def run_flask(port):
-    app.run(port=port + 1000, debug=False, use_reloader=False)
+log = get_logger('node.node')
+
+def create_network(port, backend=NETWORK_BACKEND):
+    """Instancie le nœud P2P selon le backend choisi ("threaded" ou "asyncio")."""
+    if backend == "asyncio":
+        return AsyncP2PNode(port)
+    if backend == "threaded":
+        return P2PNode(port)
+    raise ValueError(f"Backend réseau inconnu : {backend}")
 
 def print_menu():
     print(Fore.BLUE + "\n--- UTBM Blockchain Node CLI ---" + Style.RESET_ALL)
@@ -41,22 +58,20 @@ def cli_loop(blockchain, network, wallet):
             print(Fore.GREEN + f"Solde de {addr} : {balance} UTBM\n")
 
         elif choice == '4':
-            sender = input(Fore.YELLOW + "Sender: " + Style.RESET_ALL).strip()
+            # Les transactions sont signées par le portefeuille du nœud
             recipient = input(Fore.YELLOW + "Recipient: " + Style.RESET_ALL).strip()
             try:
                 amount = float(input(Fore.YELLOW + "Amount: " + Style.RESET_ALL).strip())
+                fee = float(input(Fore.YELLOW + "Fee [0]: " + Style.RESET_ALL).strip() or 0)
             except ValueError:
                 print(Fore.RED + "Montant invalide\n" + Style.RESET_ALL)
                 continue
 
-            tx = {"sender": sender, "recipient": recipient, "amount": amount}
+            tx = wallet.create_transaction(recipient, amount, fee,
+                                           blockchain.next_nonce(wallet.get_address())).to_dict()
             if blockchain.add_new_transaction(tx):
-                for peer in network.get_peers():
-                    try:
-                        network.send_transaction(peer, tx)
-                    except Exception as e:
-                        print(Fore.RED + f"Erreur en envoyant la transaction au peer {peer}: {e}" + Style.RESET_ALL)
-                print(Fore.GREEN + "Transaction ajoutée et propagée\n" + Style.RESET_ALL)
+                results = network.broadcaster.broadcast_transaction(tx)
+                print(Fore.GREEN + f"Transaction ajoutée et propagée à {sum(results.values())}/{len(results)} peer(s)\n" + Style.RESET_ALL)
             else:
                 print(Fore.RED + "Transaction refusée (solde insuffisant)\n" + Style.RESET_ALL)
 
@@ -68,11 +83,8 @@ def cli_loop(blockchain, network, wallet):
             block = blockchain.mine(miner_address)
             if block:
                 print(Fore.GREEN + f"Bloc miné avec succès : index {block.index}\n" + Style.RESET_ALL)
-                for peer in network.get_peers():
-                    try:
-                        network.send_block(peer, block)
-                    except Exception as e:
-                        print(Fore.RED + f"Erreur en envoyant le bloc au peer {peer}: {e}" + Style.RESET_ALL)
+                results = network.broadcaster.broadcast_block(block)
+                print(Fore.GREEN + f"Bloc propagé à {sum(results.values())}/{len(results)} peer(s)\n" + Style.RESET_ALL)
             else:
                 print(Fore.YELLOW + "Aucune transaction à miner\n" + Style.RESET_ALL)
 
@@ -83,6 +95,7 @@ def cli_loop(blockchain, network, wallet):
 
         elif choice == '7':
             print(Fore.CYAN + "Au revoir !" + Style.RESET_ALL)
+            blockchain.save_snapshot()
             network.stop()
             break
 
@@ -90,99 +103,175 @@ def cli_loop(blockchain, network, wallet):
             print(Fore.RED + "Choix invalide\n" + Style.RESET_ALL)
 
 def synchronize_chain(blockchain, network):
-    """Essaye de synchroniser la blockchain depuis les pairs."""
-    from node.block import Block
-
-    for peer in network.get_peers():
-        try:
-            chain_data = network.request_chain(peer)
-            if chain_data and len(chain_data) > len(blockchain.chain):
-                new_chain = [Block.from_dict(b) for b in chain_data]
-                if validate_chain(new_chain):
-                    blockchain.chain = new_chain
-                    blockchain.unconfirmed_transactions = []
-                    print(Fore.GREEN + f"Chaîne synchronisée depuis le peer {peer}\n" + Style.RESET_ALL)
-                    return True
-        except Exception as e:
-            print(Fore.RED + f"Erreur de synchronisation avec le peer {peer}: {e}" + Style.RESET_ALL)
-
-    print(Fore.YELLOW + "Chaîne locale à jour ou synchronisation impossible\n" + Style.RESET_ALL)
+    """Essaye de synchroniser la blockchain depuis les pairs (suffixe manquant uniquement)."""
+    if ChainSynchronizer(blockchain, network).sync():
+        return True
+
+    log.info("Chaîne locale à jour ou synchronisation impossible")
     return False
 
-def validate_chain(chain):
-    """Valide l'intégrité d'une chaîne de blocs."""
-    from node.blockchain import DIFFICULTY
-    for i in range(1, len(chain)):
-        current, previous = chain[i], chain[i - 1]
-        if current.previous_hash != previous.hash:
-            print(Fore.RED + f"Chaîne invalide à l'index {i} : mauvais previous_hash" + Style.RESET_ALL)
-            return False
-        if not current.hash.startswith('0' * DIFFICULTY) or current.hash != current.compute_hash():
-            print(Fore.RED + f"Chaîne invalide à l'index {i} : preuve de travail invalide" + Style.RESET_ALL)
-            return False
-    return True
-
-def periodic_sync(blockchain, network, interval=30):
-    """Synchronisation périodique avec les peers."""
-    while True:
-        time.sleep(interval)
+def periodic_sync(blockchain, network, interval=SYNC_INTERVAL, stopped=None):
+    """Synchronisation périodique avec les peers (jusqu'à ce que `stopped` soit levé)."""
+    stopped = stopped or threading.Event()
+    while not stopped.wait(interval):
         if synchronize_chain(blockchain, network):
-            print(Fore.GREEN + "Synchronisation périodique effectuée\n" + Style.RESET_ALL)
-
-def main():
-    if len(sys.argv) < 2:
-        print(Fore.RED + "Usage: python -m node.node <port>" + Style.RESET_ALL)
-        return
-
-    port = int(sys.argv[1])
-
-    blockchain = Blockchain()
-    network = P2PNode(port)
-    wallet = Wallet()
-    network.set_blockchain(blockchain)
-
-    def on_receive_transaction(tx):
-        if tx not in blockchain.unconfirmed_transactions:
-            blockchain.add_new_transaction(tx)
-            print(Fore.GREEN + f"\nTransaction reçue : {tx}\n" + Style.RESET_ALL)
-
-    def on_receive_block(block_data):
-        success = blockchain.add_block_from_network(block_data)
-        if success:
-            print(Fore.GREEN + f"\nBloc ajouté via réseau : index {block_data['index']}\n" + Style.RESET_ALL)
+            log.info("Synchronisation périodique effectuée")
+
+
+class Node:
+    """
+    Nœud complet sans interface : chaîne, réseau P2P, portefeuille et API.
+    Utilisé par le CLI, le mode sans interface (--headless) et la simulation.
+    """
+
+    def __init__(self, port, backend=NETWORK_BACKEND, data_dir=DATA_DIR, api_port=None, prune_depth=PRUNE_DEPTH,
+                 wallet_path=None):
+        self.port = port
+        store = BlockStore(os.path.join(data_dir, str(port))) if data_dir else None
+        self.blockchain = Blockchain(store=store, prune_depth=prune_depth)
+        self.network = create_network(port, backend)
+        # Clé du portefeuille gardée avec la chaîne (sans stockage : clé éphémère)
+        if wallet_path is None and data_dir:
+            wallet_path = os.path.join(data_dir, str(port), WALLET_FILE)
+        self.wallet = Wallet.load_or_create(wallet_path) if wallet_path else Wallet()
+        self.api_port = api_port
+        self.stopped = threading.Event()
+        self.network.set_blockchain(self.blockchain)
+        self.network.set_transaction_callback(self.on_receive_transaction)
+        self.network.set_transactions_callback(self.on_receive_transactions)
+        self.network.set_block_callback(self.on_receive_block)
+
+    def on_receive_transaction(self, tx):
+        # add_new_transaction ignore les doublons (index par hash du mempool)
+        if self.blockchain.add_new_transaction(tx):
+            log.info("Transaction reçue : %s", tx)
+
+    def on_receive_block(self, block_data):
+        # Les blocs hors du sommet sont gérés par l'arbre des blocs (branches
+        # secondaires, orphelins) : pas de resynchronisation systématique
+        if self.blockchain.add_block_from_network(block_data, self.network):
+            log.info("Bloc ajouté via réseau : index %s", block_data['index'])
+            # Relais aux autres peers : le bloc atteint aussi les nœuds qui ne
+            # sont pas directement reliés au mineur (déjà connu chez l'émetteur)
+            threading.Thread(target=self.network.broadcaster.broadcast,
+                             args=({'type': 'NEW_BLOCK', 'block': block_data},), daemon=True).start()
+
+    def on_receive_transactions(self, transactions):
+        # Lot reçu par TXS : les transactions admises sont annoncées aux autres peers
+        admitted = self.blockchain.add_transactions(transactions)
+        accepted = [(tx, tx_hash) for tx, (tx_hash, error) in zip(transactions, admitted) if error is None]
+        if accepted:
+            log.info("%d transaction(s) reçue(s) en lot", len(accepted))
+            # En arrière-plan : le peer qui nous a envoyé le lot n'attend pas le relais
+            threading.Thread(target=self.network.broadcaster.announce_transactions,
+                             args=([tx for tx, _ in accepted], [h for _, h in accepted]), daemon=True).start()
+
+    def start(self, peers=None, sync_interval=SYNC_INTERVAL):
+        """
+        Démarre le réseau, rejoint les peers et synchronise la chaîne. Sans
+        `peers`, les peers de BOOTSTRAP_PEERS sont contactés et échangent leurs
+        listes de peers ; avec `peers`, la liste est fixée telle quelle (topologie
+        imposée, utilisée par la simulation).
+        """
+        self.network.start()
+
+        if peers is None:
+            # Connexion aux peers connus
+            for peer_port in BOOTSTRAP_PEERS:
+                if peer_port != self.port:
+                    try:
+                        self.network.connect_to_peer(peer_port)
+                        time.sleep(0.1)
+                    except Exception as e:
+                        log.error("Erreur de connexion au peer %s: %s", peer_port, e)
         else:
-            print(Fore.RED + f"\nBloc rejeté : tentative de resynchro...\n" + Style.RESET_ALL)
-            synchronize_chain(blockchain, network)
-
-    network.set_transaction_callback(on_receive_transaction)
-    network.set_block_callback(on_receive_block)
+            with self.network.lock:
+                self.network.peers.update(p for p in peers if p != self.port)
+
+        # Synchronisation initiale : un nœud élagué neuf part de l'instantané du
+        # dernier point de contrôle, puis téléchargement parallèle depuis tous
+        # les peers et synchronisation classique pour rattraper les retardataires
+        if self.blockchain.prune_depth:
+            SnapshotBootstrap(self.blockchain, self.network).run()
+        InitialBlockDownload(self.blockchain, self.network).run()
+        synchronize_chain(self.blockchain, self.network)
+
+        # Lancer les threads : sync périodique et API Flask
+        threading.Thread(target=periodic_sync, args=(self.blockchain, self.network, sync_interval, self.stopped),
+                         daemon=True).start()
+        if self.api_port is not None:
+            NodeAPI(self.blockchain, self.network, self.wallet).run(self.api_port)
+        log.info("Node lancé sur le port %d (API sur %s, métriques sur /metrics)", self.port, self.api_port)
+
+    def mine_forever(self, interval):
+        """Mode sans interface : mine un bloc toutes les `interval` secondes s'il y a des transactions."""
+        while not self.stopped.wait(interval):
+            if self.blockchain.mempool:
+                self.blockchain.mine(self.wallet.get_address(), self.network)
+
+    def stop(self):
+        self.stopped.set()
+        self.blockchain.save_snapshot()
+        self.network.stop()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m node.node", description="Nœud de la blockchain UTBM")
+    parser.add_argument('port', type=int, help="Port P2P (l'API écoute sur port + 1000)")
+    parser.add_argument('--asyncio', action='store_true', help="Réseau asyncio au lieu d'un thread par connexion")
+    parser.add_argument('--headless', action='store_true', help="Sans CLI : le nœud tourne jusqu'à SIGINT/SIGTERM")
+    parser.add_argument('--peers', help="Liste fixe de ports de peers, séparés par des virgules "
+                                        f"(défaut : {','.join(map(str, BOOTSTRAP_PEERS))} avec découverte)")
+    parser.add_argument('--mine-interval', type=float, default=0,
+                        help="En mode --headless, mine toutes les N secondes s'il y a des transactions")
+    parser.add_argument('--sync-interval', type=float, default=SYNC_INTERVAL,
+                        help="Intervalle de la synchronisation périodique (secondes)")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="Répertoire de stockage (vide : chaîne en mémoire)")
+    parser.add_argument('--no-api', action='store_true', help="Ne pas démarrer l'API REST")
+    parser.add_argument('--wallet', metavar='FICHIER',
+                        help=f"Clé privée du portefeuille (PEM, créée si absente ; défaut : <data-dir>/<port>/{WALLET_FILE})")
+    parser.add_argument('--prune', type=int, default=PRUNE_DEPTH, metavar='N',
+                        help="Mode élagué : ne garder complets que les N derniers blocs (0 = nœud complet)")
+    parser.add_argument('--latency', type=float, default=0, help="Latence simulée des requêtes sortantes (secondes)")
+    parser.add_argument('--jitter', type=float, default=0, help="Gigue simulée ajoutée à la latence (secondes)")
+    parser.add_argument('--loss', type=float, default=0, help="Probabilité de perte simulée d'une requête sortante")
+    args = parser.parse_args(argv)
+    if 0 < args.prune <= SNAPSHOT_INTERVAL:
+        parser.error(f"--prune doit dépasser SNAPSHOT_INTERVAL ({SNAPSHOT_INTERVAL})")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    backend = "asyncio" if args.asyncio else NETWORK_BACKEND
+    api_port = None if args.no_api else args.port + 1000
+    peers = [int(p) for p in args.peers.split(',') if p] if args.peers is not None else None
+
+    node = Node(args.port, backend, args.data_dir, api_port, args.prune, args.wallet)
+    if args.latency or args.jitter or args.loss:
+        node.network.conditions = LinkConditions(args.latency, args.jitter, args.loss)
 
     print(Fore.BLUE + "\n=== Adresse de ce noeud ===" + Style.RESET_ALL)
-    print(wallet.get_address())
+    print(node.wallet.get_address())
     print(Fore.BLUE + "===========================\n" + Style.RESET_ALL)
 
-    network.start()
+    node.start(peers, args.sync_interval)
 
-    # Connexion aux peers connus
-    for peer_port in [5001, 5002, 5003]:
-        if peer_port != port:
-            try:
-                network.connect_to_peer(peer_port)
-                time.sleep(0.1)
-            except Exception as e:
-                print(Fore.RED + f"Erreur de connexion au peer {peer_port}: {e}" + Style.RESET_ALL)
-
-    # Synchronisation initiale
-    synchronize_chain(blockchain, network)
-
-    # Lancer les threads : sync périodique et API Flask
-    threading.Thread(target=periodic_sync, args=(blockchain, network), daemon=True).start()
-    setup_api(blockchain, network, wallet)
-    threading.Thread(target=run_flask, args=(port,), daemon=True).start()
-
-    print(Fore.GREEN + f"Node lancé sur le port {port} (API sur {port + 1000})\n" + Style.RESET_ALL)
+    if not args.headless:
+        cli_loop(node.blockchain, node.network, node.wallet)
+        return
 
-    cli_loop(blockchain, network, wallet)
+    # Sans interface : arrêt propre (instantané des soldes) sur SIGINT ou SIGTERM
+    signal.signal(signal.SIGTERM, lambda *_: node.stopped.set())
+    try:
+        if args.mine_interval:
+            node.mine_forever(args.mine_interval)
+        else:
+            while not node.stopped.wait(1):
+                pass
+    except KeyboardInterrupt:
+        pass
+    node.stop()
 
 if __name__ == "__main__":
     main()
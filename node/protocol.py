@@ -0,0 +1,140 @@
+import asyncio
+import json
+import zlib
+import struct
+from config import MAX_FRAME_SIZE, COMPRESSION_THRESHOLD
+
+# Trame : taille du contenu (4 octets), type de message (1 octet), flags (1 octet)
+FRAME_HEADER = struct.Struct('!IBB')
+FLAG_COMPRESSED = 0x01
+
+# Code 0 réservé aux types inconnus : le type reste alors dans le contenu JSON
+MESSAGE_TYPES = [
+    None,
+    'NEW_PEER', 'PEERS', 'GET_PEERS',
+    'NEW_TRANSACTION', 'NEW_BLOCK', 'GET_CHAIN', 'CHAIN',
+    'ACK', 'ERROR',
+    'GET_TIP', 'TIP', 'GET_HEADERS', 'HEADERS', 'GET_BLOCKS', 'BLOCKS',
+    'CHAIN_END', 'GET_PROOF', 'PROOF',
+    'INV', 'GET_DATA', 'TXS',
+    'GET_SNAPSHOT', 'SNAPSHOT',
+]
+MESSAGE_CODES = {name: code for code, name in enumerate(MESSAGE_TYPES) if name}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(message, compress=True):
+    message = dict(message)
+    code = MESSAGE_CODES.get(message.get('type'), 0)
+    if code:
+        del message['type']
+
+    payload = json.dumps(message, separators=(',', ':')).encode()
+    # Limite appliquée au contenu décompressé : le destinataire la vérifie aussi
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Message trop volumineux ({len(payload)} octets)")
+    flags = 0
+    if compress and len(payload) >= COMPRESSION_THRESHOLD:
+        compressed = zlib.compress(payload)
+        if len(compressed) < len(payload):
+            payload, flags = compressed, FLAG_COMPRESSED
+    return FRAME_HEADER.pack(len(payload), code, flags) + payload
+
+
+def _decompress(payload):
+    """Décompresse au plus MAX_FRAME_SIZE octets : une bombe zlib est refusée sans être dépliée."""
+    decompressor = zlib.decompressobj()
+    try:
+        data = decompressor.decompress(payload, MAX_FRAME_SIZE)
+    except zlib.error as e:
+        raise ProtocolError(f"Contenu compressé invalide : {e}")
+    if decompressor.unconsumed_tail or decompressor.unused_data or not decompressor.eof:
+        raise ProtocolError("Contenu compressé trop volumineux ou mal formé")
+    return data
+
+
+def decode_frame(code, flags, payload):
+    if flags & FLAG_COMPRESSED:
+        payload = _decompress(payload)
+    message = json.loads(payload.decode())
+    if code:
+        if code >= len(MESSAGE_TYPES):
+            raise ProtocolError(f"Type de message inconnu : {code}")
+        message['type'] = MESSAGE_TYPES[code]
+    return message
+
+
+def recv_exact(sock, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 65536))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_message(sock, message, compress=True):
+    """Envoie une trame. Retourne sa taille en octets."""
+    frame = encode_frame(message, compress)
+    sock.sendall(frame)
+    return len(frame)
+
+
+def recv_frame(sock):
+    """
+    Lit une trame complète : (message, taille en octets), ou (None, 0) si
+    le pair a fermé la connexion.
+    """
+    header = recv_exact(sock, FRAME_HEADER.size)
+    if header is None:
+        return None, 0
+    length, code, flags = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Trame trop volumineuse ({length} octets)")
+    payload = recv_exact(sock, length)
+    if payload is None:
+        raise ProtocolError("Connexion fermée au milieu d'une trame")
+    return decode_frame(code, flags, payload), FRAME_HEADER.size + length
+
+
+def recv_message(sock):
+    """Lit une trame complète. Retourne None si le pair a fermé la connexion."""
+    return recv_frame(sock)[0]
+
+
+async def read_message(reader):
+    """Équivalent asyncio de recv_message. Retourne None si le pair a fermé la connexion."""
+    return (await read_frame(reader))[0]
+
+
+async def read_frame(reader):
+    """Équivalent asyncio de recv_frame : (message, taille en octets)."""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ProtocolError("Connexion fermée au milieu d'une trame")
+        return None, 0
+    length, code, flags = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Trame trop volumineuse ({length} octets)")
+    try:
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ProtocolError("Connexion fermée au milieu d'une trame")
+    return decode_frame(code, flags, payload), FRAME_HEADER.size + length
+
+
+async def write_message(writer, message, compress=True):
+    """Envoie une trame. Retourne sa taille en octets."""
+    frame = encode_frame(message, compress)
+    writer.write(frame)
+    # drain() bloque tant que le tampon d'envoi est plein (contre-pression)
+    await writer.drain()
+    return len(frame)
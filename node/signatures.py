@@ -0,0 +1,128 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import rsa
+from pyasn1.error import PyAsn1Error
+from node.transaction import Transaction, NETWORK_SENDER
+from config import SIGNATURE_WORKERS, SIGNATURE_PARALLEL_THRESHOLD, SIGNATURE_CACHE_SIZE
+
+KEY_CACHE_SIZE = 1024  # Clés publiques décodées gardées en mémoire (le décodage PEM coûte plus que la vérification)
+
+
+def address_of(public_key_pem):
+    """Adresse associée à une clé publique PEM (même calcul que Wallet.get_address)."""
+    return hashlib.sha256(public_key_pem.encode()).hexdigest()
+
+
+_keys = OrderedDict()
+
+
+def _load_key(public_key_pem):
+    key = _keys.get(public_key_pem)
+    if key is None:
+        key = rsa.PublicKey.load_pkcs1(public_key_pem.encode())
+        _keys[public_key_pem] = key
+        while len(_keys) > KEY_CACHE_SIZE:
+            _keys.popitem(last=False)
+    return key
+
+
+def verify_signature(tx):
+    """
+    Vérifie la signature d'une Transaction : la clé publique correspond à
+    l'adresse de l'expéditeur et signe l'encodage de la transaction.
+    """
+    if not tx.public_key or not tx.signature:
+        return False
+    try:
+        if address_of(tx.public_key) != tx.sender:
+            return False
+        rsa.verify(tx.signing_bytes(), bytes.fromhex(tx.signature), _load_key(tx.public_key))
+        return True
+    except (rsa.VerificationError, PyAsn1Error, ValueError, TypeError, AttributeError):
+        return False
+
+
+def verify_signatures(tx_dicts):
+    """Exécutée dans un processus de vérification : un booléen par transaction."""
+    return [verify_signature(Transaction.from_dict(tx)) for tx in tx_dicts]
+
+
+class SignatureVerifier:
+    """
+    Vérification des signatures avec cache par hash de transaction : une
+    transaction vérifiée à son arrivée dans le mempool ne l'est pas une
+    seconde fois quand son bloc arrive. Le hash couvrant la signature et la
+    clé publique, une entrée du cache ne peut pas servir à une autre
+    transaction. Les grands lots sont répartis sur un pool de processus
+    (rsa est en pur Python).
+    """
+
+    def __init__(self, workers=SIGNATURE_WORKERS, parallel_threshold=SIGNATURE_PARALLEL_THRESHOLD,
+                 cache_size=SIGNATURE_CACHE_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.parallel_threshold = parallel_threshold
+        self.cache_size = cache_size
+        self.verified = OrderedDict()  # hash de transaction -> None (signature valide)
+        self.lock = threading.Lock()
+        self._executor = None
+
+    def mark_verified(self, tx_hashes):
+        with self.lock:
+            for tx_hash in tx_hashes:
+                self.verified[tx_hash] = None
+                self.verified.move_to_end(tx_hash)
+            while len(self.verified) > self.cache_size:
+                self.verified.popitem(last=False)
+
+    def is_verified(self, tx_hash):
+        with self.lock:
+            return tx_hash in self.verified
+
+    def verify(self, tx, tx_hash=None):
+        """Vérifie une Transaction (les récompenses de minage ne sont pas signées)."""
+        if tx.sender == NETWORK_SENDER:
+            return True
+        tx_hash = tx_hash or tx.compute_hash()
+        if self.is_verified(tx_hash):
+            return True
+        if not verify_signature(tx):
+            return False
+        self.mark_verified([tx_hash])
+        return True
+
+    def verify_batch(self, transactions, tx_hashes):
+        """Vérifie une liste de transactions (dicts) et leurs hashes : un booléen par transaction."""
+        results = [True] * len(transactions)
+        with self.lock:
+            unchecked = [i for i, (tx, tx_hash) in enumerate(zip(transactions, tx_hashes))
+                         if tx.get('sender') != NETWORK_SENDER and tx_hash not in self.verified]
+        if not unchecked:
+            return results
+
+        if len(unchecked) < self.parallel_threshold or self.workers == 1:
+            valid = [verify_signature(Transaction.from_dict(transactions[i])) for i in unchecked]
+        else:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            chunk = -(-len(unchecked) // self.workers)
+            futures = [
+                self._executor.submit(verify_signatures, [transactions[i] for i in unchecked[j:j + chunk]])
+                for j in range(0, len(unchecked), chunk)
+            ]
+            valid = [ok for future in futures for ok in future.result()]
+
+        for i, ok in zip(unchecked, valid):
+            results[i] = ok
+        self.mark_verified(tx_hashes[i] for i, ok in zip(unchecked, valid) if ok)
+        return results
+
+    def verify_many(self, transactions, tx_hashes):
+        """True si toutes les transactions sont correctement signées."""
+        return all(self.verify_batch(transactions, tx_hashes))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
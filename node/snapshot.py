@@ -0,0 +1,121 @@
+import time
+from node.block import Block
+from node.ibd import InitialBlockDownload
+from node.state import AccountState, state_digest
+from node.difficulty import WINDOW_SIZE
+from node.sync import SYNC_DURATION, SYNC_BLOCKS
+from node.logger import get_logger
+from config import SNAPSHOT_INTERVAL, SYNC_BATCH_SIZE
+
+log = get_logger(__name__)
+
+
+def latest_checkpoint(tip_height):
+    """Dernier point de contrôle dont les soldes sont engagés par un bloc de la chaîne (0 si aucun)."""
+    return (tip_height - 1) // SNAPSHOT_INTERVAL * SNAPSHOT_INTERVAL if tip_height > 1 else 0
+
+
+class SnapshotBootstrap:
+    """
+    Démarrage d'un nœud neuf sans rejouer la chaîne depuis le genesis :
+    1. en-têtes de toute la chaîne du peer le plus haut (chaînage, cibles et
+       preuves de travail vérifiés, voir InitialBlockDownload) ;
+    2. soldes et nonces au dernier point de contrôle (GET_SNAPSHOT), acceptés
+       seulement si leur condensé est la racine d'état de l'en-tête du bloc suivant ;
+    3. blocs complets après le point de contrôle, validés à partir de ces soldes.
+    Les blocs antérieurs ne sont jamais téléchargés : ils restent réduits à
+    leur en-tête, comme sur un nœud élagué.
+    """
+
+    def __init__(self, blockchain, network, batch_size=SYNC_BATCH_SIZE):
+        self.blockchain = blockchain
+        self.network = network
+        self.batch_size = batch_size
+        self.ibd = InitialBlockDownload(blockchain, network)
+
+    def run(self):
+        if len(self.blockchain.chain) != 1:
+            return False  # Chaîne déjà présente (stockage) : synchronisation classique
+        tips = self.ibd.collect_tips(self.network.get_peers())
+        if not tips:
+            return False
+        peers = sorted(tips, key=lambda p: tips[p]['height'], reverse=True)
+        tip_height = tips[peers[0]]['height']
+        checkpoint = latest_checkpoint(tip_height)
+        if not checkpoint:
+            return False
+
+        start_time = time.time()
+        headers = self.ibd.download_headers(peers[0], tip_height)
+        if headers is None:
+            log.error("En-têtes invalides ou indisponibles chez le peer %s", peers[0])
+            return False
+        headers = [Block.from_header(header) for header in headers]
+
+        # headers[i] est le bloc d'index i + 1
+        state = self.fetch_snapshot(peers, headers[checkpoint - 1], headers[checkpoint].state_root)
+        if state is None:
+            log.error("Aucun instantané vérifiable au point de contrôle %d", checkpoint)
+            return False
+        blocks = self.download_blocks([p for p in peers if tips[p].get('pruned_height', 0) <= checkpoint],
+                                      headers, checkpoint, state)
+        if blocks is None or not self.blockchain.bootstrap(headers[:checkpoint], state, blocks):
+            return False
+
+        elapsed = time.time() - start_time
+        SYNC_DURATION.observe(elapsed, mode='snapshot')
+        SYNC_BLOCKS.inc(len(blocks), mode='snapshot')
+        log.info("Démarrage depuis l'instantané du bloc %d : %d en-tête(s), %d bloc(s) complet(s) en %.1fs",
+                 checkpoint, checkpoint, len(blocks), elapsed)
+        return True
+
+    def fetch_snapshot(self, peers, checkpoint, commitment):
+        """Premier instantané dont le condensé correspond à l'engagement de la chaîne d'en-têtes."""
+        for peer in peers:
+            snapshot = self.network.get_snapshot(peer, checkpoint.index)
+            if snapshot is None:
+                continue
+            try:
+                valid = (snapshot['height'] == checkpoint.index and snapshot['hash'] == checkpoint.hash and
+                         state_digest(snapshot['balances'], snapshot['nonces']) == commitment)
+            except (KeyError, TypeError, ValueError, AttributeError):
+                valid = False
+            if not valid:
+                log.warning("Instantané du peer %s rejeté : état non conforme à la racine d'état", peer)
+                continue
+            return AccountState.from_snapshot(snapshot, checkpoint.index)
+        return None
+
+    def download_blocks(self, peers, headers, checkpoint, state):
+        """
+        Blocs checkpoint+1 .. sommet, conformes aux en-têtes et validés sur
+        `state` (cibles, preuves, racines d'état, soldes). Retourne None au
+        premier lot introuvable ou invalide.
+        """
+        previous = headers[checkpoint - 1]
+        history = ([self.blockchain.chain[0]] + headers[:checkpoint])[-WINDOW_SIZE:]
+        blocks = []
+        start, tip_height = checkpoint + 1, headers[-1].index
+        while start <= tip_height:
+            end = min(start + self.batch_size - 1, tip_height)
+            expected = [header.hash for header in headers[start - 1:end]]
+            batch = None
+            for peer in peers:
+                try:
+                    candidate = [Block.from_dict(b) for b in self.network.get_blocks(peer, start, end) or []]
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if [block.hash for block in candidate] == expected:
+                    batch = candidate
+                    break
+            if batch is None:
+                log.error("Blocs %d-%d indisponibles auprès des peers", start, end)
+                return None
+            if not self.blockchain.validator.validate_blocks(previous, batch, state, history):
+                log.error("Blocs %d-%d invalides après l'instantané", start, end)
+                return None
+            blocks.extend(batch)
+            history = (history + batch)[-WINDOW_SIZE:]
+            previous = batch[-1]
+            start = end + 1
+        return blocks
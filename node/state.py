@@ -0,0 +1,183 @@
+import json
+import hashlib
+from node.transaction import NETWORK_SENDER, to_units, from_units
+from config import SNAPSHOT_INTERVAL
+
+
+def is_checkpoint(height):
+    """Hauteurs dont l'état des soldes sert d'instantané (tous les SNAPSHOT_INTERVAL blocs)."""
+    return height > 0 and height % SNAPSHOT_INTERVAL == 0
+
+
+def commits_state(height):
+    """Le bloc `height` engage-t-il dans son en-tête les soldes de son parent (un point de contrôle) ?"""
+    return is_checkpoint(height - 1)
+
+
+def state_digest(balances, nonces):
+    """
+    Condensé canonique de l'état (soldes en unités de base entières et
+    nonces), engagé dans l'en-tête du bloc qui suit un point de contrôle.
+    Soldes et nonces nuls sont exclus.
+    """
+    entries = [(address, balances[address]) for address in sorted(balances) if balances[address]]
+    counters = [(address, nonces[address]) for address in sorted(nonces) if nonces[address]]
+    return hashlib.sha256(json.dumps([entries, counters], separators=(',', ':')).encode()).hexdigest()
+
+
+class AccountState:
+    """
+    Index des soldes par adresse, maintenu incrémentalement à chaque bloc
+    ajouté ou retiré de la chaîne (évite de reparcourir toute la chaîne).
+    Les soldes sont des entiers en unités de base (voir to_units).
+    """
+
+    def __init__(self):
+        self.balances = {}  # adresse -> solde en unités de base
+        self.nonces = {}  # adresse -> transactions envoyées (nonce attendu de la suivante)
+        self.height = -1  # Index du dernier bloc appliqué
+
+    @classmethod
+    def from_snapshot(cls, snapshot, height):
+        """État restauré depuis un instantané {'balances', 'nonces'} ; ValueError si mal formé."""
+        if not all(isinstance(value, int) and not isinstance(value, bool)
+                   for field in ('balances', 'nonces') for value in snapshot.get(field, {}).values()):
+            raise ValueError("Instantané mal formé : soldes et nonces entiers attendus")
+        state = cls()
+        state.balances = {address: balance for address, balance in snapshot['balances'].items() if balance != 0}
+        state.nonces = {address: nonce for address, nonce in snapshot.get('nonces', {}).items() if nonce}
+        state.height = height
+        return state
+
+    def get_units(self, address):
+        return self.balances.get(address, 0)
+
+    def get_balance(self, address):
+        """Solde en UTBM."""
+        return from_units(self.get_units(address))
+
+    def get_nonce(self, address):
+        return self.nonces.get(address, 0)
+
+    def _count(self, address, delta):
+        nonce = self.nonces.get(address, 0) + delta
+        if nonce == 0:
+            self.nonces.pop(address, None)
+        else:
+            self.nonces[address] = nonce
+
+    def _credit(self, address, amount):
+        balance = self.balances.get(address, 0) + amount
+        if balance == 0:
+            self.balances.pop(address, None)
+        else:
+            self.balances[address] = balance
+
+    def apply_transaction(self, tx):
+        # Les frais sont débités ici et crédités au mineur par la récompense du bloc
+        amount = to_units(tx['amount'])
+        self._credit(tx['sender'], -amount - to_units(tx.get('fee', 0)))
+        self._credit(tx['recipient'], amount)
+        if tx['sender'] != NETWORK_SENDER:
+            self._count(tx['sender'], 1)
+
+    def _apply_transactions(self, block):
+        for tx in block.transactions:
+            self.apply_transaction(tx)
+
+    def _revert_transactions(self, block):
+        # Annule les transactions dans l'ordre inverse de leur application
+        for tx in reversed(block.transactions):
+            amount = to_units(tx['amount'])
+            self._credit(tx['recipient'], -amount)
+            self._credit(tx['sender'], amount + to_units(tx.get('fee', 0)))
+            if tx['sender'] != NETWORK_SENDER:
+                self._count(tx['sender'], -1)
+
+    def apply_block(self, block):
+        changes = self.overlay()
+        changes._apply_transactions(block)
+        self.commit(changes)
+        self.height = block.index
+
+    def revert_block(self, block):
+        changes = self.overlay()
+        changes._revert_transactions(block)
+        self.commit(changes)
+        self.height = block.index - 1
+
+    def commit(self, overlay):
+        """
+        Publie d'un coup les soldes modifiés dans une vue (overlay) : un
+        lecteur concurrent ne voit jamais un bloc à moitié appliqué.
+        """
+        self.balances.update(overlay.changes)
+        # Un solde nul vaut 0 qu'il soit présent ou non : le retrait peut suivre
+        for address in [a for a, balance in overlay.changes.items() if balance == 0]:
+            self.balances.pop(address, None)
+        self.nonces.update(overlay.nonce_changes)
+        for address in [a for a, nonce in overlay.nonce_changes.items() if nonce == 0]:
+            self.nonces.pop(address, None)
+        self.height = overlay.height
+
+    def snapshot(self):
+        """Copie de l'état : {'balances': adresse -> solde en unités, 'nonces': adresse -> nonce}."""
+        return {'balances': dict(self.balances), 'nonces': dict(self.nonces)}
+
+    def digest(self):
+        return state_digest(**self.snapshot())
+
+    def rebuild(self, chain):
+        self.balances = {}
+        self.nonces = {}
+        self.height = -1
+        for block in chain:
+            self.apply_block(block)
+
+    def overlay(self):
+        """Vue modifiable de l'état qui ne touche pas aux soldes d'origine."""
+        return StateOverlay(self)
+
+
+class StateOverlay(AccountState):
+    """
+    Soldes d'un AccountState plus des modifications locales : permet de
+    simuler des blocs (validation, réorganisation) sans copier tous les soldes.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.changes = {}
+        self.nonce_changes = {}
+        self.height = base.height
+
+    def get_units(self, address):
+        if address in self.changes:
+            return self.changes[address]
+        return self.base.get_units(address)
+
+    def get_nonce(self, address):
+        if address in self.nonce_changes:
+            return self.nonce_changes[address]
+        return self.base.get_nonce(address)
+
+    def _credit(self, address, amount):
+        self.changes[address] = self.get_units(address) + amount
+
+    def _count(self, address, delta):
+        self.nonce_changes[address] = self.get_nonce(address) + delta
+
+    def snapshot(self):
+        snapshot = self.base.snapshot()
+        snapshot['balances'].update(self.changes)
+        snapshot['nonces'].update(self.nonce_changes)
+        return {field: {address: value for address, value in values.items() if value != 0}
+                for field, values in snapshot.items()}
+
+    def apply_block(self, block):
+        self._apply_transactions(block)
+        self.height = block.index
+
+    def revert_block(self, block):
+        self._revert_transactions(block)
+        self.height = block.index - 1
@@ -0,0 +1,201 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+from node.block import Block
+from node.logger import get_logger
+from config import BLOCKSTORE_SEGMENT_SIZE, BLOCKSTORE_MMAP
+
+RECORD_MAGIC = b'UTBM'
+RECORD_HEADER = struct.Struct('!4sII')     # magic, taille du contenu, crc32
+INDEX_ENTRY = struct.Struct('!Q32sIQI')    # hauteur, hash, segment, offset, taille
+
+log = get_logger(__name__)
+
+
+class StoreCorruptedError(Exception):
+    pass
+
+
+class BlockStore:
+    """
+    Stockage append-only des blocs sur disque.
+    Les blocs sont écrits dans des fichiers segments (enregistrements avec
+    somme de contrôle crc32) et un index hauteur -> (segment, offset) permet
+    de les relire directement. Un instantané des soldes évite de rejouer
+    toute la chaîne au redémarrage.
+    """
+
+    def __init__(self, directory, segment_size=BLOCKSTORE_SEGMENT_SIZE, use_mmap=BLOCKSTORE_MMAP):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.use_mmap = use_mmap
+        os.makedirs(directory, exist_ok=True)
+
+        self.entries = []       # hauteur -> (hash, segment, offset, taille)
+        self.heights = {}       # hash -> hauteur
+        self._maps = {}         # segment -> (fichier, mmap) pour les lectures
+        self._load_index()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"blocks_{segment:05d}.dat")
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, "index.dat")
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.directory, "state.json")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            open(self.index_path, 'wb').close()
+            return
+
+        with open(self.index_path, 'rb') as f:
+            data = f.read()
+
+        valid = len(data) - len(data) % INDEX_ENTRY.size
+        for pos in range(0, valid, INDEX_ENTRY.size):
+            height, raw_hash, segment, offset, length = INDEX_ENTRY.unpack_from(data, pos)
+            if height != len(self.entries):
+                valid = pos
+                break
+            block_hash = raw_hash.hex()
+            self.entries.append((block_hash, segment, offset, length))
+            self.heights[block_hash] = height
+
+        # Une écriture interrompue laisse une entrée partielle : on la supprime
+        if valid != len(data):
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(valid)
+
+    def _close_maps(self, from_segment=0):
+        for segment in [s for s in self._maps if s >= from_segment]:
+            f, mapped = self._maps.pop(segment)
+            mapped.close()
+            f.close()
+
+    def append(self, block):
+        height = len(self.entries)
+        if block.index != height:
+            raise ValueError(f"Bloc {block.index} ajouté à la hauteur {height}")
+
+        payload = block.encode()
+        record = RECORD_HEADER.pack(RECORD_MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+        if self.entries:
+            _, segment, offset, length = self.entries[-1]
+            end = offset + RECORD_HEADER.size + length
+            if end + len(record) > self.segment_size:
+                segment, end = segment + 1, 0
+        else:
+            segment, end = 0, 0
+
+        with open(self._segment_path(segment), 'ab') as f:
+            f.truncate(end)
+            f.write(record)
+        # Le segment a grandi : un éventuel mmap existant est périmé
+        self._close_maps(segment)
+
+        with open(self.index_path, 'ab') as f:
+            f.write(INDEX_ENTRY.pack(height, bytes.fromhex(block.hash), segment, end, len(payload)))
+
+        self.entries.append((block.hash, segment, end, len(payload)))
+        self.heights[block.hash] = height
+
+    def truncate(self, height):
+        """Supprime les blocs à partir de la hauteur donnée (réorganisation)."""
+        if height >= len(self.entries):
+            return
+
+        _, segment, offset, _ = self.entries[height]
+        self._close_maps(segment)
+        with open(self._segment_path(segment), 'r+b') as f:
+            f.truncate(offset)
+        last_segment = self.entries[-1][1]
+        for s in range(segment + 1, last_segment + 1):
+            if os.path.exists(self._segment_path(s)):
+                os.remove(self._segment_path(s))
+
+        with open(self.index_path, 'r+b') as f:
+            f.truncate(height * INDEX_ENTRY.size)
+
+        for block_hash, *_ in self.entries[height:]:
+            self.heights.pop(block_hash, None)
+        del self.entries[height:]
+
+    def _read_record(self, segment, offset, length):
+        size = RECORD_HEADER.size + length
+        if self.use_mmap:
+            if segment not in self._maps:
+                f = open(self._segment_path(segment), 'rb')
+                self._maps[segment] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            raw = self._maps[segment][1][offset:offset + size]
+        else:
+            with open(self._segment_path(segment), 'rb') as f:
+                f.seek(offset)
+                raw = f.read(size)
+
+        if len(raw) != size:
+            raise StoreCorruptedError(f"Enregistrement tronqué (segment {segment}, offset {offset})")
+        magic, payload_len, checksum = RECORD_HEADER.unpack_from(raw)
+        payload = raw[RECORD_HEADER.size:]
+        if magic != RECORD_MAGIC or payload_len != length or zlib.crc32(payload) != checksum:
+            raise StoreCorruptedError(f"Somme de contrôle invalide (segment {segment}, offset {offset})")
+        return payload
+
+    def read_block(self, height):
+        block_hash, segment, offset, length = self.entries[height]
+        block = Block.decode(self._read_record(segment, offset, length))
+        if block.hash != block_hash:
+            raise StoreCorruptedError(f"Hash inattendu pour le bloc {height}")
+        return block
+
+    def get_height(self, block_hash):
+        return self.heights.get(block_hash)
+
+    def load_blocks(self, full_from=0):
+        """
+        Relit tous les blocs stockés. Ceux d'index inférieur à `full_from`
+        (hors genesis) sont réduits à leur en-tête dès leur lecture (mode
+        élagué). En cas d'enregistrement corrompu, le stockage est tronqué
+        au dernier bloc valide.
+        """
+        blocks = []
+        for height in range(len(self.entries)):
+            try:
+                block = self.read_block(height)
+                if 0 < height < full_from and not block.pruned:
+                    block.prune()
+                blocks.append(block)
+            except (StoreCorruptedError, ValueError, struct.error) as e:
+                log.error("Stockage corrompu à la hauteur %d (%s), troncature", height, e)
+                self.truncate(height)
+                break
+        return blocks
+
+    def save_snapshot(self, state, tip_hash):
+        """Écrit atomiquement l'instantané des soldes et nonces à la hauteur state.height."""
+        snapshot = dict(state.snapshot(), height=state.height, hash=tip_hash)
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def close(self):
+        self._close_maps()
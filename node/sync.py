@@ -0,0 +1,103 @@
+import time
+from node.block import Block
+from node.difficulty import WINDOW_SIZE
+from node.logger import get_logger
+from node import metrics
+from config import SYNC_BATCH_SIZE
+
+log = get_logger(__name__)
+
+SYNC_DURATION = metrics.histogram('node_sync_duration_seconds',
+                                  "Durée des synchronisations réussies (headers : incrémentale, ibd : initiale, "
+                                  "snapshot : depuis un instantané)",
+                                  ['mode'], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+SYNC_BLOCKS = metrics.counter('node_sync_blocks_total', "Blocs obtenus par synchronisation", ['mode'])
+
+
+class ChainSynchronizer:
+    """
+    Synchronisation incrémentale avec un peer :
+    1. GET_TIP : si le peer n'est pas plus haut que nous, rien n'est transféré ;
+    2. GET_HEADERS avec un locator : le peer indique le point de divergence ;
+    3. GET_BLOCKS par lots : seul le suffixe manquant est téléchargé et
+       validé au fil de l'eau, puis raccordé à la chaîne locale.
+    """
+
+    def __init__(self, blockchain, network, batch_size=SYNC_BATCH_SIZE):
+        self.blockchain = blockchain
+        self.network = network
+        self.batch_size = batch_size
+
+    def sync_with_peer(self, peer):
+        start_time = time.perf_counter()
+        tip = self.network.get_tip(peer)
+        if tip is None:
+            return False
+
+        local_tip = self.blockchain.last_block
+        if tip['height'] <= local_tip.index:
+            return False
+
+        headers = self.network.get_headers(peer, self.blockchain.block_locator(), limit=1)
+        if not headers:
+            log.error("Aucun point commun avec la chaîne du peer %s", peer)
+            return False
+        fork_height = headers[0]['index'] - 1
+        if headers[0]['previous_hash'] != self.blockchain.chain[fork_height].hash:
+            log.error("En-tête incohérent reçu du peer %s", peer)
+            return False
+
+        new_blocks = self.download_range(peer, fork_height, tip['height'])
+        if new_blocks is None:
+            return False
+
+        if self.blockchain.replace_suffix(fork_height, new_blocks):
+            SYNC_DURATION.observe(time.perf_counter() - start_time, mode='headers')
+            SYNC_BLOCKS.inc(len(new_blocks), mode='headers')
+            log.info("Chaîne synchronisée depuis le peer %s : %d bloc(s) à partir de l'index %d",
+                     peer, len(new_blocks), fork_height + 1)
+            return True
+        return False
+
+    def download_range(self, peer, fork_height, tip_height):
+        """
+        Télécharge les blocs fork_height+1 .. tip_height et valide chaque lot
+        dès sa réception. Retourne None au premier bloc invalide.
+        """
+        previous = self.blockchain.chain[fork_height]
+        state = self.blockchain.state_at(fork_height)
+        history = self.blockchain.window(fork_height)
+        blocks = []
+        start = fork_height + 1
+        while start <= tip_height:
+            end = min(start + self.batch_size - 1, tip_height)
+            batch = self.network.get_blocks(peer, start, end)
+            if not batch:
+                log.error("Blocs %d-%d indisponibles chez le peer %s", start, end, peer)
+                return None
+
+            try:
+                batch = [Block.from_dict(block_data) for block_data in batch]
+            except (KeyError, TypeError, ValueError):
+                log.error("Blocs mal formés reçus du peer %s", peer)
+                return None
+            # Validation du lot (cibles, preuves en parallèle, soldes sur l'état reporté)
+            if not self.blockchain.validator.validate_blocks(previous, batch, state, history):
+                log.error("Blocs %d-%d du peer %s invalides", start, end, peer)
+                return None
+            blocks.extend(batch)
+            history = (history + batch)[-WINDOW_SIZE:]
+            previous = batch[-1]
+            start = previous.index + 1
+        return blocks
+
+    def sync(self):
+        """Synchronise avec chacun des peers disposant d'une chaîne plus longue."""
+        synced = False
+        for peer in self.network.get_peers():
+            try:
+                if self.sync_with_peer(peer):
+                    synced = True
+            except Exception as e:
+                log.error("Erreur de synchronisation avec le peer %s: %s", peer, e)
+        return synced
@@ -0,0 +1,105 @@
+import heapq
+from collections import OrderedDict, deque
+from node.transaction import Transaction, to_units
+from config import MAX_BLOCK_TXS, MAX_BLOCK_SIZE
+
+
+class BlockTemplate:
+    """
+    Sélection des transactions du prochain bloc à miner :
+    - par taux de frais (frais / taille encodée) décroissant, via un tas ;
+    - dans l'ordre d'arrivée pour un même expéditeur (une transaction peut
+      dépendre du solde laissé par la précédente) ;
+    - dans la limite de MAX_BLOCK_TXS transactions et MAX_BLOCK_SIZE octets
+      (la récompense de minage n'est pas comptée).
+    Le modèle est complété au fil des transactions reçues ; il n'est
+    reconstruit que lorsque des transactions quittent le mempool ou qu'une
+    transaction plus rémunératrice arrive alors qu'il est plein.
+    """
+
+    def __init__(self, mempool, max_txs=MAX_BLOCK_TXS, max_size=MAX_BLOCK_SIZE):
+        self.mempool = mempool
+        self.max_txs = max_txs
+        self.max_size = max_size
+        self.selected = OrderedDict()  # hash -> transaction
+        self.size = 0
+        self.fees = 0           # Total des frais retenus, en unités de base
+        self.min_rate = None    # Plus petit taux de frais sélectionné
+        self.blocked = set()    # Expéditeurs dont une transaction n'a pas été retenue
+        self.sizes = {}         # hash -> taille encodée
+        self._removals = None   # mempool.removals lors de la dernière construction
+
+    def _size(self, tx_hash, transaction):
+        size = self.sizes.get(tx_hash)
+        if size is None:
+            size = len(Transaction.from_dict(transaction).encode())
+            self.sizes[tx_hash] = size
+        return size
+
+    def _rate(self, tx_hash, transaction):
+        return transaction.get('fee', 0) / self._size(tx_hash, transaction)
+
+    def _is_stale(self):
+        return self._removals != self.mempool.removals
+
+    def _fits(self, size):
+        return len(self.selected) < self.max_txs and self.size + size <= self.max_size
+
+    def _select(self, tx_hash, transaction, rate):
+        self.selected[tx_hash] = transaction
+        self.size += self._size(tx_hash, transaction)
+        self.fees += to_units(transaction.get('fee', 0))
+        self.min_rate = rate if self.min_rate is None else min(self.min_rate, rate)
+
+    def rebuild(self):
+        self.selected = OrderedDict()
+        self.size, self.fees, self.min_rate = 0, 0, None
+        self.blocked = set()
+        with self.mempool.lock:
+            self._removals = self.mempool.removals
+            pending = list(self.mempool.transactions.items())
+        self.sizes = {h: s for h, s in self.sizes.items() if h in self.mempool}
+
+        queues = {}  # expéditeur -> transactions en attente, dans l'ordre d'arrivée
+        for tx_hash, transaction in pending:
+            queues.setdefault(transaction['sender'], deque()).append((tx_hash, transaction))
+
+        # Seule la première transaction en attente de chaque expéditeur est dans le tas
+        heap = []
+        for seq, (sender, queue) in enumerate(queues.items()):
+            tx_hash, transaction = queue[0]
+            heapq.heappush(heap, (-self._rate(tx_hash, transaction), seq, sender))
+
+        while heap and len(self.selected) < self.max_txs:
+            neg_rate, seq, sender = heapq.heappop(heap)
+            queue = queues[sender]
+            tx_hash, transaction = queue.popleft()
+            if not self._fits(self._size(tx_hash, transaction)):
+                # Les suivantes du même expéditeur ne peuvent pas passer devant
+                self.blocked.add(sender)
+                continue
+            self._select(tx_hash, transaction, -neg_rate)
+            if queue:
+                next_hash, next_tx = queue[0]
+                heapq.heappush(heap, (-self._rate(next_hash, next_tx), seq, sender))
+
+    def add(self, transaction, tx_hash):
+        """Prend en compte une transaction qui vient d'entrer dans le mempool."""
+        if self._is_stale():
+            return  # Reconstruit à la prochaine utilisation
+        sender = transaction['sender']
+        size = self._size(tx_hash, transaction)
+        rate = self._rate(tx_hash, transaction)
+        if sender not in self.blocked and self._fits(size):
+            self._select(tx_hash, transaction, rate)
+            return
+        self.blocked.add(sender)
+        if self.min_rate is not None and rate > self.min_rate:
+            # Plus rémunératrice qu'une transaction retenue : nouvelle sélection
+            self._removals = None
+
+    def transactions(self):
+        """Transactions retenues, leurs hashes et le total de leurs frais (en unités de base)."""
+        if self._is_stale():
+            self.rebuild()
+        return list(self.selected.values()), list(self.selected), self.fees
@@ -1,15 +1,134 @@
-import json
+import math
+import struct
 import hashlib
 
+# Encodage binaire canonique : chaînes préfixées par leur taille, montant en double
+STR_LEN = struct.Struct('!H')
+AMOUNT = struct.Struct('!d')
+NONCE = struct.Struct('!Q')
+
+NETWORK_SENDER = "Network"  # Expéditeur des récompenses de minage (transactions non signées)
+
+# Soldes tenus en unités de base entières (1e-8 UTBM) : appliquer puis annuler
+# un bloc restitue exactement les mêmes soldes sur tous les nœuds
+UNITS = 10 ** 8
+MAX_AMOUNT = 2 ** 53 // UNITS  # Au-delà, un double ne représente plus toutes les unités
+
+
+def to_units(amount):
+    """Montant (validé par valid_amount) en unités de base entières."""
+    return round(amount * UNITS)
+
+
+def from_units(units):
+    return units / UNITS
+
+
+def valid_amount(value):
+    """
+    Montant ou frais acceptable : nombre fini, positif ou nul, au plus
+    MAX_AMOUNT et sans plus de 8 décimales (NaN et infinis refusés).
+    """
+    return (not isinstance(value, bool) and isinstance(value, (int, float)) and
+            math.isfinite(value) and 0 <= value <= MAX_AMOUNT and from_units(to_units(value)) == value)
+
+
+def valid_nonce(value):
+    """Nonce acceptable : entier encodable sur 8 octets."""
+    return not isinstance(value, bool) and isinstance(value, int) and 0 <= value < 2 ** 64
+
+
+def _pack_str(value):
+    data = value.encode()
+    return STR_LEN.pack(len(data)) + data
+
+
+def _unpack_str(data, offset):
+    (length,) = STR_LEN.unpack_from(data, offset)
+    offset += STR_LEN.size
+    return data[offset:offset + length].decode(), offset + length
+
+
 class Transaction:
-    def __init__(self, sender, recipient, amount):
+    """
+    Transfert signé : `sender` est l'adresse (sha256 de la clé publique PEM)
+    et `signature` (hex) couvre tous les champs sauf elle-même. Le hash de
+    la transaction inclut la signature. Les frais (`fee`) sont débités de
+    l'expéditeur en plus du montant et reviennent au mineur du bloc.
+    Le `nonce` est le numéro de la transaction parmi celles de l'expéditeur
+    (0, 1, 2...) : une transaction confirmée ne peut pas être rejouée.
+    """
+    __slots__ = ('sender', 'recipient', 'amount', 'fee', 'nonce', 'public_key', 'signature', '_hash')
+
+    def __init__(self, sender, recipient, amount, fee=0, public_key=None, signature=None, nonce=0):
         self.sender = sender
         self.recipient = recipient
         self.amount = amount
+        self.fee = fee
+        self.nonce = nonce
+        self.public_key = public_key  # Clé publique PEM de l'expéditeur
+        self.signature = signature
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name != '_hash':
+            object.__setattr__(self, '_hash', None)
 
     def to_dict(self):
-        return self.__dict__
+        return {
+            'sender': self.sender,
+            'recipient': self.recipient,
+            'amount': self.amount,
+            'fee': self.fee,
+            'nonce': self.nonce,
+            'public_key': self.public_key,
+            'signature': self.signature
+        }
+
+    def signing_bytes(self):
+        """Message signé par l'expéditeur : l'encodage sans la signature."""
+        return (_pack_str(self.sender) + _pack_str(self.recipient) +
+                AMOUNT.pack(self.amount) + AMOUNT.pack(self.fee) + NONCE.pack(self.nonce) +
+                _pack_str(self.public_key or ''))
+
+    def encode(self):
+        return self.signing_bytes() + _pack_str(self.signature or '')
 
     def compute_hash(self):
-        tx_str = json.dumps(self.to_dict(), sort_keys=True)
-        return hashlib.sha256(tx_str.encode()).hexdigest()
+        # Calculé une seule fois, tant que la transaction n'est pas modifiée
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hashlib.sha256(self.encode()).hexdigest())
+        return self._hash
+
+    @classmethod
+    def from_dict(cls, tx_data):
+        return cls(tx_data['sender'], tx_data['recipient'], tx_data['amount'], tx_data.get('fee', 0),
+                   tx_data.get('public_key'), tx_data.get('signature'), tx_data.get('nonce', 0))
+
+    @classmethod
+    def decode(cls, data, offset=0):
+        """Décode une transaction à partir de offset. Retourne (transaction, offset suivant)."""
+        sender, offset = _unpack_str(data, offset)
+        recipient, offset = _unpack_str(data, offset)
+        (amount,) = AMOUNT.unpack_from(data, offset)
+        (fee,) = AMOUNT.unpack_from(data, offset + AMOUNT.size)
+        (nonce,) = NONCE.unpack_from(data, offset + 2 * AMOUNT.size)
+        public_key, offset = _unpack_str(data, offset + 2 * AMOUNT.size + NONCE.size)
+        signature, offset = _unpack_str(data, offset)
+        return cls(sender, recipient, amount, fee, public_key or None, signature or None, nonce), offset
+
+
+def encode_transaction(tx):
+    """Encodage binaire canonique d'une transaction sous forme de dict."""
+    return Transaction.from_dict(tx).encode()
+
+
+def encoded_size(tx):
+    """Taille de encode_transaction(tx), calculée sans construire l'encodage."""
+    return (4 * STR_LEN.size + 2 * AMOUNT.size + NONCE.size +
+            sum(len((tx.get(field) or '').encode()) for field in ('sender', 'recipient', 'public_key', 'signature')))
+
+
+def compute_tx_hash(tx):
+    """Hash d'une transaction sous forme de dict (identique à Transaction.compute_hash)."""
+    return hashlib.sha256(encode_transaction(tx)).hexdigest()
@@ -0,0 +1,255 @@
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from node.block import Block
+from node.state import AccountState, commits_state
+from node.transaction import Transaction, NETWORK_SENDER, valid_amount, valid_nonce, to_units, encoded_size
+from node.signatures import SignatureVerifier, verify_signature
+from node.difficulty import MAX_TARGET, WINDOW_SIZE, meets_target, next_target, valid_timestamp, follows_median
+from config import (MINING_REWARD, MAX_BLOCK_TXS, MAX_BLOCK_SIZE, VALIDATION_WORKERS,
+                    VALIDATION_PARALLEL_THRESHOLD, VALIDATION_CACHE_SIZE)
+from node.logger import get_logger
+from node import metrics
+
+log = get_logger(__name__)
+
+BLOCK_VALIDATION = metrics.histogram('node_block_validation_seconds',
+                                     "Durée de validation d'un bloc, par étape (stateless ou balances)",
+                                     ['stage'])
+CHAIN_VALIDATION = metrics.histogram('node_chain_validation_seconds',
+                                     "Durée de validation d'une suite de blocs (synchronisation, réorganisation)")
+VALIDATION_CACHE_HITS = metrics.counter('node_validation_cache_hits_total',
+                                        "Blocs dont la validation a été évitée grâce au cache")
+
+
+def check_block(block, check_signatures=True):
+    """
+    Règles d'un bloc indépendantes de l'état : hash recalculé (racine de
+    Merkle comprise), preuve de travail (hash au plus égal à la cible du
+    bloc, elle-même au plus MAX_TARGET), timestamp fini et pas trop en
+    avance sur l'horloge locale, nombre de transactions et leur taille
+    encodée (MAX_BLOCK_SIZE), montants, frais et nonces, récompense de minage
+    (plafonnée à MINING_REWARD + frais) et, sauf si l'appelant s'en charge,
+    signatures des transactions.
+    """
+    try:
+        block_hash = block.compute_hash()
+    except (ValueError, TypeError, AttributeError, struct.error):
+        # Champs mal formés (hash précédent non hexadécimal, etc.)
+        return False
+    if block_hash != block.hash or block.target > MAX_TARGET or not meets_target(block_hash, block.target):
+        return False
+    if not valid_timestamp(block.timestamp):
+        return False
+
+    if len(block.transactions) > MAX_BLOCK_TXS + 1:  # + la récompense
+        return False
+
+    rewards, reward_count, fees, size = 0, 0, 0, 0
+    for tx in block.transactions:
+        if not (valid_amount(tx.get('amount')) and valid_amount(tx.get('fee', 0)) and
+                valid_nonce(tx.get('nonce', 0))):
+            return False
+        if tx.get('sender') == NETWORK_SENDER:
+            rewards += to_units(tx['amount'])
+            reward_count += 1
+        else:
+            fees += to_units(tx.get('fee', 0))
+            # Même mesure que le modèle de bloc du mineur : récompense non comptée
+            size += encoded_size(tx)
+            if size > MAX_BLOCK_SIZE:
+                return False
+    # Une seule récompense par bloc, plafonnée (le genesis n'en a pas)
+    if block.index != 0 and (reward_count > 1 or rewards > to_units(MINING_REWARD) + fees):
+        return False
+    if check_signatures:
+        return all(verify_signature(Transaction.from_dict(tx))
+                   for tx in block.transactions if tx.get('sender') != NETWORK_SENDER)
+    return True
+
+
+def check_block_dicts(block_dicts):
+    """
+    Exécutée dans un processus de validation. Retourne pour chaque bloc
+    (valide, hashes des transactions) : les hashes calculés ici sont repris
+    par le processus principal pour ne pas les recalculer.
+    """
+    results = []
+    for block_data in block_dicts:
+        try:
+            block = Block.from_dict(block_data)
+            valid = check_block(block)
+            results.append((valid, block.tx_hashes() if valid else None))
+        except (KeyError, ValueError, TypeError, AttributeError, struct.error):
+            results.append((False, None))
+    return results
+
+
+class ChainValidator:
+    """
+    Moteur unique de validation des blocs et des chaînes :
+    - chaînage (index, previous_hash), timestamp postérieur à la médiane
+      des blocs précédents et cible de difficulté attendue d'après ces
+      blocs (voir node/difficulty.py) ;
+    - règles indépendantes de l'état (hash, preuve de travail, montants,
+      signatures), vérifiées par un pool de processus pour les grands lots
+      et mises en cache par hash de bloc (et par hash de transaction pour
+      les signatures, voir SignatureVerifier) ;
+    - soldes, rejoués sur une vue de l'état au point de départ, et racine
+      d'état des blocs qui suivent un point de contrôle.
+    """
+
+    def __init__(self, workers=VALIDATION_WORKERS, parallel_threshold=VALIDATION_PARALLEL_THRESHOLD,
+                 cache_size=VALIDATION_CACHE_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.parallel_threshold = parallel_threshold
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # hash de bloc -> règles indépendantes de l'état respectées
+        self.lock = threading.Lock()
+        self.signatures = SignatureVerifier()
+        self._executor = None
+
+    def _remember(self, block_hash, valid):
+        with self.lock:
+            self.cache[block_hash] = valid
+            self.cache.move_to_end(block_hash)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _is_cached_valid(self, block):
+        # Le hash recalculé engage tout le contenu du bloc : un bloc qui
+        # prétend seulement avoir un hash connu ne profite pas du cache
+        if block.hash is None or not block.has_cached_hash():
+            return False
+        with self.lock:
+            return self.cache.get(block.hash) is True and block.compute_hash() == block.hash
+
+    def check_block(self, block):
+        if self._is_cached_valid(block):
+            VALIDATION_CACHE_HITS.inc()
+            return True
+        with BLOCK_VALIDATION.time(stage='stateless'):
+            valid = (check_block(block, check_signatures=False) and
+                     self.signatures.verify_many(block.transactions, block.tx_hashes()))
+        if valid:
+            self._remember(block.hash, True)
+        return valid
+
+    def check_blocks(self, blocks):
+        """Règles indépendantes de l'état pour un lot, en parallèle s'il est assez grand."""
+        unchecked = [block for block in blocks if not self._is_cached_valid(block)]
+        # Les blocs dont les hashes de transactions sont déjà connus se
+        # vérifient rapidement sur place : seuls les autres vont au pool
+        fresh = [block for block in unchecked if not block.has_cached_hash()]
+        if len(fresh) < self.parallel_threshold or self.workers == 1:
+            return all(self.check_block(block) for block in unchecked)
+        if not all(self.check_block(block) for block in unchecked if block.has_cached_hash()):
+            return False
+        unchecked = fresh
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        chunk = -(-len(unchecked) // self.workers)
+        batches = [unchecked[i:i + chunk] for i in range(0, len(unchecked), chunk)]
+        futures = [
+            self._executor.submit(check_block_dicts, [block.to_dict() for block in batch])
+            for batch in batches
+        ]
+        all_valid = True
+        for batch, future in zip(batches, futures):
+            for block, (valid, tx_hashes) in zip(batch, future.result()):
+                if not valid:
+                    all_valid = False
+                    continue
+                block.set_tx_hashes(tx_hashes)
+                self.signatures.mark_verified(tx_hashes)
+                self._remember(block.hash, True)
+        return all_valid
+
+    @staticmethod
+    def expected_state_root(block, state):
+        """Racine d'état attendue pour `block`, `state` étant l'état de son parent."""
+        return state.digest() if commits_state(block.index) else None
+
+    @staticmethod
+    def check_transaction(tx, state):
+        """
+        Solde et nonce d'une transaction sur `state`, sans l'appliquer. Une
+        transaction déjà confirmée a un nonce périmé.
+        """
+        if not (valid_amount(tx['amount']) and valid_amount(tx.get('fee', 0))):
+            return False
+        if tx['sender'] == NETWORK_SENDER:
+            return True
+        spent = to_units(tx['amount']) + to_units(tx.get('fee', 0))
+        return state.get_units(tx['sender']) >= spent and tx.get('nonce', 0) == state.get_nonce(tx['sender'])
+
+    def validate_transactions(self, block, state):
+        """
+        Vérifie les soldes et les nonces des transactions d'un bloc dans
+        l'ordre, en les appliquant à `state` (une vue jetable, typiquement un
+        StateOverlay).
+        """
+        with BLOCK_VALIDATION.time(stage='balances'):
+            for tx in block.transactions:
+                if not self.check_transaction(tx, state):
+                    return False
+                state.apply_transaction(tx)
+            state.height = block.index
+            return True
+
+    def validate_blocks(self, previous, blocks, state, history=None):
+        """
+        Valide des blocs qui prolongent `previous`. `state` représente les
+        soldes au bloc `previous` et reçoit les blocs validés. `history`
+        contient les derniers blocs jusqu'à `previous` inclus (au moins
+        WINDOW_SIZE, ou depuis le genesis) pour recalculer les cibles.
+        """
+        with CHAIN_VALIDATION.time():
+            return self._validate_blocks(previous, blocks, state, history or [previous])
+
+    def _validate_blocks(self, previous, blocks, state, history):
+        window = list(history[-WINDOW_SIZE:])
+        for block in blocks:
+            if block.index != previous.index + 1 or block.previous_hash != previous.hash:
+                log.error("Chaîne invalide à l'index %d : mauvais previous_hash", block.index)
+                return False
+            if not follows_median(block, window):
+                log.error("Chaîne invalide à l'index %d : timestamp antérieur à la médiane des blocs précédents",
+                          block.index)
+                return False
+            if block.target != next_target(window):
+                log.error("Chaîne invalide à l'index %d : cible de difficulté incorrecte", block.index)
+                return False
+            window = window[1 - WINDOW_SIZE:] + [block]
+            previous = block
+
+        if not self.check_blocks(blocks):
+            log.error("Chaîne invalide : bloc ou preuve de travail invalide")
+            return False
+
+        for block in blocks:
+            if block.state_root != self.expected_state_root(block, state):
+                log.error("Chaîne invalide à l'index %d : racine d'état incorrecte", block.index)
+                return False
+            if not self.validate_transactions(block, state):
+                log.error("Chaîne invalide à l'index %d : solde insuffisant ou nonce incorrect", block.index)
+                return False
+        return True
+
+    def validate_chain(self, chain):
+        """Validation complète d'une chaîne depuis son bloc genesis."""
+        if not chain:
+            return False
+        genesis = chain[0]
+        if (genesis.index != 0 or genesis.transactions or genesis.target != MAX_TARGET or
+                genesis.hash != genesis.compute_hash()):
+            return False
+        return self.validate_blocks(genesis, chain[1:], AccountState())
+
+    def shutdown(self):
+        self.signatures.shutdown()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -1,10 +1,39 @@
+import os
 import rsa
 import hashlib
+from node.transaction import Transaction
 
 class Wallet:
-    def __init__(self):
-
-        self.public_key, self.private_key = rsa.newkeys(512)
+    def __init__(self, private_key=None):
+
+        if private_key is None:
+            self.public_key, self.private_key = rsa.newkeys(512)
+        else:
+            self.private_key = private_key
+            self.public_key = rsa.PublicKey(private_key.n, private_key.e)
+
+    @classmethod
+    def load_or_create(cls, path):
+        """
+        Portefeuille dont la clé privée est conservée dans `path` (PEM) :
+        l'adresse, et donc les récompenses déjà minées, survivent au
+        redémarrage du nœud. La clé est créée au premier lancement.
+        """
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return cls(rsa.PrivateKey.load_pkcs1(f.read()))
+
+        wallet = cls()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        # Lisible par le seul propriétaire, écrite atomiquement
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(wallet.private_key.save_pkcs1())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return wallet
 
     def sign(self, message: bytes) -> bytes:
 
@@ -31,18 +60,16 @@ class Wallet:
         pubkey_pem = self.get_public_key_pem().encode()
         return hashlib.sha256(pubkey_pem).hexdigest()
 
-    def get_balance(self, blockchain, address: str) -> float:
+    def sign_transaction(self, transaction: Transaction) -> Transaction:
+
+        transaction.public_key = self.get_public_key_pem()
+        transaction.signature = self.sign(transaction.signing_bytes()).hex()
+        return transaction
 
-        balance = 0.0
-        for block in blockchain.chain:
-            for tx in block.transactions:
+    def create_transaction(self, recipient: str, amount: float, fee: float = 0, nonce: int = 0) -> Transaction:
 
-                sender = tx.get('sender')
-                recipient = tx.get('recipient')
-                amount = tx.get('amount', 0)
+        return self.sign_transaction(Transaction(self.get_address(), recipient, amount, fee, nonce=nonce))
+
+    def get_balance(self, blockchain, address: str) -> float:
 
-                if recipient == address:
-                    balance += amount
-                if sender == address:
-                    balance -= amount
-        return balance
+        return float(blockchain.get_balance(address))
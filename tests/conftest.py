@@ -0,0 +1,25 @@
+import logging
+import pytest
+from node.blockchain import Blockchain
+from node.miner import Miner
+from node.wallet import Wallet
+
+
+@pytest.fixture(autouse=True)
+def quiet_logs():
+    logging.getLogger('node').setLevel(logging.ERROR)
+
+
+@pytest.fixture
+def new_chain():
+    """Chaînes en mémoire minées par un seul processus (pas de pool de minage)."""
+    def make():
+        chain = Blockchain()
+        chain.miner = Miner(1)
+        return chain
+    return make
+
+
+@pytest.fixture(scope='session')
+def wallet():
+    return Wallet()
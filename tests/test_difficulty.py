@@ -0,0 +1,67 @@
+import math
+import time
+from types import SimpleNamespace
+from node.difficulty import (MAX_TARGET, WINDOW_SIZE, next_target, valid_timestamp, median_time_past,
+                             follows_median)
+from config import TARGET_BLOCK_TIME, RETARGET_MAX_ADJUST, MAX_FUTURE_BLOCK_TIME
+
+TARGET = MAX_TARGET // 1024
+
+
+def window(intervals, target=TARGET, start=1000.0):
+    """Genesis (timestamp 0) puis des blocs séparés par `intervals` secondes."""
+    blocks = [SimpleNamespace(index=0, timestamp=0, target=MAX_TARGET)]
+    timestamp = start
+    blocks.append(SimpleNamespace(index=1, timestamp=timestamp, target=target))
+    for i, interval in enumerate(intervals, start=2):
+        timestamp += interval
+        blocks.append(SimpleNamespace(index=i, timestamp=timestamp, target=target))
+    return blocks
+
+
+def test_too_few_blocks_keeps_parent_target():
+    assert next_target(window([])) == TARGET
+
+
+def test_on_schedule_keeps_target():
+    assert next_target(window([TARGET_BLOCK_TIME] * 10)) == TARGET
+
+
+def test_fast_blocks_lower_target():
+    assert next_target(window([TARGET_BLOCK_TIME / 2] * 10)) == TARGET // 2
+
+
+def test_adjustment_is_clamped():
+    assert next_target(window([TARGET_BLOCK_TIME * 100] * 10)) == TARGET * RETARGET_MAX_ADJUST
+    assert next_target(window([0.001] * 10)) == TARGET // RETARGET_MAX_ADJUST
+    # Jamais plus facile que la cible du genesis
+    assert next_target(window([TARGET_BLOCK_TIME * 100] * 10, target=MAX_TARGET)) == MAX_TARGET
+
+
+def test_only_last_window_counts():
+    blocks = window([TARGET_BLOCK_TIME * 100] * 5 + [TARGET_BLOCK_TIME] * WINDOW_SIZE)
+    assert next_target(blocks) == TARGET
+
+
+def test_sub_millisecond_timestamps_are_deterministic():
+    # Même temps écoulé en millisecondes entières : même cible
+    a = window([TARGET_BLOCK_TIME] * 9 + [TARGET_BLOCK_TIME + 0.0001])
+    b = window([TARGET_BLOCK_TIME] * 10)
+    assert next_target(a) == next_target(b)
+
+
+def test_valid_timestamp():
+    now = time.time()
+    assert valid_timestamp(now)
+    assert valid_timestamp(now + MAX_FUTURE_BLOCK_TIME - 1, now)
+    assert not valid_timestamp(now + MAX_FUTURE_BLOCK_TIME + 1, now)
+    for value in (math.nan, math.inf, -math.inf, True, '1', None):
+        assert not valid_timestamp(value)
+
+
+def test_median_time_past():
+    blocks = window([TARGET_BLOCK_TIME] * 20)
+    median = median_time_past(blocks)
+    assert median == blocks[-6].timestamp
+    assert follows_median(SimpleNamespace(timestamp=median + 0.001), blocks)
+    assert not follows_median(SimpleNamespace(timestamp=median), blocks)
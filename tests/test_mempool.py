@@ -0,0 +1,63 @@
+from node.mempool import Mempool, fee_rate
+from node.transaction import to_units
+
+
+def tx(sender, nonce, fee, amount=1.0):
+    return {'sender': sender, 'recipient': 'r', 'amount': amount, 'fee': fee, 'nonce': nonce,
+            'public_key': 'k', 'signature': 's'}
+
+
+def senders(mempool):
+    return sorted((t['sender'], t['nonce']) for t in mempool.to_list())
+
+
+def test_pending_totals():
+    mempool = Mempool()
+    assert mempool.add(tx('a', 0, 0.1)) and mempool.add(tx('a', 1, 0.2, amount=2))
+    assert not mempool.add(tx('a', 0, 0.1))  # Doublon
+    assert mempool.pending_count('a') == 2
+    assert mempool.pending_amount('a') == to_units(3.3)
+
+
+def test_full_pool_evicts_lowest_fee_rate_with_dependents():
+    mempool = Mempool(max_size=4)
+    for transaction in (tx('a', 0, 0.01), tx('a', 1, 0.5), tx('b', 0, 0.02), tx('c', 0, 0.03)):
+        assert mempool.add(transaction)
+    assert mempool.add(tx('d', 0, 0.1))
+    # a/1 dépendait de a/0 : évincée avec elle malgré ses frais élevés
+    assert senders(mempool) == [('b', 0), ('c', 0), ('d', 0)]
+    assert mempool.pending_count('a') == 0 and mempool.pending_amount('a') == 0
+
+
+def test_full_pool_refuses_low_fee_rate():
+    mempool = Mempool(max_size=2)
+    assert mempool.add(tx('a', 0, 0.01)) and mempool.add(tx('b', 0, 0.02))
+    assert not mempool.add(tx('z', 0, 0))
+    assert not mempool.add(tx('z', 0, 0.01))  # Pas mieux que la moins rémunératrice
+    assert senders(mempool) == [('a', 0), ('b', 0)]
+
+
+def test_full_pool_refuses_transaction_depending_on_the_evicted_one():
+    mempool = Mempool(max_size=2)
+    assert mempool.add(tx('a', 0, 0.01)) and mempool.add(tx('b', 0, 0.02))
+    assert not mempool.add(tx('a', 1, 1.0))
+    assert senders(mempool) == [('a', 0), ('b', 0)]
+
+
+def test_eviction_order_survives_removals():
+    mempool = Mempool(max_size=50)
+    transactions = [tx(f's{i}', 0, i / 1000) for i in range(200)]
+    for transaction in transactions:
+        mempool.add(transaction)
+    assert len(mempool) == 50
+    # Les 50 plus rémunératrices restent
+    assert min(fee_rate(t) for t in mempool.to_list()) == fee_rate(transactions[150])
+    mempool.clear()
+    assert len(mempool) == 0 and mempool.add(transactions[0])
+
+
+def test_blockchain_rejects_free_transaction(new_chain, wallet):
+    chain = new_chain()
+    transaction = wallet.create_transaction('bob', 0, 0).to_dict()
+    (_, error), = chain.add_transactions([transaction])
+    assert error is not None and len(chain.mempool) == 0
@@ -0,0 +1,57 @@
+import zlib
+import pytest
+from node import protocol
+from node.protocol import (FRAME_HEADER, FLAG_COMPRESSED, MESSAGE_CODES, ProtocolError, encode_frame,
+                           decode_frame)
+
+
+def split(frame):
+    length, code, flags = FRAME_HEADER.unpack(frame[:FRAME_HEADER.size])
+    payload = frame[FRAME_HEADER.size:]
+    assert len(payload) == length
+    return code, flags, payload
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_round_trip(compress):
+    message = {'type': 'PEERS', 'peers': list(range(5000))}
+    code, flags, payload = split(encode_frame(message, compress))
+    assert bool(flags & FLAG_COMPRESSED) is compress
+    assert decode_frame(code, flags, payload) == message
+
+
+def test_unknown_type_stays_in_payload():
+    message = {'type': 'CUSTOM', 'value': 1}
+    assert decode_frame(*split(encode_frame(message))) == message
+
+
+def test_unknown_code_is_rejected():
+    with pytest.raises(ProtocolError):
+        decode_frame(250, 0, b'{}')
+
+
+def test_decompression_is_bounded(monkeypatch):
+    monkeypatch.setattr(protocol, 'MAX_FRAME_SIZE', 1024)
+    bomb = zlib.compress(b' ' * 1025)
+    with pytest.raises(ProtocolError):
+        decode_frame(MESSAGE_CODES['PEERS'], FLAG_COMPRESSED, bomb)
+    # Exactement à la limite : accepté
+    payload = zlib.compress(b'{"peers":[]' + b' ' * (1024 - 12) + b'}')
+    assert decode_frame(MESSAGE_CODES['PEERS'], FLAG_COMPRESSED, payload) == {'type': 'PEERS', 'peers': []}
+
+
+@pytest.mark.parametrize('payload', [
+    b'not zlib',
+    zlib.compress(b'{}')[:-3],      # Flux tronqué
+    zlib.compress(b'{}') + b'junk',  # Données après la fin du flux
+])
+def test_malformed_compressed_payload(payload):
+    with pytest.raises(ProtocolError):
+        decode_frame(MESSAGE_CODES['PEERS'], FLAG_COMPRESSED, payload)
+
+
+def test_oversized_message_is_not_encoded(monkeypatch):
+    monkeypatch.setattr(protocol, 'MAX_FRAME_SIZE', 1024)
+    # Se compresse très bien, mais le destinataire le refuserait une fois décompressé
+    with pytest.raises(ProtocolError):
+        encode_frame({'type': 'PEERS', 'peers': [0] * 2000})
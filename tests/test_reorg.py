@@ -0,0 +1,81 @@
+import time
+from node.block import Block
+from node.transaction import Transaction, NETWORK_SENDER
+from node.wallet import Wallet
+
+
+def fork(new_chain, wallet):
+    """A et B partagent le bloc 1 (récompense pour `wallet`), puis divergent."""
+    a, b = new_chain(), new_chain()
+    assert a.mine(wallet.get_address(), allow_empty=True)
+    assert b.add_block_from_network(a.last_block.to_dict())
+    return a, b
+
+
+def test_longer_branch_reorganizes_and_returns_transactions(new_chain, wallet):
+    a, b = fork(new_chain, wallet)
+    transaction = wallet.create_transaction('bob', 1, 0.01, nonce=0).to_dict()
+    assert a.add_new_transaction(transaction)
+    tx_hash = Transaction.from_dict(transaction).compute_hash()
+    assert a.mine(wallet.get_address())
+    other = Wallet().get_address()
+    for _ in range(2):
+        assert b.mine(other, allow_empty=True)
+
+    for block in b.chain[2:]:
+        a.add_block_from_network(block.to_dict())
+
+    assert a.last_block.hash == b.last_block.hash
+    assert a.state.digest() == b.state.digest()
+    assert a.get_balance('bob') == 0
+    # La transaction du bloc abandonné revient en attente
+    assert tx_hash in a.mempool
+    assert a.is_valid_chain(a.chain)
+
+
+def test_reorg_back_to_original_branch(new_chain, wallet):
+    a, b = fork(new_chain, wallet)
+    transaction = wallet.create_transaction('bob', 1.5, 0.25, nonce=0).to_dict()
+    assert a.add_new_transaction(transaction)
+    assert a.mine(wallet.get_address())
+    original = list(a.chain)
+    for _ in range(2):
+        assert b.mine(Wallet().get_address(), allow_empty=True)
+    for block in b.chain[2:]:
+        a.add_block_from_network(block.to_dict())
+    assert a.last_block.hash == b.last_block.hash
+
+    # La branche d'origine, prolongée ailleurs, reprend l'avantage
+    c = new_chain()
+    assert c.replace_chain(original)
+    for _ in range(2):
+        assert c.mine(wallet.get_address(), allow_empty=True)
+    for block in c.chain[2:]:
+        a.add_block_from_network(block.to_dict())
+
+    assert a.last_block.hash == c.last_block.hash
+    assert a.state.digest() == c.state.digest()
+    assert a.get_balance('bob') == 1.5
+
+
+def test_side_block_with_wrong_target_is_not_stored(new_chain, wallet):
+    a, _ = fork(new_chain, wallet)
+    assert a.mine(wallet.get_address(), allow_empty=True)
+    parent = a.chain[1]
+    block = Block(2, parent.hash, parent.timestamp + 1,
+                  [Transaction(NETWORK_SENDER, wallet.get_address(), 50).to_dict()],
+                  target=parent.target - 1, state_root=None)
+    block.hash = a.proof_of_work(block)
+    assert not a.add_block_from_network(block.to_dict())
+    assert block.hash not in a.tree.side
+
+
+def test_nan_timestamp_block_is_rejected(new_chain, wallet):
+    chain = new_chain()
+    last = chain.last_block
+    block = Block(1, last.hash, float('nan'), [Transaction(NETWORK_SENDER, wallet.get_address(), 50).to_dict()],
+                  target=chain.next_target(), state_root=chain.next_state_root())
+    assert not chain.add_block(block, chain.proof_of_work(block))
+    # La chaîne continue d'avancer
+    assert chain.mine(wallet.get_address(), allow_empty=True)
+    assert chain.last_block.index == 1 and chain.last_block.timestamp <= time.time()
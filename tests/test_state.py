@@ -0,0 +1,74 @@
+import pytest
+from types import SimpleNamespace
+from node.state import AccountState, state_digest
+from node.transaction import NETWORK_SENDER, valid_amount, to_units
+
+
+def block(index, transactions):
+    return SimpleNamespace(index=index, transactions=transactions)
+
+
+def transfer(sender, recipient, amount, fee, nonce):
+    return {'sender': sender, 'recipient': recipient, 'amount': amount, 'fee': fee, 'nonce': nonce}
+
+
+@pytest.fixture
+def funded():
+    state = AccountState()
+    state.apply_block(block(0, [{'sender': NETWORK_SENDER, 'recipient': 'alice', 'amount': 50, 'fee': 0}]))
+    return state
+
+
+def blocks():
+    # Montants dont la somme en flottants ne retombe pas juste (0.1 + 0.2 != 0.3)
+    return [block(i, [transfer('alice', 'bob', 0.1, 0.2, 2 * i - 2),
+                      transfer('alice', 'carol', 0.3, 0.00000001, 2 * i - 1),
+                      {'sender': NETWORK_SENDER, 'recipient': 'miner', 'amount': 50.20000001, 'fee': 0}])
+            for i in range(1, 40)]
+
+
+def test_apply_then_revert_restores_digest(funded):
+    digest = funded.digest()
+    chain = blocks()
+    for b in chain:
+        funded.apply_block(b)
+    assert funded.digest() != digest
+    for b in reversed(chain):
+        funded.revert_block(b)
+    assert funded.digest() == digest
+    assert funded.snapshot()['balances'] == {'alice': to_units(50), NETWORK_SENDER: -to_units(50)}
+
+
+def test_overlay_matches_committed_state(funded):
+    overlay = funded.overlay()
+    for b in blocks():
+        overlay.apply_block(b)
+    for b in blocks():
+        funded.apply_block(b)
+    assert overlay.digest() == funded.digest()
+
+
+def test_snapshot_round_trip(funded):
+    for b in blocks():
+        funded.apply_block(b)
+    restored = AccountState.from_snapshot(funded.snapshot(), funded.height)
+    assert restored.digest() == funded.digest()
+    assert restored.get_balance('bob') == pytest.approx(3.9)
+
+
+def test_digest_ignores_zero_entries():
+    assert state_digest({'a': 5, 'b': 0}, {'a': 1, 'c': 0}) == state_digest({'a': 5}, {'a': 1})
+
+
+def test_float_snapshot_is_rejected():
+    with pytest.raises(ValueError):
+        AccountState.from_snapshot({'balances': {'a': 1.5}, 'nonces': {}}, 0)
+
+
+@pytest.mark.parametrize('amount, valid', [
+    (0, True), (50, True), (0.1, True), (0.00000001, True), (12345.6789, True),
+    (0.000000001, False), (-1, False), (float('nan'), False), (float('inf'), False), (1e300, False),
+    (True, False), ('1', False),
+])
+def test_valid_amount(amount, valid):
+    assert valid_amount(amount) is valid